@@ -1,4 +1,5 @@
 import streamlit as st
+from dashboard.freshness import check_now
 
 # Page configuration MUST be the first Streamlit command
 st.set_page_config(
@@ -310,9 +311,13 @@ To navigate between pages:
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔧 Quick Actions")
-if st.sidebar.button("🔄 Refresh All Data"):
-    st.cache_data.clear()
-    st.success("Data refreshed successfully!")
+if st.sidebar.button("🔄 Check for New Data"):
+    # Only caches that read a changed table are cleared
+    changed = check_now(rescan=True)
+    if changed:
+        st.success(f"Reloaded data for: {', '.join(changed)}")
+    else:
+        st.success("Data is already up to date.")
 
 st.sidebar.markdown("### 📞 Support")
 st.sidebar.info("For technical support or feature requests, please contact the Dispatch Supervisor.")
@@ -0,0 +1,249 @@
+"""Headless read API for the aggregates the pages show.
+
+Served by the query service (``python -m dashboard.query_service``) under
+``/api/v1/<name>``, so it shares that process's result cache:
+
+- ``dispatch-note``: Code x Route quantity pivot with a Total column
+  (``supervisor``, ``category``)
+- ``orders-vs-sales``: per Code and day Orders, Sales, their difference and
+  the fulfillment rate, as on the Sales vs Orders page
+- ``inventory-summary``: previous stock, received, sold and stock per Code
+- ``days-of-cover``: stock, average daily outflow over ``window`` days
+  (default 28), days of cover and projected stock-out as of ``end``
+- ``top-items``: Codes ranked by quantity (``k``, default 20;
+  ``supervisor``, ``category``)
+- ``totals``: quantity per ``period=day`` (default) or ``month``
+  (``supervisor``, ``category``)
+
+Every endpoint accepts ``start`` and ``end`` (YYYY-MM-DD) and ``code``
+(matched in Code or description through the search index). ``supervisor``
+and ``category`` (Category3) are accepted where listed; a parameter an
+endpoint does not support is rejected with 400 rather than ignored.
+``format=arrow`` (or ``Accept: application/vnd.apache.arrow.stream``)
+returns Arrow IPC instead of JSON. Results are paged with ``limit``
+(default 1000) and ``offset``; the next offset is in the JSON body and the
+``X-Next-Offset`` header. ETags depend on the data snapshot and the
+request, so a matching ``If-None-Match`` returns 304 without running the
+query. The snapshot is identified by its source fingerprints, which
+include a checksum of every row.
+"""
+import hashlib
+import json
+import uuid
+from datetime import date
+from urllib.parse import parse_qs, urlparse
+
+import pyarrow as pa
+
+from dashboard.db import _arrow_to_df
+from dashboard.queries import DAYS_OF_COVER_SQL, INVENTORY_SUMMARY_SQL, ORDERS_VS_SALES_SQL
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 50000
+
+# Parameters every endpoint accepts
+COMMON_PARAMS = {"start", "end", "code", "format", "limit", "offset"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ---- FILTERS ----
+def _date(args, name, default):
+    value = args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ApiError(400, f"{name} must be YYYY-MM-DD")
+
+
+def _range(args):
+    return _date(args, "start", "1900-01-01"), _date(args, "end", "9999-12-31")
+
+
+def _sales_filters(args, alias="s"):
+    """WHERE fragments and parameters shared by the Sales-based endpoints."""
+    start, end = _range(args)
+    where = [f"CAST({alias}.Sales_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)"]
+    params = [start, end]
+    if args.get("codes") is not None:
+        where.append(f"list_contains(?, CAST({alias}.Code AS VARCHAR))")
+        params.append(args["codes"])
+    if args.get("supervisor"):
+        where.append(f"{alias}.Route IN (SELECT Route FROM Supervisors WHERE Supervisor = ?)")
+        params.append(args["supervisor"])
+    if args.get("category"):
+        where.append(
+            f"CAST({alias}.Code AS VARCHAR) IN "
+            "(SELECT CAST(Code AS VARCHAR) FROM Products WHERE Category3 = ?)"
+        )
+        params.append(args["category"])
+    return " AND ".join(where), params
+
+
+# ---- ENDPOINTS ----
+# Each returns (sql, params, post) where post reshapes the full result or is None
+def _dispatch_note(args):
+    where, params = _sales_filters(args)
+    sql = f"""
+        SELECT
+            CAST(s.Code AS VARCHAR) AS Code,
+            CAST(s.Route AS VARCHAR) AS Route,
+            SUM(TRY_CAST(s.Qty AS DOUBLE)) AS Qty
+        FROM Sales s
+        INNER JOIN Supervisors sup ON s.Route = sup.Route
+        WHERE {where}
+        GROUP BY 1, 2
+    """
+
+    def pivot(df):
+        table = df.pivot_table(index='Code', columns='Route', values='Qty', aggfunc='sum', fill_value=0)
+        table['Total'] = table.sum(axis=1)
+        table.columns = [str(c) for c in table.columns]
+        return table.reset_index()
+
+    return sql, params, pivot
+
+
+def _orders_vs_sales(args):
+    start, end = _range(args)
+    sql = f"""
+        SELECT * FROM ({ORDERS_VS_SALES_SQL})
+        ORDER BY Sales_Date DESC, Code
+    """
+    return sql, [start, end, args.get("codes")], None
+
+
+def _inventory_summary(args):
+    start, end = _range(args)
+    return INVENTORY_SUMMARY_SQL, [start, end, args.get("codes")], None
+
+
+def _days_of_cover(args):
+    _, end = _range(args)
+    try:
+        window = int(args.get("window", 28))
+    except ValueError:
+        raise ApiError(400, "window must be an integer")
+    if window < 1:
+        raise ApiError(400, "window must be positive")
+    return DAYS_OF_COVER_SQL, [end, window, args.get("codes")], None
+
+
+def _top_items(args):
+    where, params = _sales_filters(args)
+    try:
+        k = int(args.get("k", 20))
+    except ValueError:
+        raise ApiError(400, "k must be an integer")
+    sql = f"""
+        SELECT CAST(s.Code AS VARCHAR) AS Code, CAST(SUM(CAST(s.Qty AS INTEGER)) AS BIGINT) AS Qty
+        FROM Sales s
+        WHERE {where}
+        GROUP BY 1
+        ORDER BY Qty DESC, Code
+        LIMIT ?
+    """
+    return sql, params + [k], None
+
+
+def _totals(args):
+    period = args.get("period", "day")
+    if period not in ("day", "month"):
+        raise ApiError(400, "period must be day or month")
+    where, params = _sales_filters(args)
+    sql = f"""
+        SELECT
+            DATE_TRUNC('{period}', CAST(s.Sales_Date AS DATE)) AS Period,
+            CAST(SUM(CAST(s.Qty AS INTEGER)) AS BIGINT) AS Qty
+        FROM Sales s
+        WHERE {where}
+        GROUP BY 1
+        ORDER BY 1
+    """
+    return sql, params, None
+
+
+# name -> (endpoint, parameters it accepts besides COMMON_PARAMS)
+ENDPOINTS = {
+    "dispatch-note": (_dispatch_note, {"supervisor", "category"}),
+    "orders-vs-sales": (_orders_vs_sales, set()),
+    "inventory-summary": (_inventory_summary, set()),
+    "days-of-cover": (_days_of_cover, {"window"}),
+    "top-items": (_top_items, {"supervisor", "category", "k"}),
+    "totals": (_totals, {"supervisor", "category", "period"}),
+}
+
+
+# ---- REQUEST HANDLING ----
+def _paging(args):
+    try:
+        limit = min(int(args.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+        offset = int(args.get("offset", 0))
+    except ValueError:
+        raise ApiError(400, "limit and offset must be integers")
+    if limit < 1 or offset < 0:
+        raise ApiError(400, "limit must be positive and offset non-negative")
+    return limit, offset
+
+
+def handle(service, path, headers):
+    """Answer an ``/api/v1/...`` GET. Returns (status, headers, body bytes)."""
+    url = urlparse(path)
+    name = url.path[len("/api/v1/"):].strip("/")
+    args = {k: v[-1] for k, v in parse_qs(url.query).items()}
+    try:
+        if name not in ENDPOINTS:
+            raise ApiError(404, f"unknown endpoint; try one of {sorted(ENDPOINTS)}")
+        endpoint, accepted = ENDPOINTS[name]
+        unsupported = sorted(set(args) - COMMON_PARAMS - accepted)
+        if unsupported:
+            raise ApiError(400, f"{name} does not support {', '.join(unsupported)}")
+        limit, offset = _paging(args)
+        arrow = args.get("format") == "arrow" or ARROW_STREAM in headers.get("Accept", "")
+        # ``code`` is search text; the endpoints filter on the Codes it matches
+        codes = service.code_index().search(args["code"]) if args.get("code") else None
+        sql, params, post = endpoint(dict(args, codes=codes))
+    except ApiError as e:
+        return e.status, {"Content-Type": "application/json"}, json.dumps({"error": str(e)}).encode()
+
+    etag = '"{}"'.format(hashlib.sha1(
+        repr((service.snapshot(), name, sorted(args.items()), arrow)).encode()
+    ).hexdigest()[:20])
+    if headers.get("If-None-Match") == etag:
+        return 304, {"ETag": etag}, b""
+
+    # The whole result is cached by the service; pages are slices of it
+    table = pa.ipc.open_stream(service.run(uuid.uuid4().hex, sql, params)).read_all()
+    if post is not None:
+        table = pa.Table.from_pandas(post(_arrow_to_df(table)), preserve_index=False)
+    page = table.slice(offset, limit)
+    next_offset = offset + limit if offset + limit < table.num_rows else None
+
+    out = {"ETag": etag, "Cache-Control": "no-cache", "X-Total-Rows": str(table.num_rows)}
+    if next_offset is not None:
+        out["X-Next-Offset"] = str(next_offset)
+    if arrow:
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, page.schema) as writer:
+            writer.write_table(page)
+        out["Content-Type"] = ARROW_STREAM
+        return 200, out, sink.getvalue().to_pybytes()
+
+    body = {
+        "endpoint": name,
+        "offset": offset,
+        "limit": limit,
+        "total_rows": table.num_rows,
+        "next_offset": next_offset,
+        "data": json.loads(_arrow_to_df(page).to_json(orient="records", date_format="iso")),
+    }
+    out["Content-Type"] = "application/json"
+    return 200, out, json.dumps(body).encode()
@@ -0,0 +1,149 @@
+"""Stock movement ledger and month-end closing balances per Code.
+
+``StockLedger`` holds one row per day, Code and movement type (Received,
+Adjustment, Sales, CostCenter) with a signed quantity: negative for stock
+leaving. Rows are inserted in Date order, so DuckDB's per-block min/max
+statistics skip every block outside a queried date range.
+``MonthlyClosingStock`` holds each Code's balance at the end of every month
+in which it moved. Opening stock for any date is then the Code's latest
+closing balance before that month plus at most a month of ledger rows; see
+``INVENTORY_SUMMARY_SQL``.
+
+Both tables are written only where the movements change: when a snapshot
+is warmed or prepared, by the inbox ingest from its earliest changed day,
+and by a read-write process's fingerprint check. The Stock Register only
+reads them.
+"""
+from dashboard.db import READ_ONLY
+from dashboard.freshness import built_from, record_built, take_fingerprints
+
+# Source tables whose rows are stock movements
+MOVEMENTS = ("Received", "Adjustment", "Sales", "CostCenter")
+
+# Ledger rows on or after a date (NULL for all), clustered by Date then Code.
+# Sales and CostCenter quantities are negated.
+# Parameters: the date, 8 times.
+STOCK_LEDGER_SELECT = """
+    SELECT Date, Code, Movement, SUM(Qty) AS Qty
+    FROM (
+        SELECT
+            CAST(Received_Date AS DATE) AS Date,
+            CAST(Code AS VARCHAR) AS Code,
+            'Received' AS Movement,
+            COALESCE(Received_Qty, 0) AS Qty
+        FROM Received
+        WHERE ? IS NULL OR CAST(Received_Date AS DATE) >= ?
+
+        UNION ALL
+
+        SELECT
+            CAST(Adjuctment_Date AS DATE),
+            CAST(Code AS VARCHAR),
+            'Adjustment',
+            COALESCE(Adjustment_Qty, 0)
+        FROM Adjustment
+        WHERE ? IS NULL OR CAST(Adjuctment_Date AS DATE) >= ?
+
+        UNION ALL
+
+        SELECT
+            CAST(Sales_Date AS DATE),
+            CAST(Code AS VARCHAR),
+            'Sales',
+            -CAST(Qty AS DECIMAL)
+        FROM Sales
+        WHERE ? IS NULL OR CAST(Sales_Date AS DATE) >= ?
+
+        UNION ALL
+
+        SELECT
+            CAST(Date AS DATE),
+            CAST(Code AS VARCHAR),
+            'CostCenter',
+            -CAST(Qty AS DECIMAL)
+        FROM CostCenter
+        WHERE ? IS NULL OR CAST(Date AS DATE) >= ?
+    ) movements
+    GROUP BY Date, Code, Movement
+    ORDER BY Date, Code, Movement
+"""
+
+# Closing balances for the months on or after a date, carried on from the
+# latest balance kept before them. Parameters: the date, twice.
+MONTHLY_CLOSING_SELECT = """
+    WITH Opening AS (
+        SELECT Code, arg_max(Closing_Stock, Month) AS Closing_Stock
+        FROM MonthlyClosingStock
+        GROUP BY Code
+    ),
+    Net AS (
+        SELECT
+            CAST(DATE_TRUNC('month', Date) AS DATE) AS Month,
+            Code,
+            SUM(Qty) AS Net
+        FROM StockLedger
+        WHERE ? IS NULL OR Date >= DATE_TRUNC('month', CAST(? AS DATE))
+        GROUP BY 1, 2
+    )
+    SELECT
+        n.Month,
+        n.Code,
+        COALESCE(o.Closing_Stock, 0) + SUM(n.Net) OVER (
+            PARTITION BY n.Code
+            ORDER BY n.Month
+            ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+        ) AS Closing_Stock
+    FROM Net n
+    LEFT JOIN Opening o ON n.Code = o.Code
+"""
+
+
+def refresh_stock_balances(con, since=None, fingerprints=None):
+    """Create the ledger and balance tables and reload them to match ``fingerprints``.
+
+    ``fingerprints`` are the movement tables' current ones; without them
+    the tables are fingerprinted first. With ``since`` (the earliest
+    changed date, as the ingest passes) every day from then on is reloaded.
+    Without it nothing is done when the tables were built from these
+    fingerprints, and everything is reloaded otherwise. Read-only
+    processes only read.
+    """
+    con = con.cursor()
+    if READ_ONLY:
+        return
+    if fingerprints is None:
+        fingerprints = take_fingerprints(con, MOVEMENTS)
+    sources = {table: fingerprints[table] for table in MOVEMENTS}
+    if since is None and built_from(con, "StockLedger") == sources:
+        return
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS StockLedger (
+            Date DATE,
+            Code VARCHAR,
+            Movement ENUM('Received', 'Adjustment', 'Sales', 'CostCenter'),
+            Qty DOUBLE
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS MonthlyClosingStock (
+            Month DATE,
+            Code VARCHAR,
+            Closing_Stock DOUBLE
+        )
+    """)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        # since is NULL: reload both tables in full
+        con.execute("DELETE FROM StockLedger WHERE ? IS NULL OR Date >= ?", [since, since])
+        con.execute("INSERT INTO StockLedger" + STOCK_LEDGER_SELECT, [since] * 8)
+        con.execute(
+            "DELETE FROM MonthlyClosingStock "
+            "WHERE ? IS NULL OR Month >= DATE_TRUNC('month', CAST(? AS DATE))",
+            [since, since]
+        )
+        con.execute("INSERT INTO MonthlyClosingStock" + MONTHLY_CLOSING_SELECT, [since] * 2)
+        record_built(con, "StockLedger", sources)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
@@ -0,0 +1,131 @@
+"""Statistics catalog: row counts, date bounds and dimension values.
+
+Pages fill their date pickers and dropdowns from two small tables instead
+of scanning the fact tables or the frames loaded from them:
+
+- ``CatalogTables``: row count, first and last date of every source table,
+  plus the fingerprint (see dashboard/freshness.py) they were taken at.
+- ``CatalogValues``: the distinct values of each dimension seen in a
+  table, e.g. the Supervisors whose Routes have Sales.
+
+Both are built when a snapshot is warmed and refreshed for the tables an
+inbox batch changed. The fingerprints in ``CatalogTables`` are the ones
+every process's freshness check reads back.
+"""
+import pandas as pd
+
+from dashboard.db import READ_ONLY, run_query
+from dashboard.freshness import SOURCE_TABLES, cached_from, read_fingerprints, take_fingerprints
+
+# (table, dimension) -> (tables the values are read from, SELECT of the values)
+DIMENSIONS = {
+    ("Sales", "Code"): (("Sales",), "SELECT CAST(Code AS VARCHAR) AS Value FROM Sales"),
+    ("Orders", "Code"): (("Orders",), "SELECT CAST(Code AS VARCHAR) AS Value FROM Orders"),
+    ("Sales", "Route"): (("Sales",), "SELECT CAST(Route AS VARCHAR) AS Value FROM Sales"),
+    ("Sales", "Supervisor"): (("Sales", "Supervisors"), """
+        SELECT CAST(Supervisor AS VARCHAR) AS Value FROM Supervisors
+        WHERE Route IN (SELECT DISTINCT Route FROM Sales)
+    """),
+    ("Sales", "Category3"): (("Sales", "Products"), """
+        SELECT CAST(Category3 AS VARCHAR) AS Value FROM Products
+        WHERE CAST(Code AS VARCHAR) IN (SELECT DISTINCT CAST(Code AS VARCHAR) FROM Sales)
+    """),
+}
+
+
+def _table_stats_select(table):
+    date_column = SOURCE_TABLES[table]
+    if date_column is None:
+        bounds = "CAST(NULL AS DATE), CAST(NULL AS DATE)"
+    else:
+        bounds = f"MIN(CAST({date_column} AS DATE)), MAX(CAST({date_column} AS DATE))"
+    return f"SELECT ?, COUNT(*), {bounds}, ? FROM {table}"
+
+
+def refresh_catalog(con, tables=None, fingerprints=None):
+    """Create the catalog tables and recompute the entries that read ``tables``.
+
+    Without ``tables`` every entry is recomputed. ``fingerprints`` saves
+    scanning tables the caller has just fingerprinted. Returns the
+    fingerprints of every source table now recorded. Read-only processes
+    only read, and get the fingerprints already recorded.
+    """
+    con = con.cursor()
+    if READ_ONLY:
+        return read_fingerprints(con, writable=False)
+    tables = set(SOURCE_TABLES if tables is None else tables)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS CatalogTables (
+            Table_Name VARCHAR,
+            Row_Count BIGINT,
+            Min_Date DATE,
+            Max_Date DATE,
+            Fingerprint VARCHAR
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS CatalogValues (
+            Table_Name VARCHAR,
+            Dimension VARCHAR,
+            Value VARCHAR
+        )
+    """)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        taken = fingerprints or {}
+        for table in sorted(tables & set(SOURCE_TABLES)):
+            fingerprint = taken.get(table) or take_fingerprints(con, [table])[table]
+            con.execute("DELETE FROM CatalogTables WHERE Table_Name = ?", [table])
+            con.execute("INSERT INTO CatalogTables " + _table_stats_select(table), [table, fingerprint])
+        for (table, dimension), (sources, select) in DIMENSIONS.items():
+            if tables.isdisjoint(sources):
+                continue
+            con.execute(
+                "DELETE FROM CatalogValues WHERE Table_Name = ? AND Dimension = ?",
+                [table, dimension]
+            )
+            con.execute(f"""
+                INSERT INTO CatalogValues
+                SELECT DISTINCT ?, ?, Value FROM ({select})
+                WHERE Value IS NOT NULL
+                ORDER BY Value
+            """, [table, dimension])
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return dict(con.execute("SELECT Table_Name, Fingerprint FROM CatalogTables").fetchall())
+
+
+# ---- PAGE ACCESSORS ----
+@cached_from(*SOURCE_TABLES)
+def table_stats():
+    """{table: (row count, first date, last date)}; dates are None for dimension tables."""
+    df = run_query("SELECT Table_Name, Row_Count, Min_Date, Max_Date FROM CatalogTables")
+    return {
+        row.Table_Name: (
+            int(row.Row_Count),
+            None if pd.isna(row.Min_Date) else pd.Timestamp(row.Min_Date).date(),
+            None if pd.isna(row.Max_Date) else pd.Timestamp(row.Max_Date).date(),
+        )
+        for row in df.itertuples(index=False)
+    }
+
+
+def date_bounds(*tables):
+    """(first date, last date) across ``tables``, or (None, None) if they have no dates."""
+    stats = table_stats()
+    firsts = [stats[t][1] for t in tables if t in stats and stats[t][1] is not None]
+    lasts = [stats[t][2] for t in tables if t in stats and stats[t][2] is not None]
+    return (min(firsts) if firsts else None, max(lasts) if lasts else None)
+
+
+@cached_from(*SOURCE_TABLES)
+def dimension_values(dimension, *tables):
+    """Sorted distinct values of ``dimension`` seen in any of ``tables``."""
+    df = run_query(
+        "SELECT DISTINCT Value FROM CatalogValues "
+        "WHERE Dimension = ? AND list_contains(?, Table_Name) ORDER BY Value",
+        [dimension, list(tables)]
+    )
+    return df['Value'].tolist()
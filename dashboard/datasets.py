@@ -0,0 +1,92 @@
+"""Shared read-only datasets for full-history page loads.
+
+``st.cache_data`` pickles a fresh copy of a returned frame for every
+caller. Here each dataset is written once per database snapshot as an
+Arrow IPC file in shared memory (``/dev/shm`` when available). Every
+worker process memory-maps that file, so all processes read the same
+pages. The pandas frame built on the mapping is cached once per process
+with ``st.cache_resource``. Its numeric and timestamp columns are
+zero-copy, read-only views of the mapped buffers, and callers get a
+shallow copy they can add columns to without touching the shared data.
+"""
+import glob
+import hashlib
+import os
+import tempfile
+import uuid
+
+import pyarrow as pa
+import streamlit as st
+
+from dashboard.db import QUERY_SERVICE_URL, current_snapshot, run_query
+from dashboard.freshness import SOURCE_TABLES, current_version, start_background_check
+
+SHARED_DIR = os.environ.get(
+    "DISPATCH_SHARED_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "dispatch_datasets")
+)
+
+
+def snapshot_id():
+    """Identify the data snapshot by where it is read from and its source fingerprints.
+
+    It is read from the resolved path of the live file, or from the query
+    service holding it. The fingerprints are those of the last freshness
+    check and include a checksum of every row (see dashboard/freshness.py),
+    so a corrected row gets new files even when no row count moved. The
+    file's own mtime is not used because derived tables are written into it.
+    """
+    start_background_check()
+    source = QUERY_SERVICE_URL or os.path.realpath(current_snapshot())
+    fingerprints = current_version(tuple(SOURCE_TABLES))
+    signature = repr((source, fingerprints)).encode()
+    return hashlib.sha1(signature).hexdigest()[:12]
+
+
+def _dataset_path(name, snapshot):
+    return os.path.join(SHARED_DIR, f"{name}-{snapshot}.arrow")
+
+
+def _write_dataset(name, snapshot, query):
+    """Run ``query`` and publish it as an Arrow IPC file for this snapshot."""
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    table = run_query(query, arrow=True)
+
+    # Write under a unique name, then rename, so readers never see a partial file
+    path = _dataset_path(name, snapshot)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+    # Files from older snapshots stay valid for processes that still map them
+    for old in glob.glob(os.path.join(SHARED_DIR, f"{name}-*.arrow")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+@st.cache_resource(max_entries=8)
+def _mapped_frame(name, snapshot, query):
+    """One pandas frame per process, backed by the memory-mapped Arrow file."""
+    path = _dataset_path(name, snapshot)
+    if not os.path.exists(path):
+        _write_dataset(name, snapshot, query)
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    # split_blocks keeps each column in its own block so numeric columns stay zero-copy
+    return table.to_pandas(split_blocks=True, self_destruct=False)
+
+
+def shared_frame(name, query):
+    """Read-only view of the dataset ``name`` for the current snapshot.
+
+    ``query`` runs through ``run_query``, so with a query service configured
+    this process never opens the database. Columns may be replaced on the
+    returned frame, but the underlying arrays are shared and must not be
+    written in place.
+    """
+    frame = _mapped_frame(name, snapshot_id(), query)
+    return frame.copy(deep=False)
@@ -0,0 +1,297 @@
+"""DuckDB connection shared by every page."""
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import duckdb
+import pyarrow as pa
+import requests
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.exceptions import RerunException, StopException
+from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequestType
+
+from dashboard.scheduler import QueryScheduler, classify
+
+DB_FILENAME = "dispatch.duckdb"
+DB_URL = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
+
+# Base URL of a chunked snapshot distribution (dashboard/distribution.py); unset uses DB_URL
+SNAPSHOT_URL = os.environ.get("DISPATCH_SNAPSHOT_URL", "").rstrip("/")
+
+# Names the live snapshot once one has been published with dashboard/snapshots.py
+SNAPSHOT_POINTER = os.environ.get("DISPATCH_SNAPSHOT_POINTER", "dispatch.current")
+
+# Worker processes of the multi-process serving mode open the database read-only
+# (several processes cannot hold the same DuckDB file read-write)
+READ_ONLY = os.environ.get("DISPATCH_READ_ONLY", "").lower() in ("1", "true", "yes")
+
+# URL of the local query service (dashboard/query_service.py); unset runs queries in-process
+QUERY_SERVICE_URL = os.environ.get("DISPATCH_QUERY_SERVICE", "").rstrip("/")
+
+# Seconds a page query may run before it is interrupted; 0 for no limit
+QUERY_TIMEOUT_SECONDS = float(os.environ.get("DISPATCH_QUERY_TIMEOUT", "0"))
+
+# How often a script waiting on a query checks whether a rerun superseded it
+CANCEL_POLL_SECONDS = 0.1
+
+# Seconds between updates of a waiting query's queue position
+POSITION_POLL_SECONDS = 1.0
+
+# Name Streamlit gives the thread a session's script runs in
+SCRIPT_THREAD_NAME = "ScriptRunner.scriptThread"
+
+# Streamlit releases (major, minor) whose private
+# ScriptRequests.on_scriptrunner_yield() was checked to behave as
+# _superseding_request expects; tests/test_db.py pins that behaviour.
+# Widen the range after running the tests against a new release.
+YIELD_CHECKED_VERSIONS = ((1, 66), (1, 66))
+
+
+def download_database(db_filename=DB_FILENAME, url=DB_URL):
+    """Fetch the database file; returns the HTTP status code.
+
+    With ``DISPATCH_SNAPSHOT_URL`` set, only the chunks that differ from the
+    live snapshot are downloaded.
+    """
+    if SNAPSHOT_URL:
+        from dashboard.distribution import fetch
+        try:
+            fetch(SNAPSHOT_URL, db_filename, seed=current_snapshot())
+        except requests.HTTPError as e:
+            return e.response.status_code
+        return 200
+
+    resp = requests.get(url, allow_redirects=True)
+    if resp.status_code == 200:
+        with open(db_filename, "wb") as f:
+            f.write(resp.content)
+    return resp.status_code
+
+
+# ---- DATABASE CONNECTION ----
+def current_snapshot():
+    """Path of the live database: the published snapshot, else ``DB_FILENAME``.
+
+    ``dashboard/snapshots.py`` publishes a new snapshot by atomically
+    replacing the ``SNAPSHOT_POINTER`` file.
+    """
+    try:
+        with open(SNAPSHOT_POINTER) as f:
+            path = f.read().strip()
+        if path and os.path.exists(path):
+            return path
+    except OSError:
+        pass
+    return DB_FILENAME
+
+
+@st.cache_resource(max_entries=2)
+def _open_snapshot(path):
+    # The previous snapshot's connection stays open for queries still running on it
+    return duckdb.connect(path, read_only=READ_ONLY)
+
+
+def get_duckdb():
+    """Connection to the live snapshot; a new one is picked up on the next rerun."""
+    path = current_snapshot()
+    if path == DB_FILENAME and not os.path.exists(DB_FILENAME):
+        st.write("Downloading database from Google Drive...")
+        status = download_database()
+        if status != 200:
+            st.error(f"Failed to download database. Status code = {status}")
+            st.stop()
+
+    return _open_snapshot(path)
+
+
+# ---- QUERIES ----
+def _arrow_to_df(table):
+    """Match ``DuckDBPyConnection.df()``: DECIMAL as float64 and DATE as datetime64."""
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+    return table.to_pandas(date_as_object=False)
+
+
+def _fetch_arrow(cursor):
+    result = cursor.arrow()
+    return result.read_all() if hasattr(result, "read_all") else result
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+# Page queries run here, so the script thread stays free to notice a rerun
+# and heavy queries wait for their own slots (see dashboard/scheduler.py)
+_scheduler = QueryScheduler(name="page-query")
+
+# Requests to the query service wait here; the service does its own admission
+_service_requests = ThreadPoolExecutor(max_workers=32, thread_name_prefix="page-query-http")
+
+
+def _session_id():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else ""
+
+
+def _yield_supported(version=st.__version__):
+    """True when ``version`` of Streamlit is in ``YIELD_CHECKED_VERSIONS``."""
+    major_minor = tuple(int(part) for part in re.findall(r"\d+", version)[:2])
+    low, high = YIELD_CHECKED_VERSIONS
+    return low <= major_minor <= high
+
+
+_YIELD_SUPPORTED = _yield_supported()
+
+
+def _superseding_request():
+    """The rerun or stop request waiting for this script run, if any.
+
+    Streamlit only acts on a widget change when the script yields, which it
+    does not do while blocked in DuckDB. Taking the request here lets the
+    query be interrupted at once. It is the same call the script runner
+    makes at its own yield points, and it marks a rerun request as taken,
+    so the caller must raise the matching control exception for the new
+    run to start. On Streamlit releases outside ``YIELD_CHECKED_VERSIONS``
+    this returns None and queries run to completion, as before.
+    """
+    if not _YIELD_SUPPORTED or threading.current_thread().name != SCRIPT_THREAD_NAME:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    yield_point = getattr(getattr(ctx, "script_requests", None), "on_scriptrunner_yield", None)
+    if yield_point is None:
+        return None
+    return yield_point()
+
+
+def _wait(future, cancel, timeout, cancel_on_rerun=True, position=None):
+    """Result of ``future``, calling ``cancel`` if this run is superseded or times out.
+
+    While ``position()`` is non-zero the query is queued and the page shows
+    its place in line.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    status = None
+    next_position = time.monotonic() + POSITION_POLL_SECONDS
+    try:
+        while True:
+            try:
+                return future.result(timeout=CANCEL_POLL_SECONDS)
+            except FutureTimeout:
+                pass
+            request = _superseding_request() if cancel_on_rerun else None
+            if request is not None:
+                if request.type == ScriptRequestType.STOP:
+                    raise StopException()
+                raise RerunException(request.rerun_data)
+            if deadline is not None and time.monotonic() > deadline:
+                raise QueryTimeout(f"Query cancelled after {timeout:g} seconds")
+            if position is not None and time.monotonic() > next_position:
+                next_position = time.monotonic() + POSITION_POLL_SECONDS
+                place = position()
+                if place and _session_id():
+                    status = status or st.empty()
+                    status.info(f"⏳ Waiting for a free query slot: number {place} in line")
+                elif status is not None:
+                    status.empty()
+    except BaseException:
+        if not future.done() and not future.cancel():
+            cancel()
+            try:
+                # Wait for the query to unwind so its cursor is free again
+                future.result()
+            except Exception:
+                pass
+        raise
+    finally:
+        if status is not None:
+            status.empty()
+
+
+def run_query(sql, params=(), key=None, since=None, timeout=None, cancel_on_rerun=True, arrow=False):
+    """Run ``sql`` and return a DataFrame, or a pyarrow Table with ``arrow=True``.
+
+    Queries go to the query service when ``DISPATCH_QUERY_SERVICE`` is set,
+    otherwise to a cursor on this process's connection. ``since`` is the
+    first day the query reads; when the in-memory hot tier holds it, the
+    query runs there (see dashboard/tiers.py). With ``key``, the previous
+    query this session issued under the same key is cancelled first, so a
+    superseded filter change stops using the service.
+
+    While the query runs the script watches for a rerun: when the user
+    changes a widget, the query is interrupted and the new run starts
+    instead of waiting for a result nobody will see. Pass
+    ``cancel_on_rerun=False`` for queries whose result the next run needs
+    too. After ``timeout`` seconds (default ``DISPATCH_QUERY_TIMEOUT``) the
+    query is interrupted and ``QueryTimeout`` raised.
+    """
+    timeout = QUERY_TIMEOUT_SECONDS if timeout is None else timeout
+    if not QUERY_SERVICE_URL:
+        if since is not None:
+            # Imported here: the tiers module imports this one
+            from dashboard.tiers import connection_for
+            cursor = connection_for(since)
+        else:
+            cursor = get_duckdb().cursor()
+        fetch = _fetch_arrow if arrow else lambda c: c.df()
+        future = _scheduler.submit(
+            classify(cursor, sql, params), _session_id(),
+            lambda: fetch(cursor.execute(sql, list(params)))
+        )
+        return _wait(future, cursor.interrupt, timeout, cancel_on_rerun,
+                     lambda: _scheduler.position(future))
+
+    query_id = uuid.uuid4().hex
+    if key is not None:
+        state_key = f"_query_{key}"
+        previous = st.session_state.get(state_key)
+        if previous:
+            cancel_query(previous)
+        st.session_state[state_key] = query_id
+
+    future = _service_requests.submit(
+        requests.post,
+        f"{QUERY_SERVICE_URL}/query",
+        json={
+            "sql": sql,
+            "params": [p.isoformat() if hasattr(p, "isoformat") else p for p in params],
+            "query_id": query_id,
+            "session": _session_id(),
+        },
+    )
+    resp = _wait(future, lambda: cancel_query(query_id), timeout, cancel_on_rerun,
+                 lambda: queue_position(query_id))
+    if resp.status_code != 200:
+        raise RuntimeError(f"Query service error {resp.status_code}: {resp.json().get('error')}")
+    table = pa.ipc.open_stream(resp.content).read_all()
+    return table if arrow else _arrow_to_df(table)
+
+
+def cancel_query(query_id):
+    """Ask the query service to stop ``query_id``; True if it was still queued or running."""
+    try:
+        resp = requests.post(f"{QUERY_SERVICE_URL}/cancel", json={"query_id": query_id}, timeout=5)
+        return resp.ok and resp.json().get("cancelled", False)
+    except requests.RequestException:
+        return False
+
+
+def queue_position(query_id):
+    """Place of ``query_id`` in the query service's queue; 0 once it runs or if unknown."""
+    try:
+        resp = requests.get(f"{QUERY_SERVICE_URL}/queue/{query_id}", timeout=5)
+        return resp.json().get("position", 0) if resp.ok else 0
+    except requests.RequestException:
+        return 0
+
+
+def service_fingerprints():
+    """{source table: fingerprint} of the snapshot the query service holds."""
+    resp = requests.get(f"{QUERY_SERVICE_URL}/fingerprints", timeout=30)
+    resp.raise_for_status()
+    return resp.json()
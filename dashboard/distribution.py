@@ -0,0 +1,246 @@
+"""Chunked, content-addressed distribution of database snapshots.
+
+A publishing site splits a snapshot into fixed-size chunks named by the
+SHA-256 of their contents and writes a manifest listing them in order:
+
+    python -m dashboard.distribution build snapshots/dispatch-X.duckdb --out dist/
+
+``dist/`` can then be served by any static file server. A receiving site
+fetches the manifest, reuses every chunk its local copy already has, and
+downloads only the rest:
+
+    python -m dashboard.distribution fetch http://host/dist/ --seed dispatch.duckdb
+
+DuckDB rewrites its fixed-size blocks in place and appends new ones at the
+end, so with ``CHUNK_SIZE`` a multiple of the block size a daily update
+changes few chunks. Chunks are stored zlib-compressed. Every chunk and the
+reassembled file are verified against the manifest before the file is
+moved into place.
+
+Setting ``DISPATCH_SNAPSHOT_URL`` makes ``download_database()`` (and so
+``python -m dashboard.snapshots publish --download``) fetch this way,
+seeded from the live snapshot.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+# A multiple of DuckDB's 256 KiB block size
+CHUNK_SIZE = 1024 * 1024
+
+MANIFEST_NAME = "manifest.json"
+
+DOWNLOAD_THREADS = 4
+
+
+class DistributionError(Exception):
+    pass
+
+
+def _chunk_path(root, digest):
+    return os.path.join(root, "chunks", digest[:2], digest)
+
+
+def _iter_chunks(path, chunk_size):
+    with open(path, "rb") as f:
+        while data := f.read(chunk_size):
+            yield data
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# ---- PUBLISHING SIDE ----
+def build(db_path, out_dir, chunk_size=CHUNK_SIZE, prune=False):
+    """Write the chunks of ``db_path`` and its manifest under ``out_dir``.
+
+    Chunks already present are not rewritten. The manifest is replaced last,
+    so clients never see one whose chunks are missing. With ``prune``, chunks
+    used by neither the new manifest nor the one it replaces are deleted.
+    Returns the manifest.
+    """
+    if os.path.exists(f"{db_path}.wal"):
+        raise DistributionError(f"{db_path} has an open write-ahead log; checkpoint it first")
+
+    whole = hashlib.sha256()
+    chunks = []
+    written = 0
+    for data in _iter_chunks(db_path, chunk_size):
+        whole.update(data)
+        digest = hashlib.sha256(data).hexdigest()
+        chunks.append(digest)
+        path = _chunk_path(out_dir, digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_atomic(path, zlib.compress(data))
+            written += 1
+
+    manifest = {
+        "source": os.path.basename(db_path),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "size": os.path.getsize(db_path),
+        "sha256": whole.hexdigest(),
+        "chunk_size": chunk_size,
+        "chunks": chunks,
+    }
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    previous = _load_manifest(manifest_path)
+    _write_atomic(manifest_path, json.dumps(manifest, indent=1).encode())
+
+    if prune:
+        # Clients still on the previous manifest may be mid-download
+        keep = set(chunks) | set(previous["chunks"] if previous else [])
+        for folder, _, names in os.walk(os.path.join(out_dir, "chunks")):
+            for name in names:
+                if name not in keep:
+                    os.remove(os.path.join(folder, name))
+    manifest["written"] = written
+    return manifest
+
+
+# ---- RECEIVING SIDE ----
+def _index_seed(seed, chunk_size):
+    """{chunk hash: offset} of a local copy, for the chunks it can supply."""
+    if not seed or not os.path.exists(seed):
+        return {}
+    index = {}
+    for i, data in enumerate(_iter_chunks(seed, chunk_size)):
+        index.setdefault(hashlib.sha256(data).hexdigest(), i * chunk_size)
+    return index
+
+
+def _read_seed_chunk(seed, offset, chunk_size, digest):
+    with open(seed, "rb") as f:
+        f.seek(offset)
+        data = f.read(chunk_size)
+    # The seed may have changed since it was indexed
+    return data if hashlib.sha256(data).hexdigest() == digest else None
+
+
+def _download_chunk(session, base_url, digest):
+    """(chunk bytes, compressed size on the wire), verified against ``digest``."""
+    resp = session.get(f"{base_url}/chunks/{digest[:2]}/{digest}", timeout=60)
+    resp.raise_for_status()
+    try:
+        data = zlib.decompress(resp.content)
+    except zlib.error:
+        data = b""
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise DistributionError(f"chunk {digest} failed verification")
+    return data, len(resp.content)
+
+
+def fetch(base_url, dest, seed=None):
+    """Reassemble the snapshot published at ``base_url`` into ``dest``.
+
+    Chunks found in ``seed`` (a previous local copy) are copied from it; the
+    rest are downloaded. ``dest`` is replaced only after the whole file
+    matches the manifest. Raises ``requests.HTTPError`` when the server
+    refuses a request. Returns download statistics.
+    """
+    base_url = base_url.rstrip("/")
+    session = requests.Session()
+    resp = session.get(f"{base_url}/{MANIFEST_NAME}", timeout=60)
+    resp.raise_for_status()
+    manifest = resp.json()
+    chunk_size = manifest["chunk_size"]
+
+    offsets = {}
+    for i, digest in enumerate(manifest["chunks"]):
+        offsets.setdefault(digest, []).append(i * chunk_size)
+    index = _index_seed(seed, chunk_size)
+
+    partial = f"{dest}.partial"
+    missing = []
+    wire_bytes = 0
+    try:
+        with open(partial, "wb") as f:
+            f.truncate(manifest["size"])
+            for digest, targets in offsets.items():
+                data = None
+                if digest in index:
+                    data = _read_seed_chunk(seed, index[digest], chunk_size, digest)
+                if data is None:
+                    missing.append(digest)
+                    continue
+                for offset in targets:
+                    f.seek(offset)
+                    f.write(data)
+
+            with ThreadPoolExecutor(DOWNLOAD_THREADS) as pool:
+                results = pool.map(lambda digest: _download_chunk(session, base_url, digest), missing)
+                for digest, (data, size) in zip(missing, results):
+                    wire_bytes += size
+                    for offset in offsets[digest]:
+                        f.seek(offset)
+                        f.write(data)
+
+        whole = hashlib.sha256()
+        for data in _iter_chunks(partial, chunk_size):
+            whole.update(data)
+        if whole.hexdigest() != manifest["sha256"]:
+            raise DistributionError("reassembled snapshot does not match the manifest")
+        os.replace(partial, dest)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    return {
+        "chunks": len(manifest["chunks"]),
+        "reused": len(offsets) - len(missing),
+        "downloaded": len(missing),
+        "bytes_downloaded": wire_bytes,
+        "size": manifest["size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    bld = sub.add_parser("build", help="split a snapshot into chunks and write its manifest")
+    bld.add_argument("database", nargs="?", help="snapshot to publish (default: the live one)")
+    bld.add_argument("--out", default="dist")
+    bld.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    bld.add_argument("--prune", action="store_true",
+                     help="delete chunks no longer used by the last two manifests")
+    fch = sub.add_parser("fetch", help="download a published snapshot")
+    fch.add_argument("url", help="base URL of the directory written by build")
+    fch.add_argument("--dest", default="dispatch.duckdb")
+    fch.add_argument("--seed", help="local copy to reuse chunks from (default: --dest)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "build":
+            from dashboard.db import current_snapshot
+            manifest = build(args.database or current_snapshot(), args.out, args.chunk_size, args.prune)
+            print(f"{len(manifest['chunks'])} chunks, {manifest['written']} new, "
+                  f"manifest in {os.path.join(args.out, MANIFEST_NAME)}")
+        else:
+            stats = fetch(args.url, args.dest, args.seed or args.dest)
+            print(f"{args.dest}: reused {stats['reused']} of {stats['reused'] + stats['downloaded']} chunks, "
+                  f"downloaded {stats['downloaded']} ({stats['bytes_downloaded']:,} bytes)")
+    except (DistributionError, requests.RequestException) as e:
+        sys.exit(f"Failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
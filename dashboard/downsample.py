@@ -0,0 +1,71 @@
+"""Server-side downsampling for long time-series trend lines."""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Points per trace - roughly one per horizontal pixel of a wide chart
+MAX_POINTS_PER_TRACE = 1000
+
+# Animated charts carry one frame per point, so they get a much smaller budget
+ANIMATION_MAX_POINTS = 200
+
+# Above this many source points, switch from SVG to WebGL (Scattergl) traces.
+# Compared with the rows before downsampling: a downsampled frame never
+# exceeds MAX_POINTS_PER_TRACE.
+WEBGL_THRESHOLD = 1000
+
+
+def _as_float(values):
+    """Numeric view of an x or y column (datetimes become epoch nanoseconds)."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("int64").to_numpy(dtype=float)
+    return pd.to_numeric(values, errors="coerce").fillna(0).to_numpy(dtype=float)
+
+
+def lttb_indices(x, y, threshold):
+    """Row positions kept by Largest-Triangle-Three-Buckets.
+
+    Always keeps the first and last point; from every bucket in between it
+    keeps the point forming the largest triangle with the previously kept
+    point and the average of the next bucket, which preserves peaks.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def downsample(df, x, y, max_points=MAX_POINTS_PER_TRACE):
+    """Limit the single trace in ``df`` to at most ``max_points`` rows, sorted by ``x``."""
+    df = df.sort_values(x)
+    if len(df) <= max_points:
+        return df.reset_index(drop=True)
+    kept = lttb_indices(_as_float(df[x]), _as_float(df[y]), max_points)
+    return df.iloc[kept].reset_index(drop=True)
+
+
+def render_mode(n_points):
+    """Plotly Express render mode for a chart of ``n_points`` source points."""
+    return "webgl" if n_points > WEBGL_THRESHOLD else "svg"
+
+
+def scatter_class(n_points):
+    """``go.Scattergl`` above the WebGL threshold, ``go.Scatter`` otherwise."""
+    return go.Scattergl if n_points > WEBGL_THRESHOLD else go.Scatter
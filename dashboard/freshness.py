@@ -0,0 +1,263 @@
+"""Per-table fingerprints and targeted cache invalidation.
+
+Cached loaders are declared with ``cached_from("Sales", ...)`` instead of
+``st.cache_data``. Each call adds the current fingerprints of the tables it
+names to the cache key. Fingerprints are the row count, latest date and a
+checksum of each source table. A background thread checks them every
+``CHECK_INTERVAL_SECONDS``. When a table changes, only the caches that read
+it are cleared; every other user's warm results stay in place.
+
+Fingerprints are taken once, where the data changes: when a snapshot is
+warmed or prepared for serving, for the tables an inbox batch changed, and
+when a user asks for a refresh. They are recorded in the statistics
+catalog (``CatalogTables``, see dashboard/catalog.py), so the periodic
+check only reads them back instead of scanning every table in every
+process. With a query service configured they are read from the service,
+which holds the database; the page process never opens the file.
+"""
+import functools
+import sys
+import threading
+import time
+
+import duckdb
+import streamlit as st
+
+from dashboard.db import QUERY_SERVICE_URL, READ_ONLY, current_snapshot, get_duckdb, service_fingerprints
+
+# Source table -> its date column (None for dimension tables)
+SOURCE_TABLES = {
+    "Sales": "Sales_Date",
+    "Orders": "Sales_Date",
+    "Products": None,
+    "Supervisors": None,
+    "Received": "Received_Date",
+    "Adjustment": "Adjuctment_Date",
+    "CostCenter": "Date",
+}
+
+CHECK_INTERVAL_SECONDS = 60
+
+_lock = threading.Lock()
+_fingerprints = {}  # table -> repr of (rows, max date, checksum)
+_dependents = {}    # table -> {function id: cached function}
+_checked_snapshot = None  # database file the fingerprints were taken from
+_notes_version = None  # Sales and Supervisors fingerprints the latest notes were checked against
+
+
+def table_fingerprint(con, table):
+    """(row count, latest date, checksum of every row) for one source table."""
+    date_column = SOURCE_TABLES[table]
+    latest = f"MAX({date_column})" if date_column else "NULL"
+    rows, max_date, checksum = con.execute(
+        f"SELECT COUNT(*), {latest}, SUM(hash(t)) FROM {table} t"
+    ).fetchone()
+    return rows, str(max_date), str(checksum)
+
+
+def take_fingerprints(con, tables=None):
+    """{table: fingerprint} scanned now, for ``tables`` (default all sources)."""
+    cursor = con.cursor()
+    return {
+        table: repr(table_fingerprint(cursor, table))
+        for table in (SOURCE_TABLES if tables is None else tables)
+    }
+
+
+def read_fingerprints(con, writable=not READ_ONLY):
+    """{table: fingerprint} recorded in the catalog of ``con``'s database.
+
+    A database without a catalog gets one when ``writable``; otherwise its
+    tables are fingerprinted here.
+    """
+    cursor = con.cursor()
+    try:
+        return dict(cursor.execute("SELECT Table_Name, Fingerprint FROM CatalogTables").fetchall())
+    except duckdb.CatalogException:
+        pass
+    if not writable:
+        return take_fingerprints(cursor)
+    # Imported here: the catalog module imports this one
+    from dashboard.catalog import refresh_catalog
+    return refresh_catalog(cursor)
+
+
+def built_from(con, table):
+    """{source table: fingerprint} the derived ``table`` was last built from; empty if unknown."""
+    try:
+        return dict(con.execute(
+            "SELECT Source, Fingerprint FROM DerivedSources WHERE Table_Name = ?", [table]
+        ).fetchall())
+    except duckdb.CatalogException:
+        return {}
+
+
+def record_built(con, table, fingerprints):
+    """Record that the derived ``table`` now matches ``fingerprints`` ({source table: fingerprint})."""
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS DerivedSources (
+            Table_Name VARCHAR,
+            Source VARCHAR,
+            Fingerprint VARCHAR
+        )
+    """)
+    con.execute("DELETE FROM DerivedSources WHERE Table_Name = ?", [table])
+    for source, fingerprint in fingerprints.items():
+        con.execute("INSERT INTO DerivedSources VALUES (?, ?, ?)", [table, source, fingerprint])
+
+
+def live_fingerprints():
+    """{table: fingerprint} of the live snapshot, from the query service when one is configured."""
+    if QUERY_SERVICE_URL:
+        return service_fingerprints()
+    return read_fingerprints(get_duckdb())
+
+
+def _apply(fingerprints):
+    """Store ``fingerprints`` and clear the caches of the tables whose fingerprint moved."""
+    changed = []
+    for table in SOURCE_TABLES:
+        fingerprint = fingerprints.get(table)
+        with _lock:
+            previous = _fingerprints.get(table)
+            _fingerprints[table] = fingerprint
+            functions = list(_dependents.get(table, {}).values())
+        if previous is not None and previous != fingerprint:
+            changed.append(table)
+            for cached in functions:
+                cached.clear()
+    return changed
+
+
+def check_now(rescan=False):
+    """Re-read the fingerprints and clear the caches of the tables that changed.
+
+    The pages' Refresh buttons pass ``rescan=True``: when this process owns
+    the database read-write, its tables are fingerprinted again first and
+    the result recorded for every other process. Otherwise the recorded
+    fingerprints are read, from the query service when one is configured.
+    A read-write process also brings the derived tables in step (see
+    dashboard/snapshots.py) before any cache is cleared. Returns the names
+    of the changed tables.
+    """
+    owner = not (READ_ONLY or QUERY_SERVICE_URL)
+    if rescan and owner:
+        # Imported here: the catalog module imports this one
+        from dashboard.catalog import refresh_catalog
+        refresh_catalog(get_duckdb())
+    fingerprints = live_fingerprints()
+    with _lock:
+        moved = any(_fingerprints.get(table) != fingerprints.get(table) for table in SOURCE_TABLES)
+    if owner and moved:
+        # Derived tables first, so no cache is refilled from stale ones.
+        # Imported here: the snapshots module imports this one
+        from dashboard.snapshots import refresh_derived
+        refresh_derived(get_duckdb(), fingerprints)
+    return _apply(fingerprints)
+
+
+def _check_live():
+    """Read the fingerprints of the live snapshot, which may have been swapped since the last check."""
+    global _checked_snapshot
+    path = current_snapshot()
+    if READ_ONLY and not QUERY_SERVICE_URL and path == _checked_snapshot:
+        # No process can write a file this one holds read-only
+        return []
+    changed = check_now()
+    _checked_snapshot = path
+    return changed
+
+
+def _apply_inbox():
+    """Merge pending delta files when this process owns the database read-write."""
+    if READ_ONLY or QUERY_SERVICE_URL:
+        return
+    # Imported here: the ingest pipeline imports modules that use cached_from
+    from dashboard.ingest import ingest_inbox, pending_files
+    if pending_files():
+        ingest_inbox(get_duckdb())
+
+
+def _refresh_notes():
+    """Keep the latest day's Dispatched Notes current when this process owns the database read-write."""
+    global _notes_version
+    if READ_ONLY or QUERY_SERVICE_URL:
+        return
+    version = current_version(("Sales", "Supervisors"))
+    if version == _notes_version:
+        return
+    # Imported here, like the ingest pipeline above
+    from dashboard.notes import refresh_latest_notes
+    cursor = get_duckdb().cursor()
+    try:
+        refresh_latest_notes(cursor)
+    finally:
+        cursor.close()
+    _notes_version = version
+
+
+def _watch():
+    while True:
+        time.sleep(CHECK_INTERVAL_SECONDS)
+        try:
+            _apply_inbox()
+        except Exception as e:
+            # A rejected batch has left the inbox; one whose derived reload failed is retried
+            print(f"Inbox ingest failed: {e}", file=sys.stderr)
+        try:
+            _check_live()
+        except Exception as e:
+            print(f"Fingerprint check failed: {e}", file=sys.stderr)
+        try:
+            _refresh_notes()
+        except Exception as e:
+            print(f"Dispatched Note refresh failed: {e}", file=sys.stderr)
+
+
+@st.cache_resource
+def start_background_check():
+    """Take the first fingerprints and start the periodic check (once per process)."""
+    _check_live()
+    thread = threading.Thread(target=_watch, name="fingerprint-check", daemon=True)
+    thread.start()
+    return thread
+
+
+def current_version(tables):
+    with _lock:
+        return tuple(_fingerprints.get(table) for table in tables)
+
+
+def cached_from(*tables, **cache_kwargs):
+    """``st.cache_data`` keyed on the fingerprints of ``tables``.
+
+    ``cache_kwargs`` are passed through to ``st.cache_data``.
+    """
+    unknown = set(tables) - set(SOURCE_TABLES)
+    if unknown:
+        raise ValueError(f"Unknown source tables: {sorted(unknown)}")
+
+    def decorator(func):
+        @functools.wraps(func)
+        def versioned(*args, data_version=None, **kwargs):
+            return func(*args, **kwargs)
+
+        cached = st.cache_data(**cache_kwargs)(versioned)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            start_background_check()
+            if current_snapshot() != _checked_snapshot:
+                # A new snapshot was published; re-check before serving from the cache
+                _check_live()
+            return cached(*args, data_version=current_version(tables), **kwargs)
+
+        # Page scripts redefine their loaders on every rerun; keep only the latest
+        function_id = (func.__code__.co_filename, func.__qualname__)
+        with _lock:
+            for table in tables:
+                _dependents.setdefault(table, {})[function_id] = cached
+        call.clear = cached.clear
+        return call
+
+    return decorator
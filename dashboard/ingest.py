@@ -0,0 +1,282 @@
+"""Incremental ingest of daily delta files from a watched directory.
+
+Delta files are dropped into ``INBOX_DIR``, named after the table they
+belong to (``Sales_2025-08-23.csv``, ``Orders-0823.parquet``, ...). Each run:
+
+1. Reads every pending file of a table in one DuckDB ``read_csv`` or
+   ``read_parquet`` call, which scans the files in parallel. A file that
+   cannot be read is logged and moved to ``rejected/`` on its own.
+2. A file of a date-keyed table carries every row of each day it covers;
+   when two files cover the same day, the one that sorts last wins.
+   Dimension files are deduplicated by their key (Code, Route) instead.
+3. In one transaction, replaces those whole days (or keys) in the source
+   table. Several rows for the same Code, Route and day are kept as they
+   are: nothing in the data tells them apart.
+4. Reloads only the affected days of SalesFact/OrdersFact and
+   DailyCodeTotals, the stock balances from the earliest changed day, and
+   the statistics catalog entries of the changed tables. The normalized
+   schema is rebuilt only when new Codes, Routes or categories appear.
+
+Files move to ``processed/`` once the derived tables match them, and
+rejected ones to ``rejected/``. A batch whose derived reload fails stays
+in the inbox and is applied again on the next run; replacing whole days
+and keys makes that safe. The fingerprint check then clears only the
+caches of the tables that changed.
+
+    python -m dashboard.ingest                    # apply pending files once
+    python -m dashboard.ingest --watch 60         # keep polling the inbox
+    python -m dashboard.ingest --publish          # apply to a copy and hot-swap it in
+
+A dashboard process that owns the database read-write also applies the
+inbox from its background fingerprint check. ``--publish`` is for
+read-only serving, where no process may write to the live file.
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+
+import duckdb
+
+from dashboard.balances import MOVEMENTS, refresh_stock_balances
+from dashboard.catalog import refresh_catalog
+from dashboard.db import current_snapshot
+from dashboard.freshness import SOURCE_TABLES, read_fingerprints, record_built, take_fingerprints
+from dashboard.schema import TABLES, build_normalized_schema
+from dashboard.topk import DAILY_TOTALS_SELECT
+
+INBOX_DIR = os.environ.get("DISPATCH_INBOX", "inbox")
+
+# Dimension tables hold one row per key. Date-keyed tables have no row
+# key (a Route may dispatch a Code twice a day), so they are replaced a
+# whole day at a time; see SOURCE_TABLES for their date columns.
+NATURAL_KEYS = {
+    "Products": ("Code",),
+    "Supervisors": ("Route",),
+}
+
+# Fact table -> (normalized table, date column) reloaded per affected day
+FACTS = {
+    "Sales": ("SalesFact", "Sales_Date"),
+    "Orders": ("OrdersFact", "Sales_Date"),
+}
+
+READERS = {
+    ".csv": "read_csv({files}, all_varchar = true, union_by_name = true, filename = true)",
+    ".parquet": "read_parquet({files}, union_by_name = true, filename = true)",
+}
+
+
+def pending_files(inbox=INBOX_DIR):
+    """Delta files waiting in ``inbox``, grouped by target table."""
+    if not os.path.isdir(inbox):
+        return {}
+    by_table = {}
+    names = {table.lower(): table for table in SOURCE_TABLES}
+    for name in sorted(os.listdir(inbox)):
+        stem, ext = os.path.splitext(name)
+        table = names.get(stem.replace("-", "_").split("_")[0].lower())
+        if table and ext.lower() in READERS:
+            by_table.setdefault(table, []).append(os.path.join(inbox, name))
+    return by_table
+
+
+def _table_exists(con, table):
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]
+    ).fetchone()[0] > 0
+
+
+def _stage(con, table, paths):
+    """Load ``paths`` into TEMP table ``delta_<table>`` with the target's column types."""
+    delta = f"delta_{table}"
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE {delta} AS "
+        f"SELECT *, NULL::VARCHAR AS _file FROM {table} LIMIT 0"
+    )
+    for ext, reader in READERS.items():
+        files = [p for p in paths if p.lower().endswith(ext)]
+        if files:
+            quoted = ", ".join("'" + f.replace("'", "''") + "'" for f in files)
+            source = reader.format(files=f"[{quoted}]")
+            con.execute(
+                f"INSERT INTO {delta} BY NAME SELECT * RENAME (filename AS _file) FROM {source}"
+            )
+    date_column = SOURCE_TABLES[table]
+    if date_column:
+        # Each day comes whole from the last file that has it
+        latest = f"_file = MAX(_file) OVER (PARTITION BY CAST({date_column} AS DATE))"
+    else:
+        keys = ", ".join(NATURAL_KEYS[table])
+        latest = f"ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY _file DESC) = 1"
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {delta} AS
+        SELECT * EXCLUDE (_file) FROM {delta}
+        QUALIFY {latest}
+    """)
+    return delta
+
+
+def _merge(con, table, delta):
+    date_column = SOURCE_TABLES[table]
+    if date_column:
+        con.execute(
+            f"DELETE FROM {table} WHERE CAST({date_column} AS DATE) IN "
+            f"(SELECT DISTINCT CAST({date_column} AS DATE) FROM {delta})"
+        )
+    else:
+        matches = " AND ".join(f"t.{k} IS NOT DISTINCT FROM d.{k}" for k in NATURAL_KEYS[table])
+        con.execute(f"DELETE FROM {table} t USING {delta} d WHERE {matches}")
+    con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM {delta}")
+    return con.execute(f"SELECT COUNT(*) FROM {delta}").fetchone()[0]
+
+
+def _refresh_facts(con, changed, fingerprints):
+    """Reload the affected days of the normalized fact tables.
+
+    ``fingerprints`` are the sources' fingerprints after the merge.
+    """
+    if {"Products", "Supervisors"} & set(changed):
+        build_normalized_schema(con, fingerprints)
+        return
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for source, (fact, date_column) in FACTS.items():
+            if source not in changed:
+                continue
+            days = f"(SELECT DISTINCT CAST({date_column} AS DATE) FROM delta_{source})"
+            con.execute(f"DELETE FROM {fact} WHERE Sales_Date IN {days}")
+            con.execute(
+                f"INSERT INTO {fact} SELECT {TABLES[fact][1]} FROM {source} "
+                f"WHERE CAST({date_column} AS DATE) IN {days}"
+            )
+            record_built(con, fact, {source: fingerprints[source]})
+        con.execute("COMMIT")
+    except duckdb.Error:
+        # A Code or Route outside the ENUM types; rebuild them from the sources
+        con.execute("ROLLBACK")
+        build_normalized_schema(con, fingerprints)
+
+
+def _refresh_derived(con, changed):
+    """Reload the affected days of the derived tables that exist."""
+    # The changed tables are fingerprinted once. The catalog records them
+    # last, so no process sees the new fingerprints before the derived
+    # tables match them.
+    fingerprints = {**read_fingerprints(con), **take_fingerprints(con, changed)}
+
+    if _table_exists(con, "SalesFact"):
+        _refresh_facts(con, changed, fingerprints)
+
+    if "Sales" in changed and _table_exists(con, "DailyCodeTotals"):
+        days = "(SELECT DISTINCT CAST(Sales_Date AS DATE) FROM delta_Sales)"
+        con.execute("BEGIN TRANSACTION")
+        try:
+            con.execute(f"DELETE FROM DailyCodeTotals WHERE Date IN {days}")
+            con.execute(
+                "INSERT INTO DailyCodeTotals"
+                + DAILY_TOTALS_SELECT.format(where=f"CAST(Sales_Date AS DATE) IN {days}")
+            )
+            record_built(con, "DailyCodeTotals", {"Sales": fingerprints["Sales"]})
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    moved = [table for table in MOVEMENTS if table in changed]
+    if moved and _table_exists(con, "StockLedger"):
+        # Balances are carried forward, so reload from the earliest changed day
+        since = con.execute(" UNION ALL ".join(
+            f"SELECT MIN(CAST({SOURCE_TABLES[table]} AS DATE)) FROM delta_{table}" for table in moved
+        ) + " ORDER BY 1 NULLS LAST LIMIT 1").fetchone()[0]
+        refresh_stock_balances(con, since, fingerprints)
+
+    refresh_catalog(con, changed, fingerprints)
+
+
+def _move(paths, inbox, folder):
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    target = os.path.join(inbox, folder, stamp)
+    os.makedirs(target, exist_ok=True)
+    for path in paths:
+        shutil.move(path, os.path.join(target, os.path.basename(path)))
+
+
+def _reject_unreadable(con, files, inbox):
+    """Move files that cannot be staged on their own to ``rejected/``; returns the rest."""
+    readable = {}
+    for table, paths in files.items():
+        for path in paths:
+            try:
+                _stage(con, table, [path])
+            except duckdb.Error as e:
+                print(f"Rejected {path}: {e}", file=sys.stderr)
+                _move([path], inbox, "rejected")
+            else:
+                readable.setdefault(table, []).append(path)
+    return readable
+
+
+def ingest_inbox(con, inbox=INBOX_DIR):
+    """Apply every pending delta file; returns {table: rows merged}.
+
+    Unreadable files are rejected one by one first. The rest are merged in
+    one transaction, so a batch that still fails leaves the database
+    untouched and is moved to ``rejected/``. Merged files are moved to
+    ``processed/`` only after the derived tables are reloaded; if that
+    fails they stay in the inbox, and merging them again on the next run
+    changes nothing before the reload is retried.
+    """
+    con = con.cursor()
+    files = _reject_unreadable(con, pending_files(inbox), inbox)
+    if not files:
+        return {}
+    all_paths = [p for paths in files.values() for p in paths]
+    merged = {}
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for table, paths in files.items():
+            merged[table] = _merge(con, table, _stage(con, table, paths))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        _move(all_paths, inbox, "rejected")
+        raise
+    _refresh_derived(con, merged)
+    _move(all_paths, inbox, "processed")
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inbox", default=INBOX_DIR)
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="keep polling the inbox at this interval")
+    parser.add_argument("--publish", action="store_true",
+                        help="apply to a copy of the live snapshot and publish it")
+    args = parser.parse_args()
+
+    while True:
+        if pending_files(args.inbox):
+            try:
+                if args.publish:
+                    from dashboard.snapshots import publish
+                    path = publish(current_snapshot(), prepare=lambda con: ingest_inbox(con, args.inbox))
+                    print(f"Published {path}")
+                else:
+                    con = duckdb.connect(current_snapshot())
+                    try:
+                        print(f"Merged {ingest_inbox(con, args.inbox)}")
+                    finally:
+                        con.close()
+            except Exception as e:
+                print(f"Ingest failed: {e}", file=sys.stderr)
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Pre-generated Dispatched Notes, one per supervisor and day.
+
+``generate_notes`` runs one grouped query for a day and writes each
+supervisor's Code x Route pivot (plus an "All" note) under
+``NOTES_DIR/<YYYYMMDD>/``. The Dispatched Note page serves these files
+when they exist instead of filtering and pivoting the full table.
+
+A process that owns the database read-write keeps the latest day's notes
+current from its background check (``refresh_latest_notes``), since no
+other process can open the file then. ``scripts/generate_notes.py`` writes
+any day's notes through the query service, or from a file no process
+holds read-write.
+
+``summary.json`` records the fingerprint of the day's Sales rows and of
+the Supervisors table the notes were built from (``day_fingerprint``).
+A note whose day has changed since, say through a corrected delta file,
+is not served; the page builds that day from the database instead.
+"""
+import json
+import os
+import re
+
+import pandas as pd
+
+from dashboard.db import run_query
+
+NOTES_DIR = os.environ.get("DISPATCH_NOTES_DIR", "dispatch_notes")
+
+ALL_SUPERVISORS = "All"
+
+
+def _slug(supervisor):
+    """File-name form of a supervisor, matching the page's download names."""
+    if supervisor == ALL_SUPERVISORS:
+        return "all_supervisors"
+    return re.sub(r"[^\w\-]+", "_", supervisor)
+
+
+def note_path(day, supervisor, ext, notes_dir=None):
+    folder = os.path.join(notes_dir or NOTES_DIR, day.strftime('%Y%m%d'))
+    return os.path.join(folder, f"sales_pivot_{_slug(supervisor)}_{day.strftime('%Y%m%d')}.{ext}")
+
+
+def _summary_path(day, notes_dir=None):
+    return os.path.join(notes_dir or NOTES_DIR, day.strftime('%Y%m%d'), "summary.json")
+
+
+# Checksums come back as text, so they read the same from a cursor and through the query service
+DAY_FINGERPRINT_SQL = """
+    SELECT
+        COUNT(*) AS Records,
+        CAST(SUM(hash(s)) AS VARCHAR) AS Checksum,
+        (SELECT CAST(SUM(hash(t)) AS VARCHAR) FROM Supervisors t) AS Supervisors
+    FROM Sales s
+    WHERE CAST(s.Sales_Date AS DATE) = CAST(? AS DATE)
+"""
+
+
+# Every supervisor's Sales for one day, summed per Code and Route
+NOTE_ROWS_SQL = """
+    SELECT
+        sup.Supervisor AS SupervisorName,
+        s.Code,
+        s.Route,
+        SUM(COALESCE(TRY_CAST(s.Qty AS DOUBLE), 0)) AS Qty,
+        COUNT(*) AS Records
+    FROM Sales s
+    INNER JOIN Supervisors sup ON s.Route = sup.Route
+    WHERE CAST(s.Sales_Date AS DATE) = CAST(? AS DATE)
+    GROUP BY 1, 2, 3
+"""
+
+LATEST_DAY_SQL = "SELECT MAX(CAST(Sales_Date AS DATE)) AS Day FROM Sales"
+
+
+def _query(sql, params, con):
+    """Run on ``con`` when given, otherwise through ``run_query``."""
+    if con is not None:
+        return con.execute(sql, params).df()
+    return run_query(sql, params)
+
+
+def day_fingerprint(day, con=None):
+    """Row count and checksum of ``day``'s Sales rows, plus a checksum of Supervisors."""
+    rows, checksum, supervisors = _query(DAY_FINGERPRINT_SQL, [day.strftime('%Y-%m-%d')], con).iloc[0]
+    return repr((int(rows), str(checksum), str(supervisors)))
+
+
+def latest_day(con=None):
+    """The last day with Sales, or None."""
+    day = _query(LATEST_DAY_SQL, [], con).iloc[0, 0]
+    return None if pd.isna(day) else pd.Timestamp(day).date()
+
+
+def _pivot(rows):
+    """The page's pivot: Code rows, Route columns, summed Qty and a Total column."""
+    pivot_table = rows.pivot_table(
+        index='Code',
+        columns='Route',
+        values='Qty',
+        aggfunc='sum',
+        fill_value=0
+    )
+    pivot_table['Total'] = pivot_table.sum(axis=1)
+    return pivot_table
+
+
+def _write_atomic(path, write):
+    # Keep the extension last, since the Excel writer picks its format from it
+    base, ext = os.path.splitext(path)
+    tmp_path = f"{base}.tmp{ext}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def generate_notes(day, notes_dir=None, formats=("csv", "xlsx"), con=None):
+    """Write every supervisor's note for ``day``; returns the paths written.
+
+    Queries run on ``con`` when given, otherwise through ``run_query``.
+    """
+    rows = _query(NOTE_ROWS_SQL, [day.strftime('%Y-%m-%d')], con)
+
+    if "xlsx" in formats:
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            print("openpyxl is not installed; skipping XLSX notes")
+            formats = tuple(f for f in formats if f != "xlsx")
+
+    os.makedirs(os.path.dirname(note_path(day, ALL_SUPERVISORS, "csv", notes_dir)), exist_ok=True)
+    groups = [(ALL_SUPERVISORS, rows)] + list(rows.groupby('SupervisorName', sort=True))
+    written = []
+    summary = {}
+    for supervisor, group in groups:
+        if group.empty:
+            continue
+        pivot_table = _pivot(group)
+        records = int(group['Records'].sum())
+        summary[supervisor] = {
+            "records": records,
+            "total_qty": float(group['Qty'].sum()),
+            "avg_qty": float(group['Qty'].sum()) / records,
+            "codes": len(pivot_table.index),
+            "routes": len(pivot_table.columns) - 1,
+        }
+        for ext in formats:
+            path = note_path(day, supervisor, ext, notes_dir)
+            if ext == "csv":
+                _write_atomic(path, pivot_table.to_csv)
+            else:
+                _write_atomic(path, lambda p: pivot_table.to_excel(p, engine="openpyxl"))
+            written.append(path)
+
+    def write_summary(path):
+        with open(path, "w") as f:
+            json.dump({"fingerprint": day_fingerprint(day, con), "notes": summary}, f)
+
+    # Written last, so the page only offers a day once all of its files are in place
+    _write_atomic(_summary_path(day, notes_dir), write_summary)
+    return written
+
+
+def _stored(day, notes_dir=None):
+    """The ``summary.json`` written for ``day``, or None."""
+    try:
+        with open(_summary_path(day, notes_dir)) as f:
+            generated = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return generated if isinstance(generated, dict) else None
+
+
+def refresh_latest_notes(con=None, notes_dir=None):
+    """Write the latest day's notes unless the stored ones match its data; returns the paths written."""
+    day = latest_day(con)
+    if day is None:
+        return []
+    stored = _stored(day, notes_dir)
+    if stored is not None and stored.get("fingerprint") == day_fingerprint(day, con):
+        return []
+    return generate_notes(day, notes_dir, con=con)
+
+
+def load_note(day, supervisor, fingerprint, notes_dir=None):
+    """The pre-generated note for ``supervisor`` on ``day``, or None.
+
+    ``fingerprint`` is the day's current ``day_fingerprint``; a note built
+    from other data is stale and not returned. Returns a dict with the
+    pivot frame, its summary figures and the raw CSV/XLSX bytes and file
+    names for download (XLSX may be None).
+    """
+    generated = _stored(day, notes_dir)
+    if generated is None or generated.get("fingerprint") != fingerprint:
+        return None
+    summary = generated.get("notes", {}).get(supervisor)
+    csv_path = note_path(day, supervisor, "csv", notes_dir)
+    if summary is None or not os.path.exists(csv_path):
+        return None
+
+    with open(csv_path, "rb") as f:
+        csv = f.read()
+    xlsx_path = note_path(day, supervisor, "xlsx", notes_dir)
+    xlsx = None
+    if os.path.exists(xlsx_path):
+        with open(xlsx_path, "rb") as f:
+            xlsx = f.read()
+    pivot_table = pd.read_csv(csv_path, index_col='Code', dtype={'Code': str})
+    return {
+        "pivot": pivot_table,
+        "summary": summary,
+        "csv": csv,
+        "csv_name": os.path.basename(csv_path),
+        "xlsx": xlsx,
+        "xlsx_name": os.path.basename(xlsx_path),
+    }
@@ -0,0 +1,149 @@
+"""Day/week/month pyramid of Sales totals with a zoomable trend chart."""
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from dashboard.db import run_query
+from dashboard.downsample import scatter_class
+from dashboard.freshness import cached_from
+
+# Pyramid levels, finest first, with their approximate width in days
+LEVELS = (("day", 1), ("week", 7), ("month", 30))
+
+# Points sent to the browser for the visible range
+PYRAMID_MAX_POINTS = 200
+
+
+@cached_from("Sales")
+def build_pyramid(table="Sales", date_column="Sales_Date", qty_column="Qty"):
+    """Aggregate a fact table to day, week and month totals in one scan.
+
+    Returns a dict mapping each level name to a frame of ``Period`` and ``Qty``.
+    """
+    query = f"""
+    WITH Daily AS (
+        SELECT 
+            CAST({date_column} AS DATE) AS Day,
+            DATE_TRUNC('week', CAST({date_column} AS DATE)) AS Week,
+            DATE_TRUNC('month', CAST({date_column} AS DATE)) AS Month,
+            CAST({qty_column} AS INTEGER) AS Qty
+        FROM {table}
+    )
+    SELECT 
+        CASE 
+            WHEN GROUPING(Day) = 0 THEN 'day'
+            WHEN GROUPING(Week) = 0 THEN 'week'
+            ELSE 'month'
+        END AS Level,
+        COALESCE(Day, Week, Month) AS Period,
+        SUM(Qty) AS Qty
+    FROM Daily
+    GROUP BY GROUPING SETS ((Day), (Week), (Month))
+    ORDER BY Level, Period
+    """
+    result = run_query(query)
+    result['Period'] = pd.to_datetime(result['Period'])
+    return {
+        level: result.loc[result['Level'] == level, ['Period', 'Qty']].reset_index(drop=True)
+        for level, _ in LEVELS
+    }
+
+
+def choose_level(start, end, max_points=PYRAMID_MAX_POINTS):
+    """Finest level that shows ``start``..``end`` within ``max_points`` points."""
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for level, width in LEVELS:
+        if days / width <= max_points:
+            return level
+    return LEVELS[-1][0]
+
+
+def period_start(level, day):
+    """First day of the ``level`` period holding ``day``, as DATE_TRUNC labels it."""
+    day = pd.Timestamp(day).normalize()
+    if level == "week":
+        # DATE_TRUNC('week') starts weeks on Monday
+        return day - pd.Timedelta(days=day.weekday())
+    if level == "month":
+        return day.replace(day=1)
+    return day
+
+
+def slice_level(pyramid, level, start, end):
+    """Rows of one pyramid level whose period overlaps ``start``..``end``."""
+    df = pyramid[level]
+    # Week and month periods are labelled by their first day, so start from the period holding ``start``
+    mask = (df['Period'] >= period_start(level, start)) & (df['Period'] <= pd.Timestamp(end))
+    return df.loc[mask]
+
+
+def _selected_range(event):
+    """x-range of the box the user dragged on the chart, if any."""
+    boxes = (event or {}).get("selection", {}).get("box", [])
+    if not boxes or len(boxes[0].get("x", [])) != 2:
+        return None
+    # Date axes report strings; numbers are epoch milliseconds
+    x0, x1 = sorted(
+        pd.Timestamp(x, unit="ms") if isinstance(x, (int, float)) else pd.Timestamp(x)
+        for x in boxes[0]["x"]
+    )
+    return x0.normalize(), x1.normalize()
+
+
+def zoomable_trend(pyramid, start, end, key, title="Sales Quantity", line_color="#1f77b4", layout=None):
+    """Trend chart that re-fetches the right pyramid level when the user zooms.
+
+    Drag a box on the chart to zoom; the page reruns and draws only the
+    visible range at the finest level that fits the point budget.
+    """
+    zoom_key = f"{key}_zoom"
+    nonce_key = f"{key}_nonce"
+    base_range = (pd.Timestamp(start), pd.Timestamp(end))
+    st.session_state.setdefault(nonce_key, 0)
+
+    # A new date range from the page's own filters drops any previous zoom
+    if st.session_state.get(f"{key}_base") != base_range:
+        st.session_state[f"{key}_base"] = base_range
+        st.session_state[zoom_key] = None
+
+    view_start, view_end = st.session_state.get(zoom_key) or base_range
+    level = choose_level(view_start, view_end)
+    data = slice_level(pyramid, level, view_start, view_end)
+
+    trace = scatter_class(len(data))
+    fig = go.Figure(trace(
+        x=data['Period'],
+        y=data['Qty'],
+        mode='lines+markers' if level == "day" else 'lines',
+        name=f"{level.title()} Qty",
+        line=dict(color=line_color, width=2),
+        hovertemplate='<b>%{x|%Y-%m-%d}</b><br><b>Qty:</b> %{y:,.0f}<extra></extra>'
+    ))
+    fig.update_layout(
+        title=f"{title} - {level.title()} level ({view_start:%Y-%m-%d} to {view_end:%Y-%m-%d})",
+        dragmode="select",
+        **(layout or {})
+    )
+
+    event = st.plotly_chart(
+        fig,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="box",
+        key=f"{key}_{st.session_state[nonce_key]}"
+    )
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.caption(f"Showing {len(data)} {level} points. Drag a box on the chart to zoom in.")
+    with col2:
+        if st.button("🔍 Reset Zoom", key=f"{key}_reset"):
+            st.session_state[zoom_key] = None
+            st.session_state[nonce_key] += 1
+            st.rerun()
+
+    selected = _selected_range(event)
+    if selected and selected != (view_start, view_end):
+        st.session_state[zoom_key] = selected
+        st.session_state[nonce_key] += 1
+        st.rerun()
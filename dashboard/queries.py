@@ -0,0 +1,179 @@
+"""SQL for aggregates shared by the pages and the headless API."""
+
+# Opening stock before the period plus received/sold within it, per Code,
+# from the tables kept by dashboard/balances.py. Opening stock is the latest
+# month-end closing balance before the start month plus the ledger rows from
+# the start of that month to the day before; the same ledger scan yields the
+# period totals.
+# Parameters: $1 start date, $2 end date, $3 list of Codes (NULL for all).
+INVENTORY_SUMMARY_SQL = """
+WITH Closing AS (
+    SELECT 
+        Code,
+        arg_max(Closing_Stock, Month) AS Closing_Stock
+    FROM MonthlyClosingStock
+    WHERE Month < DATE_TRUNC('month', CAST($1 AS DATE))
+      AND ($3 IS NULL OR list_contains($3, Code))
+    GROUP BY Code
+),
+Movements AS (
+    SELECT 
+        Code,
+        SUM(Qty) FILTER (WHERE Date < CAST($1 AS DATE)) AS Opening_Qty,
+        SUM(Qty) FILTER (
+            WHERE Date >= CAST($1 AS DATE) AND Movement IN ('Received', 'Adjustment')
+        ) AS Total_Received,
+        -SUM(Qty) FILTER (
+            WHERE Date >= CAST($1 AS DATE) AND Movement IN ('Sales', 'CostCenter')
+        ) AS Total_Sales
+    FROM StockLedger
+    WHERE Date BETWEEN DATE_TRUNC('month', CAST($1 AS DATE)) AND CAST($2 AS DATE)
+      AND ($3 IS NULL OR list_contains($3, Code))
+    GROUP BY Code
+),
+Summary AS (
+    SELECT 
+        COALESCE(c.Code, m.Code) AS Code,
+        COALESCE(c.Closing_Stock, 0) + COALESCE(m.Opening_Qty, 0) AS Previous_Stock,
+        COALESCE(m.Total_Received, 0) AS Total_Received,
+        COALESCE(m.Total_Sales, 0) AS Total_Sales
+    FROM Closing c
+    FULL OUTER JOIN Movements m
+        ON c.Code = m.Code
+)
+SELECT 
+    Code,
+    Previous_Stock,
+    Total_Received,
+    Total_Sales,
+    Previous_Stock + Total_Received - Total_Sales AS Stock
+FROM Summary
+ORDER BY Code
+"""
+
+# One movement type's per-day quantities, positive for every type, from the
+# ledger kept by dashboard/balances.py.
+# Parameters: movement type, start date, end date, list of Codes (NULL for all) twice.
+STOCK_MOVEMENTS_SQL = """
+SELECT 
+    Date,
+    Code,
+    CASE WHEN Movement IN ('Sales', 'CostCenter') THEN -Qty ELSE Qty END AS Qty
+FROM StockLedger
+WHERE Movement = ?
+  AND Date BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
+  AND (? IS NULL OR list_contains(?, Code))
+ORDER BY Date, Code
+"""
+
+# Days of cover and projected stock-out per Code as of a day, from the stock
+# ledger. The as-of day is capped at the last day in the ledger. Outflow
+# (Sales plus CostCenter) is averaged over the trailing window, however
+# long. The next receipt is the last one plus the Code's average gap
+# between receipts in the trailing 180 days; an overdue receipt is
+# expected the next day.
+# Parameters: $1 as-of date, $2 window in days, $3 list of Codes (NULL for all).
+DAYS_OF_COVER_SQL = """
+WITH Cutoff AS (
+    SELECT LEAST(CAST($1 AS DATE), MAX(Date)) AS Day
+    FROM StockLedger
+),
+Closing AS (
+    SELECT 
+        Code,
+        arg_max(Closing_Stock, Month) AS Closing_Stock
+    FROM MonthlyClosingStock, Cutoff
+    WHERE Month < DATE_TRUNC('month', Cutoff.Day)
+      AND ($3 IS NULL OR list_contains($3, Code))
+    GROUP BY Code
+),
+Recent AS (
+    SELECT 
+        Code,
+        SUM(Qty) FILTER (WHERE Date >= DATE_TRUNC('month', Cutoff.Day)) AS Month_Qty,
+        -SUM(Qty) FILTER (
+            WHERE Date > Cutoff.Day - CAST($2 AS INTEGER) AND Movement IN ('Sales', 'CostCenter')
+        ) AS Outflow,
+        MAX(Date) FILTER (WHERE Movement = 'Received' AND Date >= Cutoff.Day - 180) AS Last_Receipt,
+        (MAX(Date) FILTER (WHERE Movement = 'Received' AND Date >= Cutoff.Day - 180)
+            - MIN(Date) FILTER (WHERE Movement = 'Received' AND Date >= Cutoff.Day - 180))
+            / NULLIF(COUNT(*) FILTER (WHERE Movement = 'Received' AND Date >= Cutoff.Day - 180) - 1, 0)
+            AS Receipt_Interval
+    FROM StockLedger, Cutoff
+    WHERE Date BETWEEN LEAST(
+            DATE_TRUNC('month', Cutoff.Day),
+            Cutoff.Day - GREATEST(CAST($2 AS INTEGER), 180)
+        ) AND Cutoff.Day
+      AND ($3 IS NULL OR list_contains($3, Code))
+    GROUP BY Code
+),
+Cover AS (
+    SELECT 
+        COALESCE(c.Code, r.Code) AS Code,
+        COALESCE(c.Closing_Stock, 0) + COALESCE(r.Month_Qty, 0) AS Stock,
+        COALESCE(r.Outflow, 0) / CAST($2 AS INTEGER) AS Avg_Daily_Outflow,
+        GREATEST(
+            r.Last_Receipt + CAST(ROUND(r.Receipt_Interval) AS INTEGER),
+            Cutoff.Day + 1
+        ) AS Next_Receipt,
+        Cutoff.Day AS As_Of
+    FROM Closing c
+    FULL OUTER JOIN Recent r
+        ON c.Code = r.Code
+    CROSS JOIN Cutoff
+),
+Projection AS (
+    SELECT 
+        *,
+        CASE WHEN Avg_Daily_Outflow > 0 THEN GREATEST(Stock, 0) / Avg_Daily_Outflow END AS Days_Of_Cover
+    FROM Cover
+)
+SELECT 
+    Code,
+    Stock,
+    Avg_Daily_Outflow,
+    Days_Of_Cover,
+    As_Of + CAST(FLOOR(Days_Of_Cover) AS INTEGER) AS Stockout_Date,
+    Next_Receipt,
+    COALESCE(As_Of + CAST(FLOOR(Days_Of_Cover) AS INTEGER) < Next_Receipt, FALSE) AS Stockout_Before_Receipt,
+    As_Of
+FROM Projection
+ORDER BY Days_Of_Cover NULLS LAST, Code
+"""
+
+# Orders and Sales per Code and day over a range, full outer joined. The
+# Code filter is applied to each side before the join, so only the
+# selected Codes are aggregated.
+# Parameters: $1 start date, $2 end date, $3 list of Codes (NULL for all).
+ORDERS_VS_SALES_SQL = """
+WITH o AS (
+    SELECT 
+        CAST(Code AS VARCHAR) AS Code,
+        Sales_Date,
+        CAST(SUM(CAST(Qty AS INTEGER)) AS BIGINT) AS Total_Orders
+    FROM OrdersFact
+    WHERE Sales_Date BETWEEN CAST($1 AS DATE) AND CAST($2 AS DATE)
+      AND ($3 IS NULL OR list_contains($3, CAST(Code AS VARCHAR)))
+    GROUP BY Code, Sales_Date
+),
+s AS (
+    SELECT 
+        CAST(Code AS VARCHAR) AS Code,
+        Sales_Date,
+        CAST(SUM(CAST(Qty AS INTEGER)) AS BIGINT) AS Total_Sales
+    FROM SalesFact
+    WHERE Sales_Date BETWEEN CAST($1 AS DATE) AND CAST($2 AS DATE)
+      AND ($3 IS NULL OR list_contains($3, CAST(Code AS VARCHAR)))
+    GROUP BY Code, Sales_Date
+)
+SELECT 
+    COALESCE(o.Code, s.Code) AS Code,
+    COALESCE(o.Sales_Date, s.Sales_Date) AS Sales_Date,
+    COALESCE(o.Total_Orders, 0) AS Total_Orders,
+    COALESCE(s.Total_Sales, 0) AS Total_Sales,
+    COALESCE(s.Total_Sales, 0) - COALESCE(o.Total_Orders, 0) AS Difference,
+    COALESCE(s.Total_Sales, 0) * 100.0 / NULLIF(o.Total_Orders, 0) AS Fulfillment_Rate
+FROM o
+FULL OUTER JOIN s
+    ON o.Code = s.Code AND o.Sales_Date = s.Sales_Date
+"""
@@ -0,0 +1,360 @@
+"""Local query service that owns the DuckDB database.
+
+    python -m dashboard.query_service --port 8765 --threads 4
+
+Pages send SQL over HTTP instead of running it on their own connection, so
+a long full-history query runs here and no longer holds a Streamlit script
+thread. Set ``DISPATCH_QUERY_SERVICE=http://127.0.0.1:8765`` for the
+Streamlit processes to use it. Endpoints:
+
+- ``POST /query`` with JSON ``{"sql", "params", "query_id", "session"}``.
+  Returns the result as an Arrow IPC stream. Identical queries on the same
+  data snapshot are answered from an in-memory cache. Only a single
+  read-only statement is run (``SELECT``, and the ``SHOW``, ``DESCRIBE``
+  and ``PRAGMA`` forms DuckDB plans as one); anything else is refused with 403.
+- ``POST /cancel`` with JSON ``{"query_id"}``. Interrupts that query
+  whether it is still queued or already running.
+- ``GET /queue/<query_id>`` returns ``{"position"}``, the query's place in
+  line, or 0 once it runs.
+- ``GET /fingerprints`` returns the source table fingerprints of the
+  snapshot it holds, which the pages' freshness check reads instead of
+  opening the database file themselves.
+- ``GET /health`` returns queue, cache and snapshot counters as JSON.
+- ``GET /api/v1/...`` serves the headless aggregate API (see dashboard/api.py).
+
+POST bodies must be sent as ``application/json``, so a web page cannot
+reach the service with a cross-site form or ``text/plain`` request. The
+database is opened without external access: SQL cannot read or write
+files outside it.
+
+Queries are admitted by estimated cost (see dashboard/scheduler.py): at
+most ``--threads`` interactive and ``DISPATCH_HEAVY_SLOTS`` heavy queries
+run at once, and the sessions waiting in each class take turns.
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import duckdb
+import pyarrow as pa
+
+from dashboard import api
+from dashboard.catalog import refresh_catalog
+from dashboard.db import current_snapshot
+from dashboard.freshness import read_fingerprints
+from dashboard.scheduler import CLASS_SLOTS, QueryScheduler, classify
+from dashboard.search import load_index
+from dashboard.snapshots import refresh_derived
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# Results cached in memory, in bytes of Arrow IPC
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# How long a data snapshot signature is trusted before it is recomputed
+SNAPSHOT_TTL_SECONDS = 30
+
+# No file access from SQL: read_text(), COPY ... TO and the like are refused
+CONNECTION_CONFIG = {"enable_external_access": False}
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class QueryRefused(Exception):
+    pass
+
+
+class QueryService:
+    """DuckDB connection plus a bounded query queue, cancellation and a result cache."""
+
+    def __init__(self, db_filename=None, threads=4, read_only=True,
+                 cache_max_bytes=CACHE_MAX_BYTES):
+        # Without an explicit file the service follows the published snapshot
+        self.follow = db_filename is None
+        self.read_only = read_only
+        self.path = db_filename or current_snapshot()
+        self.con = duckdb.connect(self.path, read_only=read_only, config=CONNECTION_CONFIG)
+        self.scheduler = QueryScheduler({**CLASS_SLOTS, "interactive": threads})
+        self.lock = threading.Lock()
+        # Held while the snapshot is checked, reopened or refreshed, and the search index built
+        self.snapshot_lock = threading.RLock()
+        self.running = {}       # query_id -> cursor
+        self.cancelled = set()  # query_ids cancelled before they started
+        self.waiting = {}       # query_id -> Future, still in the queue
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.cache_max_bytes = cache_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._snapshot = (0.0, None)
+        self._index = (None, None)  # (snapshot signature, CodeIndex)
+
+    # ---- SNAPSHOT ----
+    def snapshot(self):
+        """(path, source fingerprints) of the data queries run on; keys the result cache.
+
+        The fingerprints include a checksum of every row (see
+        dashboard/freshness.py), so a corrected row changes the signature
+        even when no row count moves. Request threads call this at once, so
+        only one of them reopens the file or refreshes the derived tables
+        while the others wait for its result.
+        """
+        with self.snapshot_lock:
+            checked_at, signature = self._snapshot
+            if self.follow and current_snapshot() != self.path:
+                # Queries already running keep their cursors on the old connection
+                self.path = current_snapshot()
+                self.con = duckdb.connect(self.path, read_only=self.read_only, config=CONNECTION_CONFIG)
+                checked_at = 0.0
+            if time.monotonic() - checked_at > SNAPSHOT_TTL_SECONDS:
+                previous = signature
+                opened = previous is None or previous[0] != self.path
+                if not opened and self.read_only:
+                    # Nothing can write a file this service holds read-only
+                    fingerprints = dict(previous[1])
+                elif opened and not self.read_only:
+                    # This service owns the file: fingerprint it once as it is opened
+                    fingerprints = refresh_catalog(self.con)
+                else:
+                    fingerprints = read_fingerprints(self.con, writable=False)
+                signature = (self.path, tuple(sorted(fingerprints.items())))
+                if signature != previous and not self.read_only:
+                    # This service owns the database, so pages leave the derived tables to it
+                    refresh_derived(self.con, fingerprints)
+                self._snapshot = (time.monotonic(), signature)
+            return signature
+
+    def fingerprints(self):
+        """{source table: fingerprint} of the current snapshot (see dashboard/freshness.py)."""
+        return dict(self.snapshot()[1])
+
+    def code_index(self):
+        """The Code search index of the current snapshot, rebuilt when it changes."""
+        with self.snapshot_lock:
+            signature = self.snapshot()
+            built_for, index = self._index
+            if built_for != signature:
+                index = load_index(self.con.cursor())
+                self._index = (signature, index)
+            return index
+
+    # ---- CACHE ----
+    def _cache_get(self, key):
+        with self.lock:
+            payload = self.cache.get(key)
+            if payload is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return payload
+
+    def _cache_put(self, key, payload):
+        if len(payload) > self.cache_max_bytes:
+            return
+        with self.lock:
+            if key in self.cache:
+                return
+            self.cache[key] = payload
+            self.cache_bytes += len(payload)
+            while self.cache_bytes > self.cache_max_bytes:
+                _, evicted = self.cache.popitem(last=False)
+                self.cache_bytes -= len(evicted)
+
+    # ---- EXECUTION ----
+    def check_read_only(self, sql):
+        """Raise ``QueryRefused`` unless ``sql`` is a single statement that only reads."""
+        statements = self.con.cursor().extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise QueryRefused("only a single read-only statement is accepted")
+
+    def _execute(self, query_id, sql, params):
+        with self.lock:
+            self.waiting.pop(query_id, None)
+            if query_id in self.cancelled:
+                self.cancelled.discard(query_id)
+                raise QueryCancelled(query_id)
+            cursor = self.con.cursor()
+            self.running[query_id] = cursor
+        try:
+            result = cursor.execute(sql, params).arrow()
+            table = result.read_all() if hasattr(result, "read_all") else result
+        except duckdb.InterruptException as e:
+            raise QueryCancelled(query_id) from e
+        finally:
+            with self.lock:
+                self.running.pop(query_id, None)
+            cursor.close()
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def run(self, query_id, sql, params=(), session=""):
+        """Arrow IPC bytes for ``sql``, from the cache or through ``session``'s queue."""
+        self.check_read_only(sql)
+        key = (self.snapshot(), sql, json.dumps(params, default=str))
+        payload = self._cache_get(key)
+        if payload is None:
+            cost_class = classify(self.con.cursor(), sql, list(params))
+            with self.lock:
+                future = self.scheduler.submit(
+                    cost_class, session, lambda: self._execute(query_id, sql, list(params))
+                )
+                self.waiting[query_id] = future
+            try:
+                payload = future.result()
+            except CancelledError as e:
+                with self.lock:
+                    self.waiting.pop(query_id, None)
+                raise QueryCancelled(query_id) from e
+            self._cache_put(key, payload)
+        return payload
+
+    def position(self, query_id):
+        """Place of ``query_id`` in its class's line; 0 once it runs or if unknown."""
+        with self.lock:
+            future = self.waiting.get(query_id)
+        return self.scheduler.position(future) if future is not None else 0
+
+    def cancel(self, query_id):
+        """Interrupt a running query or drop a queued one. True if it was found."""
+        with self.lock:
+            future = self.waiting.get(query_id)
+            if future is not None:
+                # Dropped from the queue, or stopped by _execute if it is about to start
+                if not future.cancel():
+                    self.cancelled.add(query_id)
+                return True
+            cursor = self.running.get(query_id)
+            if cursor is None:
+                return False
+        cursor.interrupt()
+        return True
+
+    def health(self):
+        with self.lock:
+            return {
+                "running": len(self.running),
+                "queued": len(self.waiting),
+                "classes": self.scheduler.stats(),
+                "cache_entries": len(self.cache),
+                "cache_bytes": self.cache_bytes,
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "snapshot": self.path,
+                "fingerprints": dict(self._snapshot[1][1]) if self._snapshot[1] else {},
+            }
+
+
+# ---- HTTP ----
+class QueryHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._json(200, self.service.health())
+        elif self.path == "/fingerprints":
+            self._json(200, self.service.fingerprints())
+        elif self.path.startswith("/queue/"):
+            self._json(200, {"position": self.service.position(self.path[len("/queue/"):])})
+        elif self.path.startswith("/api/v1/"):
+            try:
+                status, headers, body = api.handle(self.service, self.path, self.headers)
+            except QueryCancelled:
+                self._json(409, {"error": "cancelled"})
+                return
+            except duckdb.Error as e:
+                self._json(500, {"error": str(e)})
+                return
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.headers.get_content_type() != "application/json":
+            self._json(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            body = self._body()
+        except ValueError:
+            self._json(400, {"error": "invalid JSON"})
+            return
+
+        if self.path == "/cancel":
+            self._json(200, {"cancelled": self.service.cancel(body.get("query_id"))})
+            return
+        if self.path != "/query":
+            self._json(404, {"error": "not found"})
+            return
+
+        try:
+            query_id = body.get("query_id") or uuid.uuid4().hex
+            payload = self.service.run(
+                query_id, body["sql"], body.get("params") or [], body.get("session") or ""
+            )
+        except QueryCancelled:
+            self._json(409, {"error": "cancelled"})
+            return
+        except QueryRefused as e:
+            self._json(403, {"error": str(e)})
+            return
+        except (KeyError, duckdb.Error) as e:
+            self._json(400, {"error": str(e)})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ARROW_STREAM)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--database", help="database file (default: the live snapshot)")
+    parser.add_argument("--read-write", action="store_true",
+                        help="open the database read-write (only one process may do this)")
+    args = parser.parse_args()
+
+    QueryHandler.service = QueryService(args.database, args.threads, read_only=not args.read_write)
+    server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+    print(f"Query service on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
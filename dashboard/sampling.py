@@ -0,0 +1,93 @@
+"""Fast preview mode: answer chart aggregates from a Bernoulli sample of Sales."""
+from concurrent.futures import ThreadPoolExecutor
+import math
+
+import streamlit as st
+
+# Percentage of Sales rows read in fast preview mode
+SAMPLE_PERCENT = 10
+
+# 95% confidence interval
+Z_SCORE = 1.96
+
+
+def sample_clause(sample_percent=None):
+    """Return the DuckDB sampling clause to append after ``FROM <table>``."""
+    if not sample_percent:
+        return ""
+    return f"USING SAMPLE {float(sample_percent)} PERCENT (bernoulli)"
+
+
+def sample_fraction(sample_percent=None):
+    """Fraction of rows kept by the sample (1.0 when not sampling)."""
+    return float(sample_percent) / 100 if sample_percent else 1.0
+
+
+def scale_to_population(values, sample_percent=None):
+    """Scale sampled quantities so sums over them estimate the full totals."""
+    return values / sample_fraction(sample_percent)
+
+
+def estimate_total(scaled_values, sample_percent=None):
+    """Estimate a population total and its 95% half-width.
+
+    ``scaled_values`` are quantities already divided by the sampling fraction
+    (see ``scale_to_population``). Under Bernoulli sampling the variance of
+    the Horvitz-Thompson total is ``(1 - p) * sum(scaled ** 2)``.
+    """
+    p = sample_fraction(sample_percent)
+    total = float(scaled_values.sum())
+    if p >= 1.0:
+        return total, 0.0
+    variance = (1 - p) * float((scaled_values ** 2).sum())
+    return total, Z_SCORE * math.sqrt(variance)
+
+
+def estimate_count(sample_rows, sample_percent=None):
+    """Estimate a population row count and its 95% half-width."""
+    p = sample_fraction(sample_percent)
+    if p >= 1.0:
+        return float(sample_rows), 0.0
+    variance = sample_rows * (1 - p) / (p ** 2)
+    return sample_rows / p, Z_SCORE * math.sqrt(variance)
+
+
+def format_estimate(value, half_width):
+    """Format an estimate for a metric tile, e.g. ``12,345 ± 210``."""
+    if not half_width:
+        return f"{value:,.0f}"
+    return f"{value:,.0f} ± {half_width:,.0f}"
+
+
+# ---- BACKGROUND REFINEMENT ----
+@st.cache_resource
+def _refine_executor():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="refine")
+
+
+def refine_in_background(key, loader, *args):
+    """Run the exact ``loader(*args)`` in a worker thread, once per session.
+
+    ``loader`` should be cached (``st.cache_data`` or a shared dataset) so the
+    finished result is already there when the page reruns in exact mode.
+    """
+    future = st.session_state.get(key)
+    if future is None or (future.done() and future.exception() is not None):
+        st.session_state[key] = _refine_executor().submit(loader, *args)
+
+
+def refinement_ready(key):
+    """True once the background exact load for ``key`` has finished."""
+    future = st.session_state.get(key)
+    return future is not None and future.done() and future.exception() is None
+
+
+def watch_refinement(key, interval=2):
+    """Poll the background load and rerun the page with exact numbers when done."""
+    @st.fragment(run_every=interval)
+    def _poll():
+        if refinement_ready(key):
+            st.rerun()
+        st.caption("⏳ Showing a sampled preview - refining to exact numbers in the background...")
+
+    _poll()
@@ -0,0 +1,156 @@
+"""Admission control for page queries: cost classes, slots and fair queues.
+
+A few full-history queries (the Sunburst over every date, the Stock
+Register from 2024) each use every DuckDB thread for seconds. Run next to
+them, the small date-picker and top-k queries of everyone else wait too.
+
+``classify(cursor, sql, params)`` plans a query with ``EXPLAIN (FORMAT
+JSON)`` and adds up the rows of every table it scans, taken from DuckDB's
+table statistics (``duckdb_tables().estimated_size``). The cursor decides
+which tables those are, so a range the in-memory hot tier covers is
+costed on its small copies (see dashboard/tiers.py). Queries scanning
+more than ``HEAVY_ROWS`` rows are ``heavy``, the rest ``interactive``.
+
+``QueryScheduler`` runs each class on its own slots, so heavy queries can
+never take the slots interactive ones need. Within a class the sessions
+take turns: a session with ten queued queries does not hold up one with a
+single query. ``position(future)`` is a queued query's place in line,
+which pages show while they wait.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Estimated rows scanned above which a query is heavy
+HEAVY_ROWS = int(os.environ.get("DISPATCH_HEAVY_ROWS", "1000000"))
+
+# Queries of each class that run at once
+CLASS_SLOTS = {
+    "interactive": int(os.environ.get("DISPATCH_INTERACTIVE_SLOTS", "8")),
+    "heavy": int(os.environ.get("DISPATCH_HEAVY_SLOTS", "2")),
+}
+
+
+# ---- COST ESTIMATE ----
+def _sources(node):
+    """The leaf operators (table scans, table functions) of an ``EXPLAIN (FORMAT JSON)`` plan."""
+    children = node.get("children") or []
+    if not children:
+        yield node.get("extra_info", {})
+    for child in children:
+        yield from _sources(child)
+
+
+def estimate_rows(cursor, sql, params=()):
+    """Rows ``sql`` reads: the size of every table it scans.
+
+    Table functions and CTE scans count their estimated cardinality.
+    """
+    plan = json.loads(cursor.execute("EXPLAIN (FORMAT JSON) " + sql, list(params)).fetchall()[0][1])
+    sizes = dict(cursor.execute("""
+        SELECT database_name || '.' || schema_name || '.' || table_name, estimated_size
+        FROM duckdb_tables()
+    """).fetchall())
+    rows = 0
+    for root in plan:
+        for source in _sources(root):
+            table = source.get("Table")
+            if table in sizes:
+                rows += sizes[table]
+            else:
+                rows += int(source.get("Estimated Cardinality", 0) or 0)
+    return rows
+
+
+def classify(cursor, sql, params=()):
+    """``heavy`` or ``interactive``; a query that cannot be planned counts as interactive."""
+    try:
+        rows = estimate_rows(cursor, sql, params)
+    except Exception:
+        # The query itself will fail with the same error, and fast
+        return "interactive"
+    return "heavy" if rows > HEAVY_ROWS else "interactive"
+
+
+# ---- QUEUES ----
+class QueryScheduler:
+    """Per-class slots and queues with sessions served round-robin."""
+
+    def __init__(self, slots=None, name="query"):
+        self.slots = dict(CLASS_SLOTS if slots is None else slots)
+        self.lock = threading.Lock()
+        self.running = dict.fromkeys(self.slots, 0)
+        # class -> session -> queued (future, function); dict order is the sessions' turn
+        self.queues = {cost_class: OrderedDict() for cost_class in self.slots}
+        self.pools = {
+            cost_class: ThreadPoolExecutor(max_workers=count, thread_name_prefix=f"{name}-{cost_class}")
+            for cost_class, count in self.slots.items()
+        }
+
+    def submit(self, cost_class, session, fn):
+        """Queue ``fn()`` for ``session``; returns a Future of its result.
+
+        Cancelling the Future before the query starts drops it from the queue.
+        """
+        future = Future()
+        with self.lock:
+            self.queues[cost_class].setdefault(session, deque()).append((future, fn))
+        self._dispatch(cost_class)
+        return future
+
+    def _dispatch(self, cost_class):
+        queue = self.queues[cost_class]
+        while True:
+            with self.lock:
+                if self.running[cost_class] >= self.slots[cost_class] or not queue:
+                    return
+                session, waiting = next(iter(queue.items()))
+                future, fn = waiting.popleft()
+                # The session goes to the back of the line for its next query
+                del queue[session]
+                if waiting:
+                    queue[session] = waiting
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.running[cost_class] += 1
+            self.pools[cost_class].submit(self._run, cost_class, future, fn)
+
+    def _run(self, cost_class, future, fn):
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.running[cost_class] -= 1
+            self._dispatch(cost_class)
+
+    def position(self, future):
+        """1-based place of a queued ``future`` in its class's line; 0 once it has started."""
+        with self.lock:
+            for queue in self.queues.values():
+                rounds = [[f for f, _ in waiting if not f.cancelled()] for waiting in queue.values()]
+                ahead = 0
+                for turn in range(max(map(len, rounds), default=0)):
+                    for futures in rounds:
+                        if turn < len(futures):
+                            ahead += 1
+                            if futures[turn] is future:
+                                return ahead
+        return 0
+
+    def stats(self):
+        """{class: {"running", "queued", "slots"}}."""
+        with self.lock:
+            return {
+                cost_class: {
+                    "running": self.running[cost_class],
+                    "queued": sum(
+                        not f.cancelled() for waiting in queue.values() for f, _ in waiting
+                    ),
+                    "slots": self.slots[cost_class],
+                }
+                for cost_class, queue in self.queues.items()
+            }
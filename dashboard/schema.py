@@ -0,0 +1,124 @@
+"""Normalized schema with ENUM-encoded dimension columns.
+
+Route, Code, Supervisor, Category2 and Category3 are stored as DuckDB ENUM
+types built from the source tables, so joins and group-bys compare small
+integers and loaders get pandas ``Categorical`` columns back. Code is
+always cast through VARCHAR first, which removes the int/str mismatches
+between tables.
+
+Each normalized table records the fingerprints of the source table it was
+built from (see dashboard/freshness.py), so a corrected row is noticed even
+when the row count stays the same.
+"""
+import streamlit as st
+
+from dashboard.db import QUERY_SERVICE_URL, READ_ONLY, current_snapshot, get_duckdb
+from dashboard.freshness import (
+    built_from, current_version, record_built, start_background_check, take_fingerprints
+)
+
+# ENUM type -> source (table, column) pairs whose distinct values it holds
+DIMENSIONS = {
+    "code_t": [
+        ("Sales", "Code"), ("Orders", "Code"), ("Products", "Code"),
+        ("Received", "Code"), ("Adjustment", "Code"), ("CostCenter", "Code"),
+    ],
+    "route_t": [("Sales", "Route"), ("Supervisors", "Route")],
+    "supervisor_t": [("Supervisors", "Supervisor")],
+    "category2_t": [("Products", "Category2")],
+    "category3_t": [("Products", "Category3")],
+}
+
+# Normalized table -> (source table, SELECT list)
+TABLES = {
+    "SalesFact": ("Sales", """
+        CAST(Sales_Date AS DATE) AS Sales_Date,
+        CAST(CAST(Code AS VARCHAR) AS code_t) AS Code,
+        CAST(CAST(Route AS VARCHAR) AS route_t) AS Route,
+        TRY_CAST(Qty AS DOUBLE) AS Qty
+    """),
+    "OrdersFact": ("Orders", """
+        CAST(Sales_Date AS DATE) AS Sales_Date,
+        CAST(CAST(Code AS VARCHAR) AS code_t) AS Code,
+        TRY_CAST(Qty AS DOUBLE) AS Qty
+    """),
+    "DimProducts": ("Products", """
+        CAST(CAST(Code AS VARCHAR) AS code_t) AS Code,
+        Description,
+        CAST(CAST(Category2 AS VARCHAR) AS category2_t) AS Category2,
+        CAST(CAST(Category3 AS VARCHAR) AS category3_t) AS Category3
+    """),
+    "DimRoutes": ("Supervisors", """
+        CAST(CAST(Route AS VARCHAR) AS route_t) AS Route,
+        CAST(CAST(Supervisor AS VARCHAR) AS supervisor_t) AS Supervisor
+    """),
+}
+
+
+# Source tables the normalized schema is built from
+SOURCES = tuple(sorted({source for source, _ in TABLES.values()}))
+
+
+def _is_current(con, fingerprints):
+    """True when every normalized table was built from its source's fingerprint in ``fingerprints``."""
+    return all(
+        built_from(con, table).get(source) == fingerprints.get(source)
+        for table, (source, _) in TABLES.items()
+    )
+
+
+def build_normalized_schema(con, fingerprints=None):
+    """Drop and rebuild the ENUM types and normalized tables.
+
+    ``fingerprints`` are those of the sources as they are now; without them
+    the sources are fingerprinted first.
+    """
+    if fingerprints is None:
+        fingerprints = take_fingerprints(con, SOURCES)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for table in TABLES:
+            con.execute(f"DROP TABLE IF EXISTS {table}")
+        for enum_type, sources in DIMENSIONS.items():
+            values = " UNION ".join(
+                f"SELECT CAST({column} AS VARCHAR) AS v FROM {table}" for table, column in sources
+            )
+            con.execute(f"DROP TYPE IF EXISTS {enum_type}")
+            con.execute(f"""
+                CREATE TYPE {enum_type} AS ENUM (
+                    SELECT v FROM ({values}) WHERE v IS NOT NULL ORDER BY v
+                )
+            """)
+        for table, (source, columns) in TABLES.items():
+            con.execute(f"CREATE TABLE {table} AS SELECT {columns} FROM {source}")
+            record_built(con, table, {source: fingerprints[source]})
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+
+@st.cache_resource(max_entries=1)
+def _ensure_current(_con, snapshot, version):
+    # ``snapshot`` and ``version`` only key the cache
+    con = _con.cursor()
+    fingerprints = dict(zip(SOURCES, version))
+    if not _is_current(con, fingerprints):
+        if READ_ONLY:
+            raise RuntimeError(
+                "Normalized schema is out of date; run `python scripts/serve.py --prepare-only` first."
+            )
+        build_normalized_schema(con, fingerprints)
+    return True
+
+
+def ensure_normalized_schema():
+    """Rebuild the normalized schema when its source tables' fingerprints have moved.
+
+    With a query service configured the service keeps it current, and this
+    process does not open the database.
+    """
+    start_background_check()
+    if QUERY_SERVICE_URL:
+        return True
+    return _ensure_current(get_duckdb(), current_snapshot(), current_version(SOURCES))
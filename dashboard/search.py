@@ -0,0 +1,122 @@
+"""Code and product description search shared by every search box.
+
+``CodeIndex`` is an in-memory n-gram inverted index over the distinct Codes
+of every source table and their ``Products.Description``. A query is
+answered by intersecting the posting sets of its n-grams, shortest first,
+and checking the few candidates left; it never scans the Code list or a
+fact table. Matches are ranked: exact Code, Code prefix, Code substring,
+then description word prefix and description substring.
+
+Pages call ``code_index().search(text)`` and pass the resulting Code list
+into their SQL (``list_contains(?, Code)``). The index is built once per
+snapshot and rebuilt when the Code or Products fingerprints change.
+"""
+import streamlit as st
+
+from dashboard.db import current_snapshot, run_query
+from dashboard.freshness import current_version, start_background_check
+from dashboard.schema import DIMENSIONS
+
+# Longest n-gram indexed; shorter queries use their own length
+NGRAM = 3
+
+# Source tables whose Codes are indexed, plus Products for the descriptions
+INDEXED_TABLES = tuple(sorted({table for table, _ in DIMENSIONS["code_t"]}))
+
+# Every distinct Code with its product description (NULL if it has none)
+CODE_ROWS_SQL = """
+    SELECT c.Code, ANY_VALUE(p.Description) AS Description
+    FROM ({codes}) c
+    LEFT JOIN Products p ON CAST(p.Code AS VARCHAR) = c.Code
+    WHERE c.Code IS NOT NULL
+    GROUP BY c.Code
+    ORDER BY c.Code
+""".format(codes=" UNION ".join(
+    f"SELECT CAST({column} AS VARCHAR) AS Code FROM {table}"
+    for table, column in DIMENSIONS["code_t"]
+))
+
+_EMPTY = frozenset()
+
+
+def _ngrams(text):
+    """Every substring of ``text`` from 1 to ``NGRAM`` characters long."""
+    return {
+        text[i:i + n]
+        for n in range(1, NGRAM + 1)
+        for i in range(len(text) - n + 1)
+    }
+
+
+class CodeIndex:
+    """N-gram inverted index over Codes and their descriptions."""
+
+    def __init__(self, rows):
+        self.codes = []        # id -> Code as stored
+        self.keys = []         # id -> (lower-case Code, lower-case description)
+        postings = {}
+        for i, (code, description) in enumerate(rows):
+            code_key = str(code).lower()
+            description_key = (description or "").lower()
+            self.codes.append(str(code))
+            self.keys.append((code_key, description_key))
+            for gram in _ngrams(code_key) | _ngrams(description_key):
+                postings.setdefault(gram, set()).add(i)
+        self.postings = {gram: frozenset(ids) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.codes)
+
+    @staticmethod
+    def _rank(query, code, description):
+        if code == query:
+            return 0
+        if code.startswith(query):
+            return 1
+        if query in code:
+            return 2
+        position = description.find(query)
+        if position < 0:
+            return None
+        # A match at the start of a word ranks above one inside a word
+        return 3 if position == 0 or not description[position - 1].isalnum() else 4
+
+    def search(self, text, limit=None):
+        """Codes matching ``text`` in Code or description, best match first."""
+        query = text.strip().lower()
+        if not query:
+            return []
+        grams = [query[i:i + NGRAM] for i in range(max(len(query) - NGRAM + 1, 1))]
+        sets = sorted((self.postings.get(gram, _EMPTY) for gram in grams), key=len)
+        candidates = sets[0].intersection(*sets[1:]) if sets[0] else _EMPTY
+
+        ranked = []
+        for i in candidates:
+            rank = self._rank(query, *self.keys[i])
+            if rank is not None:
+                ranked.append((rank, self.codes[i]))
+        ranked.sort()
+        return [code for _, code in ranked[:limit]]
+
+
+def load_index(con):
+    """Build a ``CodeIndex`` from a DuckDB connection or cursor."""
+    return CodeIndex(con.execute(CODE_ROWS_SQL).fetchall())
+
+
+@st.cache_resource(max_entries=2)
+def _index_for(snapshot, version):
+    # ``snapshot`` and ``version`` only key the cache
+    # Every run needs the index, so a rerun does not interrupt its build
+    return CodeIndex(run_query(CODE_ROWS_SQL, cancel_on_rerun=False).itertuples(index=False))
+
+
+def code_index():
+    """The search index of the live snapshot."""
+    start_background_check()
+    return _index_for(current_snapshot(), current_version(INDEXED_TABLES))
+
+
+def matching_codes(text):
+    """Codes matching a search box, or None when it is empty (no filter)."""
+    return code_index().search(text) if text and text.strip() else None
@@ -0,0 +1,158 @@
+"""Blue/green publishing of new database snapshots.
+
+    python -m dashboard.snapshots publish new.duckdb   # a file built elsewhere
+    python -m dashboard.snapshots publish --download   # fetch from Google Drive
+
+The new file is copied into ``SNAPSHOT_DIR`` next to the live one, so the
+live database is never touched. It is then validated (every source table
+present and non-empty) and warmed: the normalized schema, per-day Code
+totals, stock balances and statistics catalog are built in it. Only then
+is ``SNAPSHOT_POINTER`` atomically replaced. Each Streamlit rerun resolves the pointer, so sessions move to
+the new file on their next interaction while queries already running
+finish on the old connection. The previous snapshot is kept for those
+queries, and older ones are deleted.
+"""
+import argparse
+import glob
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+
+import duckdb
+
+from dashboard.balances import refresh_stock_balances
+from dashboard.catalog import refresh_catalog
+from dashboard.db import READ_ONLY, SNAPSHOT_POINTER, current_snapshot, download_database
+from dashboard.freshness import SOURCE_TABLES
+from dashboard.schema import _is_current, build_normalized_schema
+from dashboard.topk import refresh_daily_code_totals
+
+SNAPSHOT_DIR = os.environ.get("DISPATCH_SNAPSHOT_DIR", "snapshots")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def validate(con):
+    """Raise ``SnapshotError`` unless every source table exists and has rows."""
+    for table in SOURCE_TABLES:
+        try:
+            rows = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        except duckdb.Error as e:
+            raise SnapshotError(f"{table}: {e}") from e
+        if rows == 0:
+            raise SnapshotError(f"{table} is empty")
+
+
+def refresh_derived(con, fingerprints):
+    """Bring every derived table in step with the source ``fingerprints``.
+
+    Each table records the fingerprints it was built from, so one that is
+    already current costs a lookup. Read-only processes only read.
+    """
+    if READ_ONLY:
+        return
+    if not _is_current(con, fingerprints):
+        build_normalized_schema(con, fingerprints)
+    refresh_daily_code_totals(con, fingerprints)
+    refresh_stock_balances(con, fingerprints=fingerprints)
+
+
+def warm(con):
+    """Build the derived tables the pages would otherwise build on first use.
+
+    Read-only processes build nothing, so ``publish`` refuses to run in one.
+    """
+    if READ_ONLY:
+        return
+    # The catalog records the fingerprints every later check compares against
+    refresh_derived(con, refresh_catalog(con))
+    con.execute("CHECKPOINT")
+
+
+def _publish_pointer(path):
+    tmp_path = f"{SNAPSHOT_POINTER}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(path)
+    os.replace(tmp_path, SNAPSHOT_POINTER)
+
+
+def _retire(live, previous):
+    """Delete snapshots other than the live one and the one it replaced."""
+    keep = {os.path.abspath(live), os.path.abspath(previous)}
+    for path in glob.glob(os.path.join(SNAPSHOT_DIR, "dispatch-*.duckdb")):
+        if os.path.abspath(path) not in keep:
+            for stale in (path, f"{path}.wal"):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+def publish(source=None, download=False, prepare=None):
+    """Stage, validate, warm and switch to a new snapshot; returns its path.
+
+    ``prepare(con)``, if given, runs on the staged copy first (used by the
+    incremental ingest to apply deltas to a copy of the live snapshot).
+    """
+    if READ_ONLY:
+        # warm would skip every derived table, and read-only workers refuse such a file
+        raise SnapshotError("Cannot warm a snapshot with DISPATCH_READ_ONLY set; publish from a read-write process.")
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(SNAPSHOT_DIR, f"dispatch-{stamp}.duckdb")
+    staging = f"{path}.staging"
+
+    if download:
+        status = download_database(staging)
+        if status != 200:
+            raise SnapshotError(f"Failed to download database. Status code = {status}")
+    else:
+        shutil.copyfile(source, staging)
+
+    try:
+        con = duckdb.connect(staging)
+        try:
+            if prepare is not None:
+                prepare(con)
+            validate(con)
+            warm(con)
+        finally:
+            con.close()
+    except Exception:
+        for leftover in (staging, f"{staging}.wal"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+
+    os.replace(staging, path)
+    previous = current_snapshot()
+    _publish_pointer(path)
+    _retire(path, previous)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", help="stage, validate, warm and switch to a new snapshot")
+    pub.add_argument("source", nargs="?", help="database file to publish")
+    pub.add_argument("--download", action="store_true", help="fetch the snapshot from Google Drive")
+    sub.add_parser("current", help="print the live snapshot path")
+    args = parser.parse_args()
+
+    if args.command == "current":
+        print(current_snapshot())
+        return
+    if not args.source and not args.download:
+        parser.error("give a database file or --download")
+    try:
+        print(f"Published {publish(args.source, args.download)}")
+    except SnapshotError as e:
+        sys.exit(f"Snapshot rejected: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""In-memory hot tier holding the most recent days of every date-keyed table.
+
+Most sessions look at the last 30-90 days. ``hot_tier()`` copies the
+source, fact, per-day total and ledger rows from ``HOT_DAYS`` days before
+the latest day on, plus the small dimension and balance tables in full,
+into an in-memory DuckDB database with the same table names and column
+types. The snapshot file keeps the full history and is the cold tier.
+
+Queries are routed by the first day they read: ``connection_for(start)``
+returns a cursor on the hot tier when it holds every day from ``start`` on,
+otherwise one on the snapshot. The same SQL runs unchanged on either. The
+tier is rebuilt for each new snapshot and whenever the fingerprints of its
+source tables change. Set ``DISPATCH_HOT_DAYS=0`` to turn it off.
+
+The hot tier is a separate in-memory connection filled over Arrow rather
+than a database ATTACHed to the snapshot connection: DuckDB refuses to
+attach a file this process already has open, and a read-only instance
+cannot attach an in-memory database.
+"""
+import os
+from datetime import timedelta
+
+import duckdb
+import streamlit as st
+
+from dashboard.db import current_snapshot, get_duckdb
+from dashboard.freshness import SOURCE_TABLES, current_version, start_background_check
+from dashboard.schema import ensure_normalized_schema
+
+HOT_DAYS = int(os.environ.get("DISPATCH_HOT_DAYS", "90"))
+
+# Tables copied from the hot tier's first day on -> their date column
+HOT_TABLES = {
+    **{table: column for table, column in SOURCE_TABLES.items() if column},
+    "SalesFact": "Sales_Date",
+    "OrdersFact": "Sales_Date",
+    "DailyCodeTotals": "Date",
+    "StockLedger": "Date",
+}
+
+# Tables copied whole: dimensions and month-end balances
+WHOLE_TABLES = ("Products", "Supervisors", "DimProducts", "DimRoutes", "MonthlyClosingStock")
+
+# Every source table feeds the tier, so a change to any of them rebuilds it
+HOT_SOURCES = tuple(SOURCE_TABLES)
+
+
+class HotTier:
+    """In-memory copy of the days from ``days`` before the latest Sales or Orders day on."""
+
+    def __init__(self, source, days=HOT_DAYS):
+        source = source.cursor()
+        present = {
+            name for (name,) in source.execute(
+                "SELECT table_name FROM duckdb_tables() "
+                "WHERE database_name = current_database() AND schema_name = 'main'"
+            ).fetchall()
+        }
+        latest = source.execute("""
+            SELECT MAX(Day) FROM (
+                SELECT MAX(CAST(Sales_Date AS DATE)) AS Day FROM Sales
+                UNION ALL
+                SELECT MAX(CAST(Sales_Date AS DATE)) FROM Orders
+            )
+        """).fetchone()[0]
+        self.first_day = latest - timedelta(days=days) if latest else None
+        self.con = duckdb.connect(":memory:")
+        self.rows = {}
+        if self.first_day is None:
+            return
+
+        for table in [*WHOLE_TABLES, *HOT_TABLES]:
+            if table not in present:
+                continue
+            columns = source.execute("""
+                SELECT column_name, data_type FROM duckdb_columns()
+                WHERE database_name = current_database() AND schema_name = 'main'
+                  AND table_name = ?
+                ORDER BY column_index
+            """, [table]).fetchall()
+            # ENUM columns are declared with their full value list, so types match the snapshot
+            definition = ", ".join(f'"{name}" {data_type}' for name, data_type in columns)
+            self.con.execute(f"CREATE TABLE {table} ({definition})")
+            if table in HOT_TABLES:
+                date_column = HOT_TABLES[table]
+                batches = source.execute(
+                    f"SELECT * FROM {table} WHERE CAST({date_column} AS DATE) >= ? ORDER BY {date_column}",
+                    [self.first_day]
+                ).arrow()
+            else:
+                batches = source.execute(f"SELECT * FROM {table}").arrow()
+            self.con.register("batches", batches)
+            try:
+                self.con.execute(f"INSERT INTO {table} SELECT * FROM batches")
+            finally:
+                self.con.unregister("batches")
+            self.rows[table] = self.con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def covers(self, start):
+        return self.first_day is not None and start >= self.first_day
+
+
+@st.cache_resource(max_entries=1)
+def _tier_for(snapshot, version):
+    # ``snapshot`` and ``version`` only key the cache
+    # The fingerprint check has brought the derived tables in step with ``version``
+    ensure_normalized_schema()
+    return HotTier(get_duckdb())
+
+
+def hot_tier():
+    """The hot tier of the live snapshot, or None when it is turned off."""
+    if HOT_DAYS <= 0:
+        return None
+    start_background_check()
+    return _tier_for(current_snapshot(), current_version(HOT_SOURCES))
+
+
+def connection_for(start):
+    """Cursor for a query that reads no day before ``start`` (a date)."""
+    tier = hot_tier()
+    if tier is not None and tier.covers(start):
+        return tier.con.cursor()
+    return get_duckdb().cursor()
@@ -0,0 +1,200 @@
+"""Top-K rankings served from per-day Code totals instead of raw Sales.
+
+``DailyCodeTotals`` is written only where Sales changes: when a snapshot
+is warmed or prepared, by the inbox ingest for the days it replaced, and
+by a read-write process's fingerprint check. Pages only read it.
+"""
+from datetime import timedelta
+
+import pandas as pd
+
+from dashboard.db import READ_ONLY, run_query
+from dashboard.freshness import built_from, cached_from, record_built, take_fingerprints
+
+# Ranges longer than this use merged monthly sketches instead of an exact sum
+SKETCH_MIN_DAYS = 366
+
+# Counters kept per monthly sketch
+SKETCH_CAPACITY = 500
+
+# Per-day Code totals from Sales; {where} selects the days to (re)load
+DAILY_TOTALS_SELECT = """
+    SELECT 
+        CAST(Sales_Date AS DATE) AS Date,
+        CAST(Code AS VARCHAR) AS Code,
+        SUM(CAST(Qty AS INTEGER)) AS Qty
+    FROM Sales
+    WHERE {where}
+    GROUP BY CAST(Sales_Date AS DATE), CAST(Code AS VARCHAR)
+"""
+
+
+# ---- PER-DAY PARTIAL AGGREGATES ----
+def refresh_daily_code_totals(con, fingerprints=None):
+    """Create ``DailyCodeTotals`` and reload it unless it matches Sales' fingerprint.
+
+    ``fingerprints`` are the sources' current ones; without them Sales is
+    fingerprinted first. The ingest reloads only the days it replaced, so
+    a mismatch here means Sales changed some other way and every day is
+    reloaded. Read-only processes only read.
+    """
+    con = con.cursor()
+    if READ_ONLY:
+        return
+    if fingerprints is None:
+        fingerprints = take_fingerprints(con, ["Sales"])
+    if built_from(con, "DailyCodeTotals").get("Sales") == fingerprints["Sales"]:
+        return
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS DailyCodeTotals (
+            Date DATE,
+            Code VARCHAR,
+            Qty BIGINT
+        )
+    """)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute("DELETE FROM DailyCodeTotals")
+        con.execute("INSERT INTO DailyCodeTotals" + DAILY_TOTALS_SELECT.format(where="TRUE"))
+        record_built(con, "DailyCodeTotals", {"Sales": fingerprints["Sales"]})
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+
+# ---- SPACE-SAVING SKETCH ----
+class SpaceSaving:
+    """Space-Saving heavy-hitter summary with weighted updates and merging.
+
+    ``counts`` are upper bounds on each tracked item's total and ``errors``
+    how much of that may be overestimate. Any untracked item's total is at
+    most ``floor``.
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+
+    def update(self, item, weight=1):
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = self.floor
+        else:
+            victim = min(self.counts, key=self.counts.get)
+            min_count = self.counts.pop(victim)
+            self.errors.pop(victim)
+            self.counts[item] = min_count + weight
+            self.errors[item] = min_count
+            self.floor = max(self.floor, min_count)
+
+    @classmethod
+    def from_totals(cls, totals, capacity=SKETCH_CAPACITY):
+        """Summarise exact ``{item: total}`` by keeping the largest ``capacity``."""
+        sketch = cls(capacity)
+        ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+        sketch.counts = dict(ranked[:capacity])
+        sketch.errors = dict.fromkeys(sketch.counts, 0)
+        sketch.floor = ranked[capacity][1] if len(ranked) > capacity else 0
+        return sketch
+
+    def merge(self, other):
+        """Combine two summaries; untracked items are bounded by each side's floor."""
+        merged = SpaceSaving(max(self.capacity, other.capacity))
+        for item in set(self.counts) | set(other.counts):
+            merged.counts[item] = self.counts.get(item, self.floor) + other.counts.get(item, other.floor)
+            merged.errors[item] = (
+                self.errors.get(item, self.floor) + other.errors.get(item, other.floor)
+            )
+        ranked = sorted(merged.counts, key=merged.counts.get, reverse=True)
+        dropped = ranked[merged.capacity:]
+        merged.floor = max([self.floor + other.floor] + [merged.counts[i] for i in dropped])
+        for item in dropped:
+            merged.counts.pop(item)
+            merged.errors.pop(item)
+        return merged
+
+    def top(self, k):
+        """The ``k`` largest tracked items as a frame of Code, Qty and Error."""
+        ranked = sorted(self.counts, key=self.counts.get, reverse=True)[:k]
+        return pd.DataFrame({
+            'Code': ranked,
+            'Qty': [self.counts[c] for c in ranked],
+            'Error': [self.errors[c] for c in ranked],
+        })
+
+
+def _totals(df):
+    """{Code: quantity} from a frame of Code and Qty (sums come back as float)."""
+    return {code: int(qty) for code, qty in zip(df['Code'], df['Qty'])}
+
+
+@cached_from("Sales")
+def _month_sketch(month_start):
+    """Sketch of one calendar month of DailyCodeTotals."""
+    totals = run_query("""
+        SELECT Code, SUM(Qty) AS Qty
+        FROM DailyCodeTotals
+        WHERE Date >= ? AND Date < CAST(? AS DATE) + INTERVAL 1 MONTH
+        GROUP BY Code
+    """, [month_start, month_start])
+    return SpaceSaving.from_totals(_totals(totals))
+
+
+def _sketch_top_k(start, end, k):
+    """Top-K over whole months from cached sketches, edge days summed exactly."""
+    first_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1) if start.day != 1 else start
+    last_month = end.replace(day=1)
+    sketch = SpaceSaving()
+
+    # Partial months at either edge are summed exactly from the daily table
+    edges = run_query("""
+        SELECT Code, SUM(Qty) AS Qty
+        FROM DailyCodeTotals
+        WHERE (Date >= ? AND Date < ?) OR (Date >= ? AND Date <= ?)
+        GROUP BY Code
+    """, [start, first_month, last_month, end], since=start)
+    for code, qty in _totals(edges).items():
+        sketch.update(code, qty)
+
+    month = first_month
+    while month < last_month:
+        sketch = sketch.merge(_month_sketch(month))
+        month = (month + timedelta(days=32)).replace(day=1)
+    return sketch.top(k)
+
+
+# ---- RANKING QUERIES ----
+def top_k(start, end, k, codes=None, category=None):
+    """Top ``k`` Codes by quantity between ``start`` and ``end``.
+
+    ``codes`` limits the ranking to a list of Codes (see dashboard/search.py).
+
+    Reads only the per-day summaries. Unfiltered ranges longer than
+    ``SKETCH_MIN_DAYS`` are answered from merged monthly sketches, in which
+    case the frame has an ``Error`` column bounding each overestimate.
+    """
+    if (end - start).days > SKETCH_MIN_DAYS and codes is None and not category:
+        return _sketch_top_k(start, end, k)
+
+    query = """
+        SELECT Code, SUM(Qty) AS Qty
+        FROM DailyCodeTotals
+        WHERE Date BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
+          AND (? IS NULL OR list_contains(?, Code))
+          AND (? IS NULL OR Code IN (
+              SELECT CAST(Code AS VARCHAR) FROM Products WHERE Category3 = ?
+          ))
+        GROUP BY Code
+        ORDER BY Qty DESC
+        LIMIT ?
+    """
+    # Recent ranges are ranked on the in-memory hot tier
+    return run_query(query, [
+        start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'),
+        codes, codes, category, category, k
+    ], since=start)
@@ -1,28 +1,10 @@
-import os
-import requests
-import duckdb
 import streamlit as st
 import pandas as pd  # Missing import
+from dashboard.catalog import date_bounds, dimension_values
+from dashboard.db import run_query
+from dashboard.freshness import cached_from, check_now
+from dashboard.notes import day_fingerprint, load_note
 
-@st.cache_resource
-def get_duckdb():
-    db_filename = "dispatch.duckdb"
-    # Direct download link from Google Drive
-    url = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-
-    if not os.path.exists(db_filename):
-        st.write("Downloading database from Google Drive...")
-        resp = requests.get(url, allow_redirects=True)
-        if resp.status_code != 200:
-            st.error(f"Failed to download database. Status code = {resp.status_code}")
-            st.stop()
-        with open(db_filename, "wb") as f:
-            f.write(resp.content)
-
-    return duckdb.connect(db_filename)
-
-# Get connection
-con = get_duckdb()
 st.success("Connected to DuckDB!")
 
 # Page configuration
@@ -30,11 +12,10 @@ st.markdown("<h1 style='color: red;'>Dispatched Note</h1>", unsafe_allow_html=Tr
 st.subheader("Developed by :green[Samadul Hoque]")
 
 # Load and prepare data
-@st.cache_data
+@cached_from("Sales", "Supervisors")
 def load_data():
-    # Create the joined table
-    con.execute("""
-        CREATE OR REPLACE TABLE SalesWithSupervisors AS
+    # Sales joined to their supervisors
+    df = run_query("""
         SELECT 
             s.Code,
             s.Qty,
@@ -42,29 +23,27 @@ def load_data():
             s.Route,
             sup.Supervisor AS SupervisorName
         FROM Sales s
-        INNER JOIN Supervisors sup ON s.Route = sup.Route;
+        INNER JOIN Supervisors sup ON s.Route = sup.Route
     """)
-    
-    # Fetch all data
-    df = con.execute("SELECT * FROM SalesWithSupervisors;").fetchdf()
     return df
 
-# Get unique values for filters
-@st.cache_data
-def get_filter_values(df):
-    supervisors = sorted(df['SupervisorName'].unique().tolist())
-    # Convert dates to datetime for proper date handling
-    df['Sales_Date'] = pd.to_datetime(df['Sales_Date'], errors='coerce')
-    dates = df['Sales_Date'].dropna().unique()
-    return supervisors, dates
+# Checked against the pre-generated notes so a changed day is not served from them
+@cached_from("Sales", "Supervisors")
+def get_day_fingerprint(day):
+    return day_fingerprint(day)
+
+# Filter values come from the statistics catalog, not the loaded frame
+def get_filter_values():
+    supervisors = dimension_values("Supervisor", "Sales")
+    min_date, max_date = date_bounds("Sales")
+    return supervisors, min_date, max_date
 
 # Main app
 st.markdown("---")
 
 # Load data
 try:
-    df = load_data()
-    supervisors, dates = get_filter_values(df)
+    supervisors, min_date, max_date = get_filter_values()
     
     # Sidebar filters
     st.sidebar.header("🔍 Filters")
@@ -85,9 +64,6 @@ try:
     
     selected_dates = None
     if date_filter_type == "Single Date":
-        # Convert numpy datetime64 to Python datetime for date_input
-        min_date = pd.to_datetime(dates.min()).date() if len(dates) > 0 else None
-        max_date = pd.to_datetime(dates.max()).date() if len(dates) > 0 else None
         default_date = max_date if max_date else None
         
         selected_date = st.sidebar.date_input(
@@ -98,9 +74,6 @@ try:
         )
         selected_dates = [pd.Timestamp(selected_date)]
     elif date_filter_type == "Date Range":
-        # Convert numpy datetime64 to Python datetime for date_input
-        min_date = pd.to_datetime(dates.min()).date() if len(dates) > 0 else None
-        max_date = pd.to_datetime(dates.max()).date() if len(dates) > 0 else None
         default_start = min_date if min_date else None
         default_end = max_date if max_date else None
         
@@ -113,80 +86,124 @@ try:
         if len(date_range) == 2:
             selected_dates = pd.date_range(start=date_range[0], end=date_range[1])
     
-    # Apply filters
-    filtered_df = df.copy()
-    filtered_df['Sales_Date'] = pd.to_datetime(filtered_df['Sales_Date'], errors='coerce')
-    
-    if selected_supervisor != "All":
-        filtered_df = filtered_df[filtered_df['SupervisorName'] == selected_supervisor]
-    
-    if date_filter_type != "All Dates" and selected_dates is not None:
-        if date_filter_type == "Single Date":
-            filtered_df = filtered_df[filtered_df['Sales_Date'].dt.date == selected_dates[0].date()]
-        else:  # Date Range
-            filtered_df = filtered_df[
-                (filtered_df['Sales_Date'].dt.date >= selected_dates[0].date()) & 
-                (filtered_df['Sales_Date'].dt.date <= selected_dates[-1].date())
-            ]
+    # Pre-generated note for this supervisor and day (scripts/generate_notes.py)
+    note = None
+    if date_filter_type == "Single Date" and selected_dates:
+        note = load_note(selected_dates[0], selected_supervisor, get_day_fingerprint(selected_dates[0]))
     
-    # Display filter summary
-    st.sidebar.markdown("---")
-    st.sidebar.metric("Total Records", len(filtered_df))
-    
-    # Create pivot table
-    if len(filtered_df) > 0:
-        # Ensure Qty is numeric, convert if needed
-        filtered_df['Qty'] = pd.to_numeric(filtered_df['Qty'], errors='coerce').fillna(0)
-        
-        pivot_table = filtered_df.pivot_table(
-            index='Code',
-            columns='Route',
-            values='Qty',
-            aggfunc='sum',
-            fill_value=0
-        )
+    if note is not None:
+        summary = note["summary"]
+        pivot_table = note["pivot"]
         
-        # Add Total column
-        pivot_table['Total'] = pivot_table.sum(axis=1)
+        st.sidebar.markdown("---")
+        st.sidebar.metric("Total Records", summary["records"])
         
-        # Display metrics
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            total_qty = filtered_df['Qty'].sum()
-            st.metric("Total Quantity", f"{total_qty:,.0f}")
+            st.metric("Total Quantity", f"{summary['total_qty']:,.0f}")
         with col2:
-            st.metric("Unique Codes", len(pivot_table.index))
+            st.metric("Unique Codes", summary["codes"])
         with col3:
-            st.metric("Unique Routes", len(pivot_table.columns) - 1)  # Subtract 1 for Total column
+            st.metric("Unique Routes", summary["routes"])
         with col4:
-            avg_qty = filtered_df['Qty'].mean()
-            st.metric("Avg Qty per Code", f"{avg_qty:,.1f}")
+            st.metric("Avg Qty per Code", f"{summary['avg_qty']:,.1f}")
         
         st.markdown("---")
-        
-        # Display pivot table
         st.subheader("📈 Pivot Table: Code (Rows) × Route (Columns)")
-        
-        # Display the pivot table with basic styling
+        st.caption("Served from the pre-generated note for this day.")
         st.dataframe(pivot_table, use_container_width=True, height=600)
         
-        # Download button
         st.markdown("---")
-        csv = pivot_table.to_csv()
-        filename_date = selected_dates[0].strftime('%Y%m%d') if date_filter_type == "Single Date" and selected_dates else "all_dates"
-        supervisor_name = selected_supervisor.replace(" ", "_") if selected_supervisor != "All" else "all_supervisors"
         st.download_button(
             label="📥 Download Pivot Table as CSV",
-            data=csv,
-            file_name=f"sales_pivot_{supervisor_name}_{filename_date}.csv",
+            data=note["csv"],
+            file_name=note["csv_name"],
             mime="text/csv"
         )
-        
-        # Show raw filtered data
-        with st.expander("🔍 View Filtered Raw Data"):
-            st.dataframe(filtered_df, use_container_width=True)
+        if note["xlsx"] is not None:
+            st.download_button(
+                label="📥 Download Pivot Table as Excel",
+                data=note["xlsx"],
+                file_name=note["xlsx_name"],
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
     else:
-        st.warning("⚠️ No data available for the selected filters.")
+        # The full Sales x Supervisors frame is only needed without a note
+        df = load_data()
+        # Apply filters
+        filtered_df = df.copy()
+        filtered_df['Sales_Date'] = pd.to_datetime(filtered_df['Sales_Date'], errors='coerce')
+    
+        if selected_supervisor != "All":
+            filtered_df = filtered_df[filtered_df['SupervisorName'] == selected_supervisor]
+    
+        if date_filter_type != "All Dates" and selected_dates is not None:
+            if date_filter_type == "Single Date":
+                filtered_df = filtered_df[filtered_df['Sales_Date'].dt.date == selected_dates[0].date()]
+            else:  # Date Range
+                filtered_df = filtered_df[
+                    (filtered_df['Sales_Date'].dt.date >= selected_dates[0].date()) & 
+                    (filtered_df['Sales_Date'].dt.date <= selected_dates[-1].date())
+                ]
+    
+        # Display filter summary
+        st.sidebar.markdown("---")
+        st.sidebar.metric("Total Records", len(filtered_df))
+    
+        # Create pivot table
+        if len(filtered_df) > 0:
+            # Ensure Qty is numeric, convert if needed
+            filtered_df['Qty'] = pd.to_numeric(filtered_df['Qty'], errors='coerce').fillna(0)
+        
+            pivot_table = filtered_df.pivot_table(
+                index='Code',
+                columns='Route',
+                values='Qty',
+                aggfunc='sum',
+                fill_value=0
+            )
+        
+            # Add Total column
+            pivot_table['Total'] = pivot_table.sum(axis=1)
+        
+            # Display metrics
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                total_qty = filtered_df['Qty'].sum()
+                st.metric("Total Quantity", f"{total_qty:,.0f}")
+            with col2:
+                st.metric("Unique Codes", len(pivot_table.index))
+            with col3:
+                st.metric("Unique Routes", len(pivot_table.columns) - 1)  # Subtract 1 for Total column
+            with col4:
+                avg_qty = filtered_df['Qty'].mean()
+                st.metric("Avg Qty per Code", f"{avg_qty:,.1f}")
+        
+            st.markdown("---")
+        
+            # Display pivot table
+            st.subheader("📈 Pivot Table: Code (Rows) × Route (Columns)")
+        
+            # Display the pivot table with basic styling
+            st.dataframe(pivot_table, use_container_width=True, height=600)
+        
+            # Download button
+            st.markdown("---")
+            csv = pivot_table.to_csv()
+            filename_date = selected_dates[0].strftime('%Y%m%d') if date_filter_type == "Single Date" and selected_dates else "all_dates"
+            supervisor_name = selected_supervisor.replace(" ", "_") if selected_supervisor != "All" else "all_supervisors"
+            st.download_button(
+                label="📥 Download Pivot Table as CSV",
+                data=csv,
+                file_name=f"sales_pivot_{supervisor_name}_{filename_date}.csv",
+                mime="text/csv"
+            )
+        
+            # Show raw filtered data
+            with st.expander("🔍 View Filtered Raw Data"):
+                st.dataframe(filtered_df, use_container_width=True)
+        else:
+            st.warning("⚠️ No data available for the selected filters.")
         
 except Exception as e:
     st.error(f"❌ Error loading data: {str(e)}")
@@ -269,9 +286,13 @@ To navigate between pages:
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔧 Quick Actions")
-if st.sidebar.button("🔄 Refresh All Data"):
-    st.cache_data.clear()
-    st.success("Data refreshed successfully!")
+if st.sidebar.button("🔄 Check for New Data"):
+    # Only caches that read a changed table are cleared
+    changed = check_now(rescan=True)
+    if changed:
+        st.success(f"Reloaded data for: {', '.join(changed)}")
+    else:
+        st.success("Data is already up to date.")
 
 st.sidebar.markdown("### 📞 Support")
 st.sidebar.info("For technical support or feature requests, please contact the Dispatch Supervisor.")
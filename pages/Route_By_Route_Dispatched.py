@@ -1,10 +1,9 @@
 import streamlit as st
-import duckdb
-import requests
 import pandas as pd
 from datetime import date
-import urllib.request
-import os
+from dashboard.db import run_query
+from dashboard.freshness import cached_from, check_now
+from dashboard.search import matching_codes
 
 col1, col2, col3 = st.columns([1, 2, 1])
 with col3:
@@ -17,68 +16,37 @@ with col2:
 
 st.title("🔍 Sales Data Viewer")
 
-# ---- DATABASE PATH ---- 
-# Google Drive download URL
-GITHUB_DB_URL = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-LOCAL_DB_PATH = "dispatch.duckdb"
-
-# ---- DOWNLOAD DATABASE FROM GOOGLE DRIVE ----
-@st.cache_resource
-def get_duckdb():
-    db_filename = "dispatch.duckdb"
-    url = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-
-    if not os.path.exists(db_filename):
-        st.write("Downloading database from Google Drive...")
-        resp = requests.get(url, allow_redirects=True)
-        if resp.status_code != 200:
-            st.error(f"Failed to download database. Status code = {resp.status_code}")
-            st.stop()
-        with open(db_filename, "wb") as f:
-            f.write(resp.content)
-
-    return duckdb.connect(db_filename)
-
-# Get connection
-con = get_duckdb()
+# ---- DATABASE CONNECTION ----
+# Queries go through run_query, which uses the query service when one is configured
 st.success("Connected to DuckDB!")
 
-# ---- CREATE TABLE (if not exists) ----
-def ensure_join_table(con):
-    """Create or replace ProductsWithCode if it doesn't exist."""
-    try:
-        con.execute("""
-            CREATE OR REPLACE TABLE ProductsWithCode AS
-            SELECT 
-                s.Code,
-                s.Qty,
-                CAST(s.Sales_Date AS DATE) as Sales_Date,
-                s.Route,
-                p.Description AS Description
-            FROM Sales s
-            INNER JOIN Products p
-                ON s.Code = p.Code;
-        """)
-        st.success("ProductsWithCode table created successfully!")
-    except Exception as e:
-        st.error(f"Error creating table: {e}")
-
-# Initialize the table
-ensure_join_table(con)
+# ---- JOINED ROWS ----
+# Sales with their product description; read as a subquery, so no table is written
+PRODUCTS_WITH_CODE = """
+    SELECT 
+        s.Code,
+        s.Qty,
+        CAST(s.Sales_Date AS DATE) as Sales_Date,
+        s.Route,
+        p.Description AS Description
+    FROM Sales s
+    INNER JOIN Products p
+        ON s.Code = p.Code
+"""
 
 # ---- LOAD FILTERED DATA ----
-@st.cache_data
+@cached_from("Sales", "Products")
 def load_data(start_date=None, end_date=None, code_filter=None):
     """Load filtered data safely."""
     
-    query = """
+    query = f"""
         SELECT 
             Code,
             Description,
             Qty,
             Route,
             CAST(Sales_Date AS DATE) as Sales_Date
-        FROM ProductsWithCode
+        FROM ({PRODUCTS_WITH_CODE})
         WHERE 1=1
     """
     params = []
@@ -87,14 +55,15 @@ def load_data(start_date=None, end_date=None, code_filter=None):
         query += " AND Sales_Date BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)"
         params += [start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')]
     
-    if code_filter:
-        query += " AND LOWER(Code) LIKE LOWER(?)"
-        params.append(f"%{code_filter}%")
+    codes = matching_codes(code_filter)
+    if codes is not None:
+        query += " AND list_contains(?, CAST(Code AS VARCHAR))"
+        params.append(codes)
     
     query += " ORDER BY Sales_Date DESC"
     
     try:
-        df = con.execute(query, params).fetchdf()
+        df = run_query(query, params)
         
         # Ensure Qty column is numeric
         if 'Qty' in df.columns:
@@ -118,7 +87,7 @@ with col1:
 with col2:
     end_date = st.date_input("End Date", value=date.today())
 
-code_filter = st.sidebar.text_input("Search Code")
+code_filter = st.sidebar.text_input("Search Code or Description")
 
 # ---- FETCH DATA ----
 df = load_data(start_date, end_date, code_filter)
@@ -170,17 +139,17 @@ if not df.empty:
 st.divider()
 st.subheader("🔸 Latest 10 Records")
 try:
-    df_default = con.execute("""
+    df_default = run_query(f"""
         SELECT 
             Code, 
             Qty, 
             CAST(Sales_Date AS DATE) as Sales_Date, 
             Route, 
             Description 
-        FROM ProductsWithCode 
+        FROM ({PRODUCTS_WITH_CODE}) 
         ORDER BY Sales_Date DESC 
         LIMIT 10
-    """).fetchdf()
+    """)
     
     # Ensure Qty is numeric in preview too
     if 'Qty' in df_default.columns:
@@ -202,14 +171,14 @@ except Exception as e:
 with st.expander("🔧 Debug Information"):
     st.write("### Database Tables")
     try:
-        tables = con.execute("SHOW TABLES").fetchdf()
+        tables = run_query("SHOW TABLES")
         st.write(tables)
     except Exception as e:
         st.write(f"Error fetching tables: {e}")
     
     st.write("### ProductsWithCode Columns")
     try:
-        columns = con.execute("PRAGMA table_info(ProductsWithCode)").fetchdf()
+        columns = run_query(f"DESCRIBE {PRODUCTS_WITH_CODE}")
         st.write(columns)
     except Exception as e:
         st.write(f"Error fetching columns: {e}")
@@ -294,9 +263,13 @@ To navigate between pages:
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔧 Quick Actions")
-if st.sidebar.button("🔄 Refresh All Data"):
-    st.cache_data.clear()
-    st.success("Data refreshed successfully!")
+if st.sidebar.button("🔄 Check for New Data"):
+    # Only caches that read a changed table are cleared
+    changed = check_now(rescan=True)
+    if changed:
+        st.success(f"Reloaded data for: {', '.join(changed)}")
+    else:
+        st.success("Data is already up to date.")
 
 st.sidebar.markdown("### 📞 Support")
 st.sidebar.info("For technical support or feature requests, please contact the Dispatch Supervisor.")
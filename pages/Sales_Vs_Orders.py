@@ -1,15 +1,18 @@
 import streamlit as st
-import duckdb
 import pandas as pd
 from datetime import datetime, timedelta
-import os
-import requests
+from dashboard.catalog import date_bounds, dimension_values
+from dashboard.schema import ensure_normalized_schema
+from dashboard.db import run_query
+from dashboard.freshness import cached_from, check_now
+from dashboard.queries import ORDERS_VS_SALES_SQL
+from dashboard.search import code_index
 
 # Page configuration
 st.set_page_config(page_title="Orders vs Sales Difference", layout="wide")
 
 if st.sidebar.button("🔄 Refresh Data"):
-    st.cache_data.clear()  # clears cache
+    check_now(rescan=True)  # clears only caches of changed tables
 
 col1, col2, col3 = st.columns([1, 2, 1])
 with col3:
@@ -20,61 +23,14 @@ color = "Blue"
 st.markdown(f"<h1 style='color: {color};'>📊 Orders vs Sales Difference Analysis</h1>", unsafe_allow_html=True)
 st.markdown("Developed by :red[Samad Hoque]. Analyze the difference between Orders and Sales quantities over a selected date range.")
 
-# ---- DATABASE CONNECTION (Same as your working code) ----
-@st.cache_resource
-def get_duckdb():
-    db_filename = "dispatch.duckdb"
-    url = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-
-    if not os.path.exists(db_filename):
-        st.write("Downloading database from Google Drive...")
-        resp = requests.get(url, allow_redirects=True)
-        if resp.status_code != 200:
-            st.error(f"Failed to download database. Status code = {resp.status_code}")
-            st.stop()
-        with open(db_filename, "wb") as f:
-            f.write(resp.content)
-
-    return duckdb.connect(db_filename)
-
-# Get connection
-con = get_duckdb()
+# ---- DATABASE CONNECTION ----
+# Queries go through run_query, which uses the query service when one is configured
 st.success("Connected to DuckDB!")
 
-# Get date range from the database
-@st.cache_data
-def get_date_range():
-    query = """
-    SELECT 
-        MIN(CAST(Sales_Date AS DATE)) as min_date,
-        MAX(CAST(Sales_Date AS DATE)) as max_date
-    FROM (
-        SELECT Sales_Date FROM Sales
-        UNION ALL
-        SELECT Sales_Date FROM Orders
-    )
-    """
-    result = con.execute(query).fetchone()
-    return result[0], result[1]
-
-# Get all unique codes
-@st.cache_data
-def get_all_codes():
-    query = """
-    SELECT DISTINCT Code
-    FROM (
-        SELECT Code FROM Sales
-        UNION
-        SELECT Code FROM Orders
-    )
-    ORDER BY Code
-    """
-    result = con.execute(query).fetchdf()
-    return result['Code'].tolist()
-
 try:
-    min_date, max_date = get_date_range()
-    all_codes = get_all_codes()
+    # Date bounds and the Code list come from the statistics catalog
+    min_date, max_date = date_bounds("Sales", "Orders")
+    all_codes = dimension_values("Code", "Sales", "Orders")
     
     # Sidebar Filters
     st.sidebar.header("🔍 Filters")
@@ -117,11 +73,11 @@ try:
     if filter_option == "Search Code":
         search_code = st.sidebar.text_input(
             "Search for Code:",
-            placeholder="Enter product code..."
+            placeholder="Enter product code or description..."
         )
         if search_code:
-            # Filter codes that contain the search term
-            matching_codes = [code for code in all_codes if search_code.upper() in str(code).upper()]
+            # Codes matching in Code or description, from the shared search index
+            matching_codes = code_index().search(search_code)
             if matching_codes:
                 selected_codes = matching_codes
                 st.sidebar.success(f"Found {len(matching_codes)} matching code(s)")
@@ -135,69 +91,49 @@ try:
             default=None
         )
     
-    # Query data with date filter
-    @st.cache_data
-    def fetch_data(start, end):
-        sales_query = """
-        SELECT
-            Code,
-            CAST(Sales_Date AS DATE) AS Sales_Date,
-            SUM(CAST(Qty AS INTEGER)) AS Total
-        FROM Sales
-        WHERE CAST(Sales_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-        GROUP BY Code, CAST(Sales_Date AS DATE)
+    # Reconciliation runs in DuckDB; only the totals and one page of rows come back.
+    # Ranges inside the recent days run on the in-memory hot tier.
+    codes = [str(code) for code in selected_codes] if filter_option != "All Codes" and selected_codes else None
+    
+    @cached_from("Sales", "Orders")
+    def fetch_totals(start, end, codes):
+        ensure_normalized_schema()
+        query = f"""
+        SELECT 
+            COUNT(*) AS Records,
+            COUNT(DISTINCT Code) AS Products,
+            COALESCE(SUM(Total_Orders), 0) AS Total_Orders,
+            COALESCE(SUM(Total_Sales), 0) AS Total_Sales,
+            COALESCE(SUM(Difference), 0) AS Difference
+        FROM ({ORDERS_VS_SALES_SQL})
         """
-        
-        orders_query = """
-        SELECT
+        totals = run_query(query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), codes], since=start)
+        # The sums are HUGEINT, which the frame holds as float
+        return tuple(int(value) for value in next(totals.itertuples(index=False, name=None)))
+    
+    @cached_from("Sales", "Orders")
+    def fetch_rows(start, end, codes, limit=None, offset=0):
+        ensure_normalized_schema()
+        query = f"""
+        SELECT 
             Code,
-            CAST(Sales_Date AS DATE) AS Sales_Date,
-            SUM(CAST(Qty AS INTEGER)) AS Total
-        FROM Orders
-        WHERE CAST(Sales_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-        GROUP BY Code, CAST(Sales_Date AS DATE)
+            Sales_Date AS "Date",
+            Total_Orders AS "Orders Qty",
+            Total_Sales AS "Sales Qty",
+            Difference,
+            ROUND(Fulfillment_Rate, 1) AS "Fulfillment %"
+        FROM ({ORDERS_VS_SALES_SQL})
+        ORDER BY Sales_Date DESC, Code
+        LIMIT $4 OFFSET $5
         """
-        
-        sales_df = con.execute(sales_query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]).fetchdf()
-        orders_df = con.execute(orders_query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]).fetchdf()
-        
-        return sales_df, orders_df
-    
-    sales_df, orders_df = fetch_data(start_date, end_date)
-    
-    # FIX: Convert Code columns to string to ensure matching data types
-    sales_df['Code'] = sales_df['Code'].astype(str)
-    orders_df['Code'] = orders_df['Code'].astype(str)
+        df = run_query(query, [
+            start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), codes, limit, offset
+        ], since=start)
+        # Ensure dates are displayed without time
+        df['Date'] = pd.to_datetime(df['Date']).dt.date
+        return df
     
-    # Merge and calculate difference
-    merged_df = orders_df.merge(
-        sales_df,
-        on=['Code', 'Sales_Date'],
-        how='outer',
-        suffixes=('_Orders', '_Sales')
-    ).fillna(0)
-    
-    merged_df['Difference'] = merged_df['Total_Sales'] - merged_df['Total_Orders']
-    
-    # Apply code filter
-    if filter_option != "All Codes" and selected_codes:
-        # Convert selected_codes to string as well for comparison
-        selected_codes_str = [str(code) for code in selected_codes]
-        merged_df = merged_df[merged_df['Code'].isin(selected_codes_str)]
-    
-    merged_df = merged_df.sort_values(['Sales_Date', 'Code'], ascending=[False, True])
-    
-    # Display difference table
-    display_df = merged_df[['Code', 'Sales_Date', 'Total_Orders', 'Total_Sales', 'Difference']].copy()
-    display_df.columns = ['Code', 'Date', 'Orders Qty', 'Sales Qty', 'Difference']
-    
-    # Convert numeric columns to integers for cleaner display
-    display_df['Orders Qty'] = display_df['Orders Qty'].astype(int)
-    display_df['Sales Qty'] = display_df['Sales Qty'].astype(int)
-    display_df['Difference'] = display_df['Difference'].astype(int)
-    
-    # Ensure dates are displayed without time
-    display_df['Date'] = pd.to_datetime(display_df['Date']).dt.date
+    total_records, unique_products, total_orders, total_sales, total_diff = fetch_totals(start_date, end_date, codes)
     
     # Main content
     st.subheader("📊 Difference Analysis (Sales - Orders)")
@@ -206,10 +142,9 @@ try:
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Records", len(display_df))
+        st.metric("Total Records", total_records)
     
     with col2:
-        total_orders = display_df['Orders Qty'].sum()
         # Using orange color for Orders
         st.markdown(f"""
         <div style="text-align: center; padding: 10px; border-radius: 10px; background-color: #f0f2f6;">
@@ -219,7 +154,6 @@ try:
         """, unsafe_allow_html=True)
     
     with col3:
-        total_sales = display_df['Sales Qty'].sum()
         # Using green color for Sales
         st.markdown(f"""
         <div style="text-align: center; padding: 10px; border-radius: 10px; background-color: #f0f2f6;">
@@ -229,7 +163,6 @@ try:
         """, unsafe_allow_html=True)
     
     with col4:
-        total_diff = display_df['Difference'].sum()
         # Determine color for difference (red for negative, green for positive)
         diff_color = "#FF4B4B" if total_diff < 0 else "#00AA00" if total_diff > 0 else "#666666"
         st.markdown(f"""
@@ -241,6 +174,21 @@ try:
     
     st.divider()
     
+    # One page of rows at a time
+    page_col1, page_col2, page_col3 = st.columns([1, 1, 2])
+    with page_col1:
+        page_size = st.selectbox("Rows per page", [100, 500, 1000, 5000], index=1)
+    total_pages = max(1, -(-total_records // page_size))
+    with page_col2:
+        page_number = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+    offset = (page_number - 1) * page_size
+    display_df = fetch_rows(start_date, end_date, codes, page_size, offset)
+    with page_col3:
+        st.caption(
+            f"Rows {offset + 1 if total_records else 0:,}–{offset + len(display_df):,} "
+            f"of {total_records:,} (page {page_number} of {total_pages})"
+        )
+    
     # Display table with colored numbers
     st.dataframe(
         display_df,
@@ -252,6 +200,7 @@ try:
             "Orders Qty": st.column_config.NumberColumn("Orders Qty", format="%d"),
             "Sales Qty": st.column_config.NumberColumn("Sales Qty", format="%d"),
             "Difference": st.column_config.NumberColumn("Difference", format="%d"),
+            "Fulfillment %": st.column_config.NumberColumn("Fulfillment %", format="%.1f"),
         }
     )
     
@@ -262,7 +211,7 @@ try:
     summary_col1, summary_col2, summary_col3 = st.columns(3)
     
     with summary_col1:
-        st.metric("Unique Products", display_df['Code'].nunique())
+        st.metric("Unique Products", unique_products)
     
     with summary_col2:
         fulfillment_rate = (total_sales / total_orders * 100) if total_orders > 0 else 0
@@ -280,10 +229,10 @@ try:
     
     # Download option
     st.divider()
-    difference_csv = display_df.to_csv(index=False)
+    # The full result is only fetched when the button is clicked
     st.download_button(
         label="📥 Download Difference Data (CSV)",
-        data=difference_csv,
+        data=lambda: fetch_rows(start_date, end_date, codes).to_csv(index=False),
         file_name=f"difference_{start_date}_{end_date}.csv",
         mime="text/csv"
     )
@@ -364,9 +313,13 @@ To navigate between pages:
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔧 Quick Actions")
-if st.sidebar.button("🔄 Refresh All Data"):
-    st.cache_data.clear()
-    st.success("Data refreshed successfully!")
+if st.sidebar.button("🔄 Check for New Data"):
+    # Only caches that read a changed table are cleared
+    changed = check_now(rescan=True)
+    if changed:
+        st.success(f"Reloaded data for: {', '.join(changed)}")
+    else:
+        st.success("Data is already up to date.")
 
 st.sidebar.markdown("### 📞 Support")
 st.sidebar.info("For technical support or feature requests, please contact the Dispatch Supervisor.")
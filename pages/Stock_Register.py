@@ -1,224 +1,61 @@
 import streamlit as st
-import duckdb
 import pandas as pd
 from datetime import datetime
-import os
-import requests
+from dashboard.db import run_query
+from dashboard.freshness import cached_from
+from dashboard.queries import DAYS_OF_COVER_SQL, INVENTORY_SUMMARY_SQL, STOCK_MOVEMENTS_SQL
+from dashboard.search import matching_codes
 
 # Page configuration
 st.set_page_config(page_title="Inventory Management System", layout="wide")
 
-# ---- DATABASE CONNECTION (Same as your working code) ----
-@st.cache_resource
-def get_duckdb():
-    db_filename = "dispatch.duckdb"
-    url = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-
-    if not os.path.exists(db_filename):
-        st.write("Downloading database from Google Drive...")
-        resp = requests.get(url, allow_redirects=True)
-        if resp.status_code != 200:
-            st.error(f"Failed to download database. Status code = {resp.status_code}")
-            st.stop()
-        with open(db_filename, "wb") as f:
-            f.write(resp.content)
-
-    return duckdb.connect(db_filename)
-
-# Get connection
-con = get_duckdb()
+# ---- DATABASE CONNECTION ----
+# Queries go through run_query, which uses the query service when one is configured
 st.success("Connected to DuckDB!")
 
-# Define queries for different tables
-@st.cache_data
-def get_sales_data(start_date, end_date, search_code=""):
-    query = """
-    SELECT 
-        CAST(Sales_Date AS DATE) AS Date,
-        CAST(Code AS VARCHAR) AS Code,
-        SUM(CAST(Qty AS DECIMAL)) AS Sales_Qty
-    FROM Sales 
-    WHERE CAST(Sales_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-    GROUP BY CAST(Sales_Date AS DATE), Code
-    ORDER BY Date, Code
-    """
-    df = con.execute(query, [start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')]).df()
-    
-    # Ensure Date column is properly formatted without time
-    if not df.empty and 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date']).dt.date
-    
-    if search_code:
-        df = df[df['Code'].str.contains(search_code, case=False, na=False)]
-    return df
-
-@st.cache_data
-def get_cost_center_data(start_date, end_date, search_code=""):
-    query = """
-    SELECT 
-        CAST(Date AS DATE) AS Date,
-        CAST(Code AS VARCHAR) AS Code,
-        SUM(CAST(Qty AS DECIMAL)) AS CostCenter_Qty
-    FROM CostCenter 
-    WHERE CAST(Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-    GROUP BY CAST(Date AS DATE), Code
-    ORDER BY Date, Code
-    """
-    df = con.execute(query, [start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')]).df()
-    
-    # Ensure Date column is properly formatted without time
-    if not df.empty and 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date']).dt.date
-    
-    if search_code:
-        df = df[df['Code'].str.contains(search_code, case=False, na=False)]
-    return df
-
-@st.cache_data
-def get_received_data(start_date, end_date, search_code=""):
-    query = """
-    SELECT 
-        CAST(Received_Date AS DATE) AS Date,
-        CAST(Code AS VARCHAR) AS Code,
-        SUM(CAST(Received_Qty AS DECIMAL)) AS Received_Qty
-    FROM Received 
-    WHERE CAST(Received_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-    GROUP BY CAST(Received_Date AS DATE), Code
-    ORDER BY Date, Code
-    """
-    df = con.execute(query, [start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')]).df()
-    
-    # Ensure Date column is properly formatted without time
-    if not df.empty and 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date']).dt.date
-    
-    if search_code:
-        df = df[df['Code'].str.contains(search_code, case=False, na=False)]
-    return df
+# Movement type in the ledger -> quantity column shown for it
+MOVEMENT_COLUMNS = {
+    "Sales": "Sales_Qty",
+    "CostCenter": "CostCenter_Qty",
+    "Received": "Received_Qty",
+    "Adjustment": "Adjustment_Qty",
+}
 
-@st.cache_data
-def get_adjustment_data(start_date, end_date, search_code=""):
-    query = """
-    SELECT 
-        CAST(Adjuctment_Date AS DATE) AS Date,
-        CAST(Code AS VARCHAR) AS Code,
-        SUM(CAST(Adjustment_Qty AS DECIMAL)) AS Adjustment_Qty
-    FROM Adjustment 
-    WHERE CAST(Adjuctment_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-    GROUP BY CAST(Adjuctment_Date AS DATE), Code
-    ORDER BY Date, Code
-    """
-    df = con.execute(query, [start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')]).df()
+# Every view reads the stock ledger, which is built from all four tables;
+# searches also match Products descriptions
+@cached_from("Sales", "CostCenter", "Received", "Adjustment", "Products")
+def get_movements(movement, start_date, end_date, search_code=""):
+    codes = matching_codes(search_code)
+    df = run_query(STOCK_MOVEMENTS_SQL, [
+        movement,
+        start_date.strftime('%Y-%m-%d'),
+        end_date.strftime('%Y-%m-%d'),
+        codes, codes
+    ], key="stock_movements", since=start_date)
     
     # Ensure Date column is properly formatted without time
     if not df.empty and 'Date' in df.columns:
         df['Date'] = pd.to_datetime(df['Date']).dt.date
-    
-    if search_code:
-        df = df[df['Code'].str.contains(search_code, case=False, na=False)]
-    return df
+    return df.rename(columns={'Qty': MOVEMENT_COLUMNS[movement]})
 
-@st.cache_data
+@cached_from("Sales", "CostCenter", "Received", "Adjustment", "Products")
 def get_inventory_summary(start_date, end_date, search_code=""):
-    query = """
-    WITH Received_Data AS (
-        SELECT 
-            CAST(Received_Date AS DATE) AS Date,
-            CAST(Code AS VARCHAR) AS Code,
-            COALESCE(Received_Qty, 0) AS Received_Qty
-        FROM Received
-        
-        UNION ALL
-        
-        SELECT 
-            CAST(Adjuctment_Date AS DATE) AS Date,
-            CAST(Code AS VARCHAR) AS Code,
-            COALESCE(Adjustment_Qty, 0) AS Received_Qty
-        FROM Adjustment
-    ),
-    Sales_Data AS (
-        SELECT 
-            CAST(Date AS DATE) AS Date,
-            CAST(Code AS VARCHAR) AS Code,
-            SUM(Sales_Qty) + SUM(CostCenter_Qty) AS Sales_Qty
-        FROM (
-            SELECT 
-                CAST(Sales_Date AS DATE) AS Date,
-                CAST(Code AS VARCHAR) AS Code,
-                SUM(CAST(Qty AS DECIMAL)) AS Sales_Qty,
-                0 AS CostCenter_Qty
-            FROM Sales 
-            GROUP BY Code, CAST(Sales_Date AS DATE)
-
-            UNION ALL
-
-            SELECT 
-                CAST(Date AS DATE) AS Date,
-                CAST(Code AS VARCHAR) AS Code,
-                0 AS Sales_Qty,
-                SUM(CAST(Qty AS DECIMAL)) AS CostCenter_Qty
-            FROM CostCenter 
-            GROUP BY Code, CAST(Date AS DATE)
-        ) combined
-        GROUP BY Code, Date
-    ),
-    Combined AS (
-        SELECT 
-            COALESCE(r.Date, s.Date) AS Date,
-            COALESCE(r.Code, s.Code) AS Code,
-            COALESCE(r.Received_Qty, 0) AS Received_Qty,
-            COALESCE(s.Sales_Qty, 0) AS Sales_Qty
-        FROM Received_Data r
-        FULL OUTER JOIN Sales_Data s
-            ON r.Code = s.Code AND r.Date = s.Date
-    ),
-    RunningStock AS (
-        SELECT 
-            Code,
-            Date,
-            SUM(Received_Qty - Sales_Qty) OVER (
-                PARTITION BY Code 
-                ORDER BY Date
-                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
-            ) AS CumulativeStock
-        FROM Combined
-    ),
-    PrevStock AS (
-        SELECT 
-            Code,
-            MAX(CumulativeStock) AS Previous_Stock
-        FROM RunningStock
-        WHERE Date < CAST(? AS DATE)
-        GROUP BY Code
-    ),
-    PeriodTotals AS (
-        SELECT 
-            Code,
-            SUM(Received_Qty) AS Total_Received,
-            SUM(Sales_Qty) AS Total_Sales
-        FROM Combined
-        WHERE Date BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-        GROUP BY Code
-    )
-    SELECT 
-        COALESCE(p.Code, t.Code) AS Code,
-        COALESCE(p.Previous_Stock, 0) AS Previous_Stock,
-        COALESCE(t.Total_Received, 0) AS Total_Received,
-        COALESCE(t.Total_Sales, 0) AS Total_Sales,
-        COALESCE(p.Previous_Stock, 0) + COALESCE(t.Total_Received, 0) - COALESCE(t.Total_Sales, 0) AS Stock
-    FROM PrevStock p
-    FULL OUTER JOIN PeriodTotals t
-        ON p.Code = t.Code
-    ORDER BY Code
-    """
-    df = con.execute(query, [
-        start_date.strftime('%Y-%m-%d'), 
-        start_date.strftime('%Y-%m-%d'), 
-        end_date.strftime('%Y-%m-%d')
-    ]).df()
-    
-    if search_code:
-        df = df[df['Code'].str.contains(search_code, case=False, na=False)]
+    # Opening stock reads the ledger from the first day of the start month
+    return run_query(INVENTORY_SUMMARY_SQL, [
+        start_date.strftime('%Y-%m-%d'),
+        end_date.strftime('%Y-%m-%d'),
+        matching_codes(search_code)
+    ], key="stock_summary", since=start_date.replace(day=1))
+
+@cached_from("Sales", "CostCenter", "Received", "Adjustment", "Products")
+def get_days_of_cover(as_of, window_days, search_code=""):
+    df = run_query(DAYS_OF_COVER_SQL, [
+        as_of.strftime('%Y-%m-%d'),
+        window_days,
+        matching_codes(search_code)
+    ], key="stock_cover")
+    for col in ['Stockout_Date', 'Next_Receipt', 'As_Of']:
+        df[col] = pd.to_datetime(df[col]).dt.date
     return df
 
 # Streamlit UI
@@ -230,6 +67,7 @@ st.sidebar.header("Filters")
 # Table selection dropdown
 table_options = {
     "Inventory Summary": "summary",
+    "Days of Cover": "cover",
     "Sales": "sales", 
     "Cost Center": "cost_center",
     "Received": "received",
@@ -250,7 +88,7 @@ with col2:
     end_date = st.date_input("To Date", value=datetime.now())
 
 # Code search
-search_code = st.sidebar.text_input("Search Code", "")
+search_code = st.sidebar.text_input("Search Code or Description", "")
 
 # Get and display data based on selection
 if start_date <= end_date:
@@ -294,8 +132,47 @@ if start_date <= end_date:
             else:
                 st.warning("No data found for the selected filters.")
                 
+        elif selected_table == "Days of Cover":
+            window_days = st.sidebar.slider("Average Outflow Over (days)", 7, 90, 28)
+            df = get_days_of_cover(end_date, window_days, search_code)
+            st.header("⏳ Days of Cover")
+            
+            if not df.empty:
+                as_of = df.pop('As_Of').iloc[0]
+                at_risk = df[df['Stockout_Before_Receipt']]
+                st.caption(
+                    f"Stock as of {as_of}; outflow averaged over the {window_days} days up to it. "
+                    "Next receipt is projected from each Code's recent receipt interval."
+                )
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Codes Stocking Out Before Next Receipt", len(at_risk))
+                with col2:
+                    st.metric("Median Days of Cover", f"{df['Days_Of_Cover'].median():,.1f}")
+                with col3:
+                    st.metric("Codes Without Recent Outflow", int(df['Days_Of_Cover'].isna().sum()))
+                
+                st.divider()
+                
+                # Sorted by days of cover; click a column header to re-sort
+                st.dataframe(
+                    df.round({'Avg_Daily_Outflow': 2, 'Days_Of_Cover': 1}),
+                    use_container_width=True,
+                    height=600
+                )
+                
+                csv = df.to_csv(index=False)
+                st.download_button(
+                    label="📥 Download Days of Cover",
+                    data=csv,
+                    file_name=f"days_of_cover_{as_of}.csv",
+                    mime="text/csv"
+                )
+            else:
+                st.warning("No data found for the selected filters.")
+                
         elif selected_table == "Sales":
-            df = get_sales_data(start_date, end_date, search_code)
+            df = get_movements("Sales", start_date, end_date, search_code)
             st.header("💰 Sales Data")
             if not df.empty:
                 st.metric("Total Sales Quantity", f"{df['Sales_Qty'].sum():,.0f}")
@@ -313,7 +190,7 @@ if start_date <= end_date:
                 st.warning("No sales data found for the selected filters.")
                 
         elif selected_table == "Cost Center":
-            df = get_cost_center_data(start_date, end_date, search_code)
+            df = get_movements("CostCenter", start_date, end_date, search_code)
             st.header("🏢 Cost Center Data")
             if not df.empty:
                 st.metric("Total Cost Center Quantity", f"{df['CostCenter_Qty'].sum():,.0f}")
@@ -331,7 +208,7 @@ if start_date <= end_date:
                 st.warning("No cost center data found for the selected filters.")
                 
         elif selected_table == "Received":
-            df = get_received_data(start_date, end_date, search_code)
+            df = get_movements("Received", start_date, end_date, search_code)
             st.header("📥 Received Data")
             if not df.empty:
                 st.metric("Total Received Quantity", f"{df['Received_Qty'].sum():,.0f}")
@@ -349,7 +226,7 @@ if start_date <= end_date:
                 st.warning("No received data found for the selected filters.")
                 
         elif selected_table == "Adjustment":
-            df = get_adjustment_data(start_date, end_date, search_code)
+            df = get_movements("Adjustment", start_date, end_date, search_code)
             st.header("⚙️ Adjustment Data")
             if not df.empty:
                 st.metric("Total Adjustment Quantity", f"{df['Adjustment_Qty'].sum():,.0f}")
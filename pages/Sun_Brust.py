@@ -1,53 +1,71 @@
 import streamlit as st
 import pandas as pd
-import duckdb
 import plotly.express as px
-import os
-import requests
+from dashboard.schema import ensure_normalized_schema
+from dashboard.catalog import date_bounds
+from dashboard.datasets import shared_frame
+from dashboard.sampling import (
+    SAMPLE_PERCENT, sample_clause, scale_to_population, estimate_total,
+    format_estimate, refine_in_background, refinement_ready, watch_refinement
+)
+from dashboard.db import run_query
+from dashboard.freshness import cached_from, check_now
 
 # Page configuration
 st.set_page_config(page_title="Sales Sunburst Chart", layout="wide")
 
-# ---- DATABASE CONNECTION (Same as your working code) ----
-@st.cache_resource
-def get_duckdb():
-    db_filename = "dispatch.duckdb"
-    url = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-
-    if not os.path.exists(db_filename):
-        st.write("Downloading database from Google Drive...")
-        resp = requests.get(url, allow_redirects=True)
-        if resp.status_code != 200:
-            st.error(f"Failed to download database. Status code = {resp.status_code}")
-            st.stop()
-        with open(db_filename, "wb") as f:
-            f.write(resp.content)
-
-    return duckdb.connect(db_filename)
-
-# Get connection
-conn = get_duckdb()
+# ---- DATABASE CONNECTION ----
+# Queries go through run_query, which uses the query service when one is configured
 st.success("Connected to DuckDB!")
 
-# Load data with caching
-@st.cache_data
+# Sales joined to Products on the ENUM-encoded Code; dimension columns come back as Categoricals
+SALES_QUERY = """
+    SELECT 
+        s.Code,
+        s.Route,
+        COALESCE(s.Qty, 0) AS Qty,
+        CAST(s.Sales_Date AS TIMESTAMP) AS Sales_Date,
+        p.Category3,
+        p.Category2
+    FROM (SELECT * FROM SalesFact {sample}) s
+    LEFT JOIN DimProducts p ON s.Code = p.Code
+"""
+
 def load_data():
-    sales = pd.read_sql("SELECT Code, Route, Qty, Sales_Date FROM Sales", conn)
-    Products = pd.read_sql("SELECT Code, Category3, Category2 FROM Products", conn)
-    df = sales.merge(Products, on="Code", how="left")
-    df['Qty'] = pd.to_numeric(df['Qty'], errors='coerce')
-    df['Sales_Date'] = pd.to_datetime(df['Sales_Date'])
-    return df
+    """Full history, shared read-only across sessions for the current snapshot."""
+    ensure_normalized_schema()
+    return shared_frame("sun_brust_sales", SALES_QUERY.format(sample=""))
 
-# Load initial data
-df = load_data()
+# Load data with caching
+@cached_from("Sales", "Products")
+def load_sampled_data(sample_percent):
+    """Load a sample of Sales with quantities scaled up to estimate the full totals."""
+    ensure_normalized_schema()
+    df = run_query(SALES_QUERY.format(sample=sample_clause(sample_percent)))
+    df['Qty'] = scale_to_population(df['Qty'], sample_percent)
+    return df
 
 # --- 🔹 Streamlit Date Filter ---
 st.sidebar.header("Filter Options")
 
-# Get min & max date from your data
-min_date = df['Sales_Date'].min().date()
-max_date = df['Sales_Date'].max().date()
+# Fast preview answers the chart from a sample while the exact data loads
+fast_preview = st.sidebar.toggle(
+    "⚡ Fast preview (sampled)",
+    value=False,
+    help=f"Draw the chart from a {SAMPLE_PERCENT}% sample of Sales first, then refine to exact numbers."
+)
+preview_active = fast_preview and not refinement_ready("sun_brust_exact")
+sample_percent = SAMPLE_PERCENT if preview_active else None
+
+# Load initial data
+if preview_active:
+    df = load_sampled_data(SAMPLE_PERCENT)
+    refine_in_background("sun_brust_exact", load_data)
+else:
+    df = load_data()
+
+# Get min & max date from the statistics catalog
+min_date, max_date = date_bounds("Sales")
 
 # Date range selector
 selected_dates = st.sidebar.date_input(
@@ -76,9 +94,10 @@ filtered_df = df.loc[mask]
 st.sidebar.info(f"Showing data from: {start_date} to {end_date}")
 
 # Process data for sunburst chart
-@st.cache_data
-def process_sunburst_data(_df):
-    sunburst_data = _df.groupby(['Category3', 'Category2', 'Code']).agg({
+@cached_from("Sales", "Products")
+def process_sunburst_data(_df, start_date, end_date, sample_percent=None):
+    # The frame itself is not hashed, so the filters that produced it are part of the key
+    sunburst_data = _df.groupby(['Category3', 'Category2', 'Code'], observed=True).agg({
         'Qty': 'sum'
     }).reset_index()
 
@@ -135,10 +154,46 @@ def process_sunburst_data(_df):
 
     return pd.DataFrame(sunburst_final), top_products_data
 
+# Optional tables are fragments: ticking a checkbox reruns only its section,
+# with the frame passed in by the last full run, not the load, chart and CSV
+@st.fragment
+def top_products_section(top_products_data):
+    if st.checkbox("Show Top Products Data"):
+        st.subheader("Top 20 Products per Category2")
+        
+        # Create a more readable display
+        display_data = top_products_data.copy()
+        display_data = display_data.sort_values(['Category3', 'Category2', 'Qty'], ascending=[True, True, False])
+        display_data['Qty'] = display_data['Qty'].apply(lambda x: f"{x:,.0f}")
+        
+        st.dataframe(
+            display_data,
+            column_config={
+                "Category3": "Category 3",
+                "Category2": "Category 2",
+                "Code": "Product Code",
+                "Qty": "Total Quantity"
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+@st.fragment
+def category_breakdown_section(top_products_data):
+    if st.checkbox("Show Category Breakdown"):
+        st.subheader("Sales by Category")
+        
+        category_summary = top_products_data.groupby('Category3', observed=True)['Qty'].agg(['sum', 'count']).reset_index()
+        category_summary.columns = ['Category', 'Total Quantity', 'Number of Products']
+        category_summary = category_summary.sort_values('Total Quantity', ascending=False)
+        category_summary['Total Quantity'] = category_summary['Total Quantity'].apply(lambda x: f"{x:,.0f}")
+        
+        st.dataframe(category_summary, hide_index=True, use_container_width=True)
+
 # Check if filtered data is not empty
 if not filtered_df.empty:
     # Process the filtered data
-    sunburst_df, top_products_data = process_sunburst_data(filtered_df)
+    sunburst_df, top_products_data = process_sunburst_data(filtered_df, start_date, end_date, sample_percent)
     
     # Check if we have data for the sunburst chart
     if not sunburst_df.empty and not top_products_data.empty:
@@ -172,6 +227,8 @@ if not filtered_df.empty:
         # Display in Streamlit
         st.title("📊 Sales Data Sunburst Chart")
         st.write(f"This chart shows the sales distribution by Category3, Category2, and the top 20 products within each Category2 for the selected date range.")
+        if preview_active:
+            watch_refinement("sun_brust_exact")
 
         # Show some statistics
         st.subheader("Data Summary")
@@ -184,7 +241,9 @@ if not filtered_df.empty:
             st.metric("Total Products", len(top_products_data))
 
         with col3:
-            st.metric("Total Quantity", f"{top_products_data['Qty'].sum():,.0f}")
+            top_rows = filtered_df.loc[filtered_df['Code'].isin(top_products_data['Code']), 'Qty'].dropna()
+            total_qty, margin = estimate_total(top_rows, sample_percent)
+            st.metric("Total Quantity", format_estimate(total_qty, margin))
 
         with col4:
             st.metric("Date Range", f"{start_date} to {end_date}")
@@ -192,37 +251,9 @@ if not filtered_df.empty:
         # Display the chart
         st.plotly_chart(fig, use_container_width=True)
 
-        # Optional: Show the top products table
-        if st.checkbox("Show Top Products Data"):
-            st.subheader("Top 20 Products per Category2")
-            
-            # Create a more readable display
-            display_data = top_products_data.copy()
-            display_data = display_data.sort_values(['Category3', 'Category2', 'Qty'], ascending=[True, True, False])
-            display_data['Qty'] = display_data['Qty'].apply(lambda x: f"{x:,.0f}")
-            
-            st.dataframe(
-                display_data,
-                column_config={
-                    "Category3": "Category 3",
-                    "Category2": "Category 2",
-                    "Code": "Product Code",
-                    "Qty": "Total Quantity"
-                },
-                hide_index=True,
-                use_container_width=True
-            )
-
-        # Optional: Category-wise breakdown
-        if st.checkbox("Show Category Breakdown"):
-            st.subheader("Sales by Category")
-            
-            category_summary = top_products_data.groupby('Category3')['Qty'].agg(['sum', 'count']).reset_index()
-            category_summary.columns = ['Category', 'Total Quantity', 'Number of Products']
-            category_summary = category_summary.sort_values('Total Quantity', ascending=False)
-            category_summary['Total Quantity'] = category_summary['Total Quantity'].apply(lambda x: f"{x:,.0f}")
-            
-            st.dataframe(category_summary, hide_index=True, use_container_width=True)
+        # Optional tables; each checkbox reruns only its own section
+        top_products_section(top_products_data)
+        category_breakdown_section(top_products_data)
 
         # Download option
         csv = top_products_data.to_csv(index=False)
@@ -310,9 +341,13 @@ To navigate between pages:
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔧 Quick Actions")
-if st.sidebar.button("🔄 Refresh All Data"):
-    st.cache_data.clear()
-    st.success("Data refreshed successfully!")
+if st.sidebar.button("🔄 Check for New Data"):
+    # Only caches that read a changed table are cleared
+    changed = check_now(rescan=True)
+    if changed:
+        st.success(f"Reloaded data for: {', '.join(changed)}")
+    else:
+        st.success("Data is already up to date.")
 
 st.sidebar.markdown("### 📞 Support")
 st.sidebar.info("For technical support or feature requests, please contact the Dispatch Supervisor.")
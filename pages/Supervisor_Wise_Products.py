@@ -1,11 +1,13 @@
-import os
 import streamlit as st
 import pandas as pd
-import duckdb
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date
-import requests
+from dashboard.downsample import downsample, render_mode
+from dashboard.schema import ensure_normalized_schema
+from dashboard.catalog import date_bounds, dimension_values
+from dashboard.datasets import shared_frame
+from dashboard.search import code_index
 
 # Page configuration
 st.set_page_config(
@@ -14,48 +16,25 @@ st.set_page_config(
     layout="wide"
 )
 
-# ---- DATABASE CONNECTION (Same as your working code) ----
-@st.cache_resource
-def get_duckdb():
-    db_filename = "dispatch.duckdb"
-    url = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-
-    if not os.path.exists(db_filename):
-        st.write("Downloading database from Google Drive...")
-        resp = requests.get(url, allow_redirects=True)
-        if resp.status_code != 200:
-            st.error(f"Failed to download database. Status code = {resp.status_code}")
-            st.stop()
-        with open(db_filename, "wb") as f:
-            f.write(resp.content)
-
-    return duckdb.connect(db_filename)
-
-# Cache the data loading function
-@st.cache_data
+# ---- DATABASE CONNECTION ----
+# Full history, shared read-only across sessions for the current snapshot
 def load_data():
     """Load and merge sales data with supervisor information"""
     try:
-        # Connect to DuckDB using the new connection method
-        conn = get_duckdb()
-        
-        # Load Sales and Supervisor mapping
-        sales = pd.read_sql("SELECT Code, Route, Sales_Date, Qty FROM Sales", conn)
-        supervisors = pd.read_sql("SELECT Route, Supervisor FROM Supervisors", conn)
-        
-        # Merge Supervisor info
-        df = sales.merge(supervisors, on="Route", how="left")
-        
-        # Convert Sales_Date to datetime
-        df['Sales_Date'] = pd.to_datetime(df['Sales_Date'])
-        
-        # Convert Qty to numeric, handling any non-numeric values
-        df['Qty'] = pd.to_numeric(df['Qty'], errors='coerce')
-        
-        # Fill NaN values with 0
-        df['Qty'] = df['Qty'].fillna(0)
+        ensure_normalized_schema()
         
-        return df
+        # Join Sales to the Supervisor mapping on the ENUM-encoded Route;
+        # Code, Route and Supervisor come back as Categoricals
+        return shared_frame("supervisor_sales", """
+            SELECT 
+                s.Code,
+                s.Route,
+                CAST(s.Sales_Date AS TIMESTAMP) AS Sales_Date,
+                COALESCE(s.Qty, 0) AS Qty,
+                r.Supervisor
+            FROM SalesFact s
+            LEFT JOIN DimRoutes r ON s.Route = r.Route
+        """)
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
         return None
@@ -84,7 +63,7 @@ def main():
     
     selected_codes = []
     if code_filter_type == "Select Specific Codes":
-        all_codes = sorted(df['Code'].unique().tolist())
+        all_codes = dimension_values("Code", "Sales")
         selected_codes = st.sidebar.multiselect(
             "Select Codes:", 
             all_codes,
@@ -93,12 +72,12 @@ def main():
     elif code_filter_type == "Search Codes":
         search_term = st.sidebar.text_input(
             "Search Code (contains):", 
-            placeholder="Enter code to search..."
+            placeholder="Enter code or description to search..."
         )
         if search_term:
-            # Convert to string for safe comparison
-            df['Code'] = df['Code'].astype(str)
-            matching_codes = df[df['Code'].str.contains(search_term, case=False, na=False)]['Code'].unique().tolist()
+            # Ranked matches from the shared search index, limited to Codes with sales
+            present = set(dimension_values("Code", "Sales"))
+            matching_codes = [code for code in code_index().search(search_term) if code in present]
             if matching_codes:
                 st.sidebar.write(f"Found {len(matching_codes)} matching codes:")
                 selected_codes = st.sidebar.multiselect(
@@ -109,13 +88,12 @@ def main():
             else:
                 st.sidebar.warning("No codes found matching your search.")
     
-    # Supervisor dropdown
-    supervisors = ['All'] + sorted(df['Supervisor'].dropna().unique().tolist())
+    # Supervisor dropdown and date bounds come from the statistics catalog
+    supervisors = ['All'] + dimension_values("Supervisor", "Sales")
     selected_supervisor = st.sidebar.selectbox("Select Supervisor:", supervisors)
     
     # Date range selector
-    min_date = df['Sales_Date'].min().date()
-    max_date = df['Sales_Date'].max().date()
+    min_date, max_date = date_bounds("Sales")
     
     selected_date_range = st.sidebar.date_input(
         "Select Date Range:",
@@ -124,13 +102,11 @@ def main():
         max_value=max_date
     )
     
-    # Apply filters
-    filtered_df = df.copy()
+    # Apply filters (each filter builds a new frame, the shared one is never copied)
+    filtered_df = df
     
     # Filter by code
     if code_filter_type != "All Codes" and selected_codes:
-        # Ensure both are strings for comparison
-        filtered_df['Code'] = filtered_df['Code'].astype(str)
         selected_codes_str = [str(code) for code in selected_codes]
         filtered_df = filtered_df[filtered_df['Code'].isin(selected_codes_str)]
     elif code_filter_type == "Search Codes" and not selected_codes and 'search_term' in locals() and search_term:
@@ -151,7 +127,7 @@ def main():
     
     # Create aggregated data for table (Code as rows, Qty as sum)
     if not filtered_df.empty:
-        table_data = filtered_df.groupby(['Code', 'Supervisor']).agg({
+        table_data = filtered_df.groupby(['Code', 'Supervisor'], observed=True).agg({
             'Qty': 'sum',
             'Sales_Date': ['min', 'max']
         }).reset_index()
@@ -271,13 +247,16 @@ def main():
         # Time series chart
         if not filtered_df.empty:
             daily_sales = filtered_df.groupby(['Sales_Date'])['Qty'].sum().reset_index()
+            n_days = len(daily_sales)
+            daily_sales = downsample(daily_sales, 'Sales_Date', 'Qty')
             
             fig_time = px.line(
                 daily_sales,
                 x='Sales_Date',
                 y='Qty',
                 title='Daily Sales Trend',
-                labels={'Qty': 'Total Quantity', 'Sales_Date': 'Date'}
+                labels={'Qty': 'Total Quantity', 'Sales_Date': 'Date'},
+                render_mode=render_mode(n_days)
             )
             
             fig_time.update_layout(height=300)
@@ -288,7 +267,7 @@ def main():
     with chart_col2:
         # Supervisor performance pie chart
         if not filtered_df.empty:
-            supervisor_totals = filtered_df.groupby('Supervisor')['Qty'].sum().reset_index()
+            supervisor_totals = filtered_df.groupby('Supervisor', observed=True)['Qty'].sum().reset_index()
             
             fig_pie = px.pie(
                 supervisor_totals,
@@ -1,46 +1,26 @@
 import streamlit as st
-import duckdb
 import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta
-import os
-import requests
+from dashboard.downsample import downsample, render_mode
+from dashboard.catalog import date_bounds
+from dashboard.topk import top_k
+from dashboard.db import run_query
+from dashboard.freshness import cached_from, check_now
+from dashboard.search import matching_codes
 
 # Page configuration
 st.set_page_config(page_title="Sales Dashboard", layout="wide")
 
 st.title("📊 Sales Dashboard")
 
-# ---- DATABASE CONNECTION (Same as your working code) ----
-@st.cache_resource
-def get_duckdb():
-    db_filename = "dispatch.duckdb"
-    url = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-
-    if not os.path.exists(db_filename):
-        st.write("Downloading database from Google Drive...")
-        resp = requests.get(url, allow_redirects=True)
-        if resp.status_code != 200:
-            st.error(f"Failed to download database. Status code = {resp.status_code}")
-            st.stop()
-        with open(db_filename, "wb") as f:
-            f.write(resp.content)
-
-    return duckdb.connect(db_filename)
-
-# Get connection
-con = get_duckdb()
+# ---- DATABASE CONNECTION ----
+# Queries go through run_query, which uses the query service when one is configured
 st.success("Connected to DuckDB!")
 
-# Get date range from data
-@st.cache_data
-def get_date_range():
-    query = "SELECT MIN(CAST(Sales_Date AS DATE)) as min_date, MAX(CAST(Sales_Date AS DATE)) as max_date FROM Sales"
-    result = con.execute(query).fetchone()
-    return result[0], result[1]
-
+# Date bounds come from the statistics catalog
 try:
-    min_date, max_date = get_date_range()
+    min_date, max_date = date_bounds("Sales")
 except Exception as e:
     st.error(f"Error connecting to database: {e}")
     st.stop()
@@ -67,12 +47,13 @@ with col2:
     )
 
 # Search box for Code
-search_code = st.sidebar.text_input("🔍 Search Code", "")
+search_code = st.sidebar.text_input("🔍 Search Code or Description", "")
 
-# Fetch data based on filters
-@st.cache_data
+# Fetch data based on filters; recent ranges run on the in-memory hot tier
+@cached_from("Sales", "Products")
 def load_data(start, end, search=""):
-    if search:
+    codes = matching_codes(search)
+    if codes is not None:
         query = """
             SELECT 
                 Code,
@@ -80,11 +61,11 @@ def load_data(start, end, search=""):
                 SUM(CAST(Qty AS INTEGER)) AS Qty
             FROM Sales
             WHERE CAST(Sales_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-            AND Code LIKE ?
+            AND list_contains(?, CAST(Code AS VARCHAR))
             GROUP BY Code, CAST(Sales_Date AS DATE)
             ORDER BY CAST(Sales_Date AS DATE) DESC, Code
         """
-        return con.execute(query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), f'%{search}%']).df()
+        return run_query(query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), codes], since=start)
     else:
         query = """
             SELECT 
@@ -96,7 +77,60 @@ def load_data(start, end, search=""):
             GROUP BY Code, CAST(Sales_Date AS DATE)
             ORDER BY CAST(Sales_Date AS DATE) DESC, Code
         """
-        return con.execute(query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]).df()
+        return run_query(query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')], since=start)
+
+# The "View:" radio is a fragment: switching views reruns only the table and
+# download below it, with the frames passed in by the last full run
+@st.fragment
+def detail_view(df, summary_df, start_date, end_date):
+    view_option = st.radio("View:", ["Summary by Code", "Detailed Transactions"], horizontal=True)
+    
+    if view_option == "Summary by Code":
+        st.dataframe(
+            summary_df,
+            use_container_width=True,
+            height=400,
+            column_config={
+                "Code": st.column_config.TextColumn("Product Code"),
+                "Total_Qty": st.column_config.NumberColumn("Total Quantity", format="%d"),
+                "First_Date": st.column_config.DateColumn("First Date"),
+                "Last_Date": st.column_config.DateColumn("Last Date"),
+                "Transaction_Count": st.column_config.NumberColumn("Transaction Count", format="%d")
+            }
+        )
+        
+        # Download button
+        csv = summary_df.to_csv(index=False)
+        st.download_button(
+            label="📥 Download Summary as CSV",
+            data=csv,
+            file_name=f"sales_summary_{start_date}_{end_date}.csv",
+            mime="text/csv"
+        )
+    else:
+        # Format the detailed dataframe for display
+        display_df = df.copy()
+        display_df['Sales_Date'] = pd.to_datetime(display_df['Sales_Date']).dt.date
+        
+        st.dataframe(
+            display_df,
+            use_container_width=True,
+            height=400,
+            column_config={
+                "Code": st.column_config.TextColumn("Product Code"),
+                "Sales_Date": st.column_config.DateColumn("Sales Date"),
+                "Qty": st.column_config.NumberColumn("Quantity", format="%d")
+            }
+        )
+        
+        # Download button
+        csv = df.to_csv(index=False)
+        st.download_button(
+            label="📥 Download Details as CSV",
+            data=csv,
+            file_name=f"sales_details_{start_date}_{end_date}.csv",
+            mime="text/csv"
+        )
 
 # Load data
 try:
@@ -123,7 +157,8 @@ try:
     # Top 20 Codes Chart - FIXED
     st.subheader("📊 Top 20 Products by Quantity")
     
-    top_20 = df.groupby('Code')['Qty'].sum().sort_values(ascending=False).head(20).reset_index()
+    # Ranked from the per-day Code totals rather than the loaded rows
+    top_20 = top_k(start_date, end_date, 20, codes=matching_codes(search_code))
     
     # Convert Code to string to ensure it's treated as categorical
     top_20['Code'] = top_20['Code'].astype(str)
@@ -157,6 +192,8 @@ try:
     st.subheader("📅 Sales Trend Over Time")
     
     daily_sales = df.groupby('Sales_Date')['Qty'].sum().reset_index()
+    n_days = len(daily_sales)
+    daily_sales = downsample(daily_sales, 'Sales_Date', 'Qty')
     
     fig2 = px.line(
         daily_sales,
@@ -164,7 +201,8 @@ try:
         y='Qty',
         title='Daily Sales Quantity Trend',
         labels={'Qty': 'Total Quantity', 'Sales_Date': 'Date'},
-        markers=True
+        markers=True,
+        render_mode=render_mode(n_days)
     )
     fig2.update_layout(height=400)
     st.plotly_chart(fig2, use_container_width=True)
@@ -185,55 +223,8 @@ try:
     summary_df['First_Date'] = pd.to_datetime(summary_df['First_Date']).dt.date
     summary_df['Last_Date'] = pd.to_datetime(summary_df['Last_Date']).dt.date
     
-    # Display options
-    view_option = st.radio("View:", ["Summary by Code", "Detailed Transactions"], horizontal=True)
-    
-    if view_option == "Summary by Code":
-        st.dataframe(
-            summary_df,
-            use_container_width=True,
-            height=400,
-            column_config={
-                "Code": st.column_config.TextColumn("Product Code"),
-                "Total_Qty": st.column_config.NumberColumn("Total Quantity", format="%d"),
-                "First_Date": st.column_config.DateColumn("First Date"),
-                "Last_Date": st.column_config.DateColumn("Last Date"),
-                "Transaction_Count": st.column_config.NumberColumn("Transaction Count", format="%d")
-            }
-        )
-        
-        # Download button
-        csv = summary_df.to_csv(index=False)
-        st.download_button(
-            label="📥 Download Summary as CSV",
-            data=csv,
-            file_name=f"sales_summary_{start_date}_{end_date}.csv",
-            mime="text/csv"
-        )
-    else:
-        # Format the detailed dataframe for display
-        display_df = df.copy()
-        display_df['Sales_Date'] = pd.to_datetime(display_df['Sales_Date']).dt.date
-        
-        st.dataframe(
-            display_df,
-            use_container_width=True,
-            height=400,
-            column_config={
-                "Code": st.column_config.TextColumn("Product Code"),
-                "Sales_Date": st.column_config.DateColumn("Sales Date"),
-                "Qty": st.column_config.NumberColumn("Quantity", format="%d")
-            }
-        )
-        
-        # Download button
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📥 Download Details as CSV",
-            data=csv,
-            file_name=f"sales_details_{start_date}_{end_date}.csv",
-            mime="text/csv"
-        )
+    # Switching the view reruns only this section
+    detail_view(df, summary_df, start_date, end_date)
 
 except Exception as e:
     st.error(f"Error loading data: {e}")
@@ -318,9 +309,13 @@ To navigate between pages:
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔧 Quick Actions")
-if st.sidebar.button("🔄 Refresh All Data"):
-    st.cache_data.clear()
-    st.success("Data refreshed successfully!")
+if st.sidebar.button("🔄 Check for New Data"):
+    # Only caches that read a changed table are cleared
+    changed = check_now(rescan=True)
+    if changed:
+        st.success(f"Reloaded data for: {', '.join(changed)}")
+    else:
+        st.success("Data is already up to date.")
 
 st.sidebar.markdown("### 📞 Support")
 st.sidebar.info("For technical support or feature requests, please contact the Dispatch Supervisor.")
@@ -1,65 +1,85 @@
 import streamlit as st
 import pandas as pd
-import duckdb
-import os
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import requests
+from dashboard.schema import ensure_normalized_schema
+from dashboard.catalog import date_bounds, dimension_values
+from dashboard.datasets import shared_frame
+from dashboard.sampling import (
+    SAMPLE_PERCENT, sample_clause, scale_to_population, estimate_total,
+    estimate_count, format_estimate, refine_in_background, refinement_ready,
+    watch_refinement
+)
+from dashboard.downsample import downsample, ANIMATION_MAX_POINTS
+from dashboard.topk import top_k
+from dashboard.db import run_query
+from dashboard.freshness import cached_from, check_now
 
 # Page configuration
 st.set_page_config(page_title="Sales Dashboard", layout="wide")
 
-# ---- DATABASE CONNECTION (Same as your working code) ----
-@st.cache_resource
-def get_duckdb():
-    db_filename = "dispatch.duckdb"
-    url = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-
-    if not os.path.exists(db_filename):
-        st.write("Downloading database from Google Drive...")
-        resp = requests.get(url, allow_redirects=True)
-        if resp.status_code != 200:
-            st.error(f"Failed to download database. Status code = {resp.status_code}")
-            st.stop()
-        with open(db_filename, "wb") as f:
-            f.write(resp.content)
-
-    return duckdb.connect(db_filename)
+# ---- DATABASE CONNECTION ----
+# Sales joined to Products on the ENUM-encoded Code
+SALES_QUERY = """
+    SELECT 
+        s.Code,
+        s.Route,
+        COALESCE(s.Qty, 0) AS Qty,
+        CAST(s.Sales_Date AS TIMESTAMP) AS Sales_Date,
+        p.Category3
+    FROM (SELECT * FROM SalesFact {sample}) s
+    LEFT JOIN DimProducts p ON s.Code = p.Code
+"""
 
-# Cache data loading function
-@st.cache_data
 def load_data():
     """Load and merge sales data with product information"""
     try:
-        # Connect to DuckDB using the new connection method
-        conn = get_duckdb()
-        
-        # Load Sales and Products data
-        sales = conn.execute("SELECT Code, Route, Qty, Sales_Date FROM Sales").df()
-        Products = conn.execute("SELECT Code, Category3 FROM Products").df()
+        ensure_normalized_schema()
         
-        # Join (like SQL LEFT JOIN)
-        df = sales.merge(Products, on="Code", how="left")
+        # Full history, shared read-only across sessions for the current snapshot
+        return shared_frame("top_products_sales", SALES_QUERY.format(sample=""))
+    except Exception as e:
+        st.error(f"Error loading data: {str(e)}")
+        return pd.DataFrame()
+
+# Cache data loading function
+@cached_from("Sales", "Products")
+def load_sampled_data(sample_percent):
+    """Load a sample of Sales with quantities scaled up to estimate the full totals"""
+    try:
+        ensure_normalized_schema()
         
-        # Convert Sales_Date to datetime if it's not already
-        df['Sales_Date'] = pd.to_datetime(df['Sales_Date'])
+        df = run_query(SALES_QUERY.format(sample=sample_clause(sample_percent)))
         
-        # Convert Qty to numeric, handling any non-numeric values
-        df['Qty'] = pd.to_numeric(df['Qty'], errors='coerce').fillna(0)
+        # Scale sampled quantities up so sums estimate the full totals
+        df['Qty'] = scale_to_population(df['Qty'], sample_percent)
         
         return df
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
         return pd.DataFrame()
 
-# Load data
-df = load_data()
-
 # Streamlit App
 st.title("📊 Sales Dashboard")
 st.sidebar.header("Filters")
 
+# Fast preview answers the charts from a sample while the exact data loads
+fast_preview = st.sidebar.toggle(
+    "⚡ Fast preview (sampled)",
+    value=False,
+    help=f"Draw the charts from a {SAMPLE_PERCENT}% sample of Sales first, then refine to exact numbers."
+)
+preview_active = fast_preview and not refinement_ready("top_products_exact")
+sample_percent = SAMPLE_PERCENT if preview_active else None
+
+# Load data
+if preview_active:
+    df = load_sampled_data(SAMPLE_PERCENT)
+    refine_in_background("top_products_exact", load_data)
+else:
+    df = load_data()
+
 # Check if data loaded successfully
 if df.empty:
     st.error("No data available. Please check your database connection.")
@@ -67,8 +87,8 @@ if df.empty:
 
 # Sales_Date filter
 st.sidebar.subheader("Sales Date Filter")
-min_date = df['Sales_Date'].min().date()
-max_date = df['Sales_Date'].max().date()
+# Date bounds and categories come from the statistics catalog
+min_date, max_date = date_bounds("Sales")
 
 date_range = st.sidebar.date_input(
     "Select Date Range",
@@ -86,11 +106,11 @@ else:
 
 # Category3 dropdown filter
 st.sidebar.subheader("Category Filter")
-categories = ['All'] + sorted(df['Category3'].dropna().unique().tolist())
+categories = ['All'] + dimension_values("Category3", "Sales")
 selected_category = st.sidebar.selectbox("Select Category3", categories)
 
-# Apply filters
-filtered_df = df.copy()
+# Apply filters (each filter builds a new frame, the shared one is never copied)
+filtered_df = df
 
 # Filter by date range
 filtered_df = filtered_df[
@@ -104,7 +124,7 @@ if selected_category != 'All':
 
 # Create pivot table with Code as rows and sum of Qty as values
 if not filtered_df.empty:
-    pivot_table = filtered_df.groupby('Code')['Qty'].sum().reset_index()
+    pivot_table = filtered_df.groupby('Code', observed=True)['Qty'].sum().reset_index()
     pivot_table.columns = ['Code', 'Total Qty']
     pivot_table = pivot_table.sort_values('Total Qty', ascending=False)
     
@@ -113,16 +133,21 @@ if not filtered_df.empty:
     
     # Show filter information
     st.info(f"📅 Showing data from {start_date} to {end_date} | 📂 Category: {selected_category}")
+    if preview_active:
+        watch_refinement("top_products_exact")
     
     # Display metrics
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Records", len(filtered_df))
+        total_records, records_margin = estimate_count(len(filtered_df), sample_percent)
+        st.metric("Total Records", format_estimate(total_records, records_margin))
     with col2:
-        total_qty = pd.to_numeric(filtered_df['Qty'], errors='coerce').sum()
-        st.metric("Total Quantity", f"{total_qty:,.0f}")
+        total_qty, qty_margin = estimate_total(pd.to_numeric(filtered_df['Qty'], errors='coerce').dropna(), sample_percent)
+        st.metric("Total Quantity", format_estimate(total_qty, qty_margin))
     with col3:
-        st.metric("Unique Codes", filtered_df['Code'].nunique())
+        # A sample can only undercount distinct codes
+        unique_codes = filtered_df['Code'].nunique()
+        st.metric("Unique Codes", f"≥ {unique_codes}" if preview_active else unique_codes)
     with col4:
         st.metric("Date Range Days", (end_date - start_date).days + 1)
     
@@ -140,7 +165,14 @@ if not filtered_df.empty:
     
     # Top 10 Codes Chart
     st.subheader("🏆 Top 10 Codes by Quantity")
-    top_10 = pivot_table.head(10)
+    if preview_active:
+        top_10 = pivot_table.head(10)
+    else:
+        # Ranked from the per-day Code totals rather than the loaded rows
+        top_10 = top_k(
+            start_date, end_date, 10,
+            category=None if selected_category == 'All' else selected_category
+        ).rename(columns={'Qty': 'Total Qty'})
     
     fig_bar = px.bar(
         top_10,
@@ -161,6 +193,10 @@ if not filtered_df.empty:
     daily_sales = filtered_df.groupby('Sales_Date')['Qty'].sum().reset_index()
     daily_sales['Sales_Date'] = pd.to_datetime(daily_sales['Sales_Date'])
     daily_sales = daily_sales.sort_values('Sales_Date')
+    daily_totals = daily_sales
+    
+    # Each point becomes an animation frame, so keep the shape with far fewer points
+    daily_sales = downsample(daily_sales, 'Sales_Date', 'Qty', max_points=ANIMATION_MAX_POINTS)
     
     if not daily_sales.empty:
         # Method 1: Progressive Line Animation
@@ -270,8 +306,10 @@ if not filtered_df.empty:
         st.subheader("📊 Sales by Category (Animated)")
         
         # Prepare category data
-        category_daily = filtered_df.groupby(['Sales_Date', 'Category3'])['Qty'].sum().reset_index()
+        category_daily = filtered_df.groupby(['Sales_Date', 'Category3'], observed=True)['Qty'].sum().reset_index()
         category_daily['Sales_Date'] = pd.to_datetime(category_daily['Sales_Date'])
+        # Keep the dates picked for the daily totals, so every frame shows every category
+        category_daily = category_daily[category_daily['Sales_Date'].isin(daily_sales['Sales_Date'])]
         category_daily = category_daily.sort_values(['Sales_Date', 'Category3'])
         
         if not category_daily.empty:
@@ -358,11 +396,18 @@ st.sidebar.markdown("---")
 st.sidebar.markdown(f"**📊 Total Records in DB:** {len(df):,}")
 st.sidebar.markdown(f"**🔍 Filtered Records:** {len(filtered_df):,}")
 
-# Debug info (optional)
-if st.sidebar.checkbox("Show Debug Info"):
-    st.sidebar.write("Daily Sales Data Shape:", daily_sales.shape if not filtered_df.empty else "N/A")
-    if not filtered_df.empty:
-        st.sidebar.write("Date Range:", daily_sales['Sales_Date'].min(), "to", daily_sales['Sales_Date'].max())
+# Debug info (optional); a fragment in the sidebar, so ticking it reruns only
+# this section with the daily series from the last full run
+@st.fragment
+def debug_info(daily_sales):
+    if st.checkbox("Show Debug Info"):
+        st.write("Daily Sales Data Shape:", daily_sales.shape if daily_sales is not None else "N/A")
+        if daily_sales is not None:
+            st.write("Date Range:", daily_sales['Sales_Date'].min(), "to", daily_sales['Sales_Date'].max())
+
+with st.sidebar:
+    debug_info(daily_totals if not filtered_df.empty else None)
+
 # Sidebar Navigation - WITH ACTUAL PAGE SWITCHING
 st.sidebar.title("🌐 Navigation")
 st.sidebar.markdown("### Select a Dashboard Page")
@@ -436,9 +481,13 @@ To navigate between pages:
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔧 Quick Actions")
-if st.sidebar.button("🔄 Refresh All Data"):
-    st.cache_data.clear()
-    st.success("Data refreshed successfully!")
+if st.sidebar.button("🔄 Check for New Data"):
+    # Only caches that read a changed table are cleared
+    changed = check_now(rescan=True)
+    if changed:
+        st.success(f"Reloaded data for: {', '.join(changed)}")
+    else:
+        st.success("Data is already up to date.")
 
 st.sidebar.markdown("### 📞 Support")
 st.sidebar.info("For technical support or feature requests, please contact the Dispatch Supervisor.")
@@ -1,10 +1,11 @@
 import streamlit as st
-import duckdb
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import os
-import requests
+from dashboard.pyramid import build_pyramid, zoomable_trend
+from dashboard.catalog import date_bounds
+from dashboard.db import run_query
+from dashboard.freshness import cached_from, check_now
 
 # Page configuration
 st.set_page_config(page_title="Sales Oscilloscope", layout="wide")
@@ -12,41 +13,13 @@ st.set_page_config(page_title="Sales Oscilloscope", layout="wide")
 # Title
 st.title("📊 Sales Oscilloscope Dashboard - Animated Chart")
 
-# ---- DATABASE CONNECTION (Same as your working code) ----
-@st.cache_resource
-def get_duckdb():
-    db_filename = "dispatch.duckdb"
-    url = "https://drive.google.com/uc?export=download&id=1tYt3Z5McuQYifmNImZyACPHW9C9ju7L4"
-
-    if not os.path.exists(db_filename):
-        st.write("Downloading database from Google Drive...")
-        resp = requests.get(url, allow_redirects=True)
-        if resp.status_code != 200:
-            st.error(f"Failed to download database. Status code = {resp.status_code}")
-            st.stop()
-        with open(db_filename, "wb") as f:
-            f.write(resp.content)
-
-    return duckdb.connect(db_filename)
-
-# Get connection
-con = get_duckdb()
+# ---- DATABASE CONNECTION ----
+# Queries go through run_query, which uses the query service when one is configured
 st.success("Connected to DuckDB!")
 
-# Get date range from database
-@st.cache_data
-def get_date_range():
-    query = """
-    SELECT 
-        MIN(CAST(Sales_Date AS DATE)) AS min_date,
-        MAX(CAST(Sales_Date AS DATE)) AS max_date
-    FROM Sales
-    """
-    result = con.execute(query).df()
-    return result['min_date'].iloc[0], result['max_date'].iloc[0]
-
 try:
-    min_date, max_date = get_date_range()
+    # Date bounds come from the statistics catalog
+    min_date, max_date = date_bounds("Sales")
     
     # Sidebar for date selection
     st.sidebar.header("📅 Select Date Range")
@@ -78,63 +51,93 @@ try:
         st.error("⚠️ Start date must be before end date!")
         st.stop()
     
-    # Query data based on selected date range
-    @st.cache_data
-    def load_data(start, end):
-        query = """
-        SELECT 
-            CAST(Sales_Date AS DATE) AS Sales_Date,
-            SUM(CAST(Qty AS INTEGER)) AS Qty
-        FROM Sales
-        WHERE CAST(Sales_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-        GROUP BY CAST(Sales_Date AS DATE)
-        ORDER BY CAST(Sales_Date AS DATE) ASC
-        """
-        return con.execute(query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]).df()
-    
-    # Query monthly data
-    @st.cache_data
-    def load_monthly_data(start, end):
+    # Query daily totals, running total, monthly rollup and summary stats in one scan;
+    # recent ranges run on the in-memory hot tier
+    @cached_from("Sales")
+    def load_sales_rollup(start, end):
         query = """
+        WITH Daily AS (
+            SELECT 
+                CAST(Sales_Date AS DATE) AS Sales_Date,
+                DATE_TRUNC('month', CAST(Sales_Date AS DATE)) AS Month,
+                CAST(Qty AS INTEGER) AS Qty
+            FROM Sales
+            WHERE CAST(Sales_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
+        ),
+        Rollup AS (
+            SELECT 
+                CASE GROUPING(Month, Sales_Date)
+                    WHEN 0 THEN 'day'
+                    WHEN 1 THEN 'month'
+                    ELSE 'total'
+                END AS Level,
+                Month,
+                Sales_Date,
+                SUM(Qty) AS Qty
+            FROM Daily
+            GROUP BY GROUPING SETS ((Month, Sales_Date), (Month), ())
+        )
         SELECT 
-            DATE_TRUNC('month', CAST(Sales_Date AS DATE)) AS Month,
-            SUM(CAST(Qty AS INTEGER)) AS Qty
-        FROM Sales
-        WHERE CAST(Sales_Date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
-        GROUP BY DATE_TRUNC('month', CAST(Sales_Date AS DATE))
-        ORDER BY Month ASC
+            Level,
+            Month,
+            Sales_Date,
+            Qty,
+            SUM(Qty) OVER (
+                PARTITION BY Level
+                ORDER BY Month, Sales_Date
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+            ) AS Running_Total,
+            AVG(Qty) OVER (PARTITION BY Level) AS Avg_Qty,
+            MAX(Qty) OVER (PARTITION BY Level) AS Max_Qty,
+            COUNT(*) OVER (PARTITION BY Level) AS Periods
+        FROM Rollup
+        ORDER BY Level, Month, Sales_Date
         """
-        df = con.execute(query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]).df()
-        df['Month_Label'] = pd.to_datetime(df['Month']).dt.strftime('%b %Y')
-        return df
+        result = run_query(query, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')], since=start)
+        
+        # Daily rows with their running total
+        daily = result[result['Level'] == 'day']
+        df = daily[['Sales_Date', 'Qty', 'Running_Total']].reset_index(drop=True)
+        
+        # Monthly rollup rows
+        monthly = result[result['Level'] == 'month']
+        monthly_df = monthly[['Month', 'Qty']].reset_index(drop=True)
+        monthly_df['Month_Label'] = pd.to_datetime(monthly_df['Month']).dt.strftime('%b %Y')
+        
+        # Summary stats taken from the rollup rows themselves
+        total = result[result['Level'] == 'total']
+        stats = {
+            'total_qty': total['Qty'].iloc[0] if not total.empty and pd.notna(total['Qty'].iloc[0]) else 0,
+            'avg_daily_qty': daily['Avg_Qty'].iloc[0] if not daily.empty else 0,
+            'max_daily_qty': daily['Max_Qty'].iloc[0] if not daily.empty else 0,
+            'days': len(daily),
+            'avg_monthly_qty': monthly['Avg_Qty'].iloc[0] if not monthly.empty else 0,
+        }
+        return df, monthly_df, stats
     
-    df = load_data(start_date, end_date)
-    monthly_df = load_monthly_data(start_date, end_date)
+    df, monthly_df, stats = load_sales_rollup(start_date, end_date)
     
     if df.empty:
         st.warning("⚠️ No data available for the selected date range.")
         st.stop()
     
-    # Calculate running total
-    df['Running_Total'] = df['Qty'].cumsum()
-    
     # Display metrics
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Quantity", f"{df['Qty'].sum():,.0f}")
+        st.metric("Total Quantity", f"{stats['total_qty']:,.0f}")
     
     with col2:
-        st.metric("Average Daily Qty", f"{df['Qty'].mean():,.0f}")
+        st.metric("Average Daily Qty", f"{stats['avg_daily_qty']:,.0f}")
     
     with col3:
-        st.metric("Max Daily Qty", f"{df['Qty'].max():,.0f}")
+        st.metric("Max Daily Qty", f"{stats['max_daily_qty']:,.0f}")
     
     with col4:
-        st.metric("Days in Range", len(df))
+        st.metric("Days in Range", stats['days'])
     
     # Create tabs for different visualizations
-    tab1, tab2 = st.tabs(["📈 Daily Oscilloscope (Animated)", "📊 Monthly Column Chart"])
+    tab1, tab2, tab3 = st.tabs(["📈 Daily Oscilloscope (Animated)", "📊 Monthly Column Chart", "🔍 Zoomable Trend"])
     
     with tab1:
         # Create animated oscilloscope chart with frames
@@ -211,7 +214,7 @@ try:
         fig.frames = frames
         
         # Add average line
-        avg_qty = df['Qty'].mean()
+        avg_qty = stats['avg_daily_qty']
         fig.add_hline(
             y=avg_qty,
             line_dash="dash",
@@ -354,7 +357,7 @@ try:
         ))
         
         # Add average line
-        monthly_avg = monthly_df['Qty'].mean()
+        monthly_avg = stats['avg_monthly_qty']
         fig_monthly.add_hline(
             y=monthly_avg,
             line_dash="dash",
@@ -425,6 +428,26 @@ try:
             height=300
         )
     
+    with tab3:
+        # Day/week/month pyramid; only the visible range is sent to the chart
+        pyramid = build_pyramid()
+        zoomable_trend(
+            pyramid,
+            start_date,
+            end_date,
+            key="oscilloscope_zoom",
+            title="Sales Quantity",
+            line_color='#00ff00',
+            layout=dict(
+                plot_bgcolor='#0a0a0a',
+                paper_bgcolor='#1a1a1a',
+                font=dict(color='#00ff00', family='Courier New, monospace'),
+                xaxis=dict(showgrid=True, gridcolor='#1a4d1a', color='#00ff00'),
+                yaxis=dict(showgrid=True, gridcolor='#1a4d1a', color='#00ff00'),
+                height=500
+            )
+        )
+    
     # Display daily data table
     st.subheader("📋 Daily Sales Data Table")
     
@@ -541,9 +564,13 @@ To navigate between pages:
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔧 Quick Actions")
-if st.sidebar.button("🔄 Refresh All Data"):
-    st.cache_data.clear()
-    st.success("Data refreshed successfully!")
+if st.sidebar.button("🔄 Check for New Data"):
+    # Only caches that read a changed table are cleared
+    changed = check_now(rescan=True)
+    if changed:
+        st.success(f"Reloaded data for: {', '.join(changed)}")
+    else:
+        st.success("Data is already up to date.")
 
 st.sidebar.markdown("### 📞 Support")
 st.sidebar.info("For technical support or feature requests, please contact the Dispatch Supervisor.")
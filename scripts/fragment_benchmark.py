@@ -0,0 +1,104 @@
+"""Time the fragment-scoped widgets: full-page rerun vs fragment rerun.
+
+    python scripts/fragment_benchmark.py --repeat 5
+
+Each widget below lives in an ``st.fragment``. Changing it used to rerun
+the whole page: every query, figure and CSV. The full rerun is timed with
+Streamlit's ``AppTest``, which always reruns the whole script. The
+fragment rerun is timed by sending the same widget change with the
+fragment's id, which is what the browser does for a widget inside a
+fragment. Run ``python scripts/serve.py --prepare-only`` first so the
+derived tables exist; the first render of each page warms its caches and
+is not timed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from functools import partial
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (page, fragment function, widget kind, widget label)
+INTERACTIONS = [
+    ("pages/Sun_Brust.py", "top_products_section", "checkbox", "Show Top Products Data"),
+    ("pages/Top_Items_By_Dispatch.py", "detail_view", "radio", "View:"),
+    ("pages/Top_Products_By_Categore.py", "debug_info", "checkbox", "Show Debug Info"),
+]
+
+
+def _fragment_id(at, name):
+    """Id of the fragment whose function is ``name`` in the last run of ``at``."""
+    for fragment_id, fragment in at._fragment_storage._fragments.items():
+        cells = dict(zip(fragment.__code__.co_freevars, fragment.__closure__ or ()))
+        func = cells.get("non_optional_func")
+        if func is not None and func.cell_contents.__name__ == name:
+            return fragment_id
+    raise LookupError(f"no fragment {name} was registered")
+
+
+@contextmanager
+def _fragment_scoped(fragment_id):
+    """Make AppTest's reruns come from inside ``fragment_id``."""
+    from streamlit.testing.v1 import local_script_runner
+
+    rerun_data = local_script_runner.RerunData
+    local_script_runner.RerunData = partial(rerun_data, fragment_id=fragment_id)
+    try:
+        yield
+    finally:
+        local_script_runner.RerunData = rerun_data
+
+
+def _change(at, kind, label):
+    """Flip a checkbox or move a radio to its next option."""
+    widget = next(w for w in getattr(at, kind) if w.label == label)
+    if kind == "checkbox":
+        widget.set_value(not widget.value)
+    else:
+        options = list(widget.options)
+        widget.set_value(options[(options.index(widget.value) + 1) % len(options)])
+
+
+def _timed_changes(at, kind, label, repeat):
+    times = []
+    for _ in range(repeat):
+        _change(at, kind, label)
+        start = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="timed changes per widget and mode")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from streamlit.testing.v1 import AppTest
+
+    print(f"{'page':<34} {'widget':<24} {'full ms':>9} {'fragment ms':>12} {'speedup':>8}")
+    for page, fragment, kind, label in INTERACTIONS:
+        at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=120).run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        full = _timed_changes(at, kind, label, args.repeat)
+
+        at.run()
+        with _fragment_scoped(_fragment_id(at, fragment)):
+            scoped = _timed_changes(at, kind, label, args.repeat)
+
+        print(
+            f"{os.path.basename(page):<34} {label:<24} {full * 1000:>9.1f} "
+            f"{scoped * 1000:>12.1f} {full / scoped:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Pre-generate every supervisor's Dispatched Note for a day.
+
+    python scripts/generate_notes.py                   # latest sales day
+    python scripts/generate_notes.py --date 2025-03-14 --out dispatch_notes
+
+A dashboard that owns the database read-write already keeps the latest
+day's notes current, and DuckDB refuses the file to every other process
+while it does. There, run this through the query service (set
+DISPATCH_QUERY_SERVICE) or point --database at a copy. Against a
+published read-only snapshot it can run next to the dashboard, for
+example every morning from cron:
+
+    30 5 * * * cd /srv/Dispatch_Deshboard && python scripts/generate_notes.py
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    import duckdb
+
+    from dashboard.db import QUERY_SERVICE_URL, current_snapshot
+    from dashboard.notes import NOTES_DIR, generate_notes, latest_day
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--date", type=date.fromisoformat,
+                        help="day to generate (default: latest day in Sales)")
+    parser.add_argument("--out", default=NOTES_DIR, help="output directory")
+    parser.add_argument("--database", help="database file (default: the query service, else the live snapshot)")
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx"], choices=["csv", "xlsx"])
+    args = parser.parse_args()
+
+    con = None
+    if args.database or not QUERY_SERVICE_URL:
+        path = args.database or current_snapshot()
+        try:
+            con = duckdb.connect(path, read_only=True)
+        except duckdb.IOException as e:
+            sys.exit(f"Cannot open {path} ({e}). Another process holds it read-write: "
+                     "use the query service (DISPATCH_QUERY_SERVICE) or --database on a copy.")
+    day = args.date or latest_day(con)
+    written = generate_notes(day, args.out, tuple(args.formats), con=con)
+    print(f"Wrote {len(written)} files for {day} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
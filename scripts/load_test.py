@@ -0,0 +1,67 @@
+"""Measure page-render throughput with 1..N worker processes.
+
+    python scripts/load_test.py --max-workers 4 --renders 20
+
+Each worker process renders dashboard pages headlessly with Streamlit's
+``AppTest`` against the read-only database, the same Python work a
+Streamlit worker does per rerun. Run ``python scripts/serve.py
+--prepare-only`` first. Throughput should grow close to linearly with the
+number of processes up to the number of cores.
+"""
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PAGES = [
+    "pages/Total_Dispatched_Chat.py",
+    "pages/Supervisor_Wise_Products.py",
+    "pages/Top_Items_By_Dispatch.py",
+]
+
+
+def _render(job):
+    pages, renders = job
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    os.environ["DISPATCH_READ_ONLY"] = "1"
+    from streamlit.testing.v1 import AppTest
+
+    # Warm the per-process caches so only rerun work is timed
+    for page in pages:
+        AppTest.from_file(os.path.join(ROOT, page), default_timeout=120).run()
+
+    start = time.perf_counter()
+    for i in range(renders):
+        at = AppTest.from_file(os.path.join(ROOT, pages[i % len(pages)]), default_timeout=120).run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    return renders, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--renders", type=int, default=20, help="renders per worker")
+    parser.add_argument("--pages", nargs="*", default=DEFAULT_PAGES)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>7} {'renders/s':>10} {'speedup':>8}")
+    for workers in range(1, args.max_workers + 1):
+        with Pool(workers) as pool:
+            start = time.perf_counter()
+            results = pool.map(_render, [(args.pages, args.renders)] * workers)
+            wall = time.perf_counter() - start
+        # Throughput over the timed sections, which run concurrently
+        renders = sum(r for r, _ in results)
+        rate = renders / max(elapsed for _, elapsed in results)
+        baseline = baseline or rate
+        print(f"{workers:>7} {rate:>10.2f} {rate / baseline:>7.2f}x  (wall {wall:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
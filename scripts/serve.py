@@ -0,0 +1,164 @@
+"""Run the dashboard as several Streamlit worker processes behind one port.
+
+    python scripts/serve.py --workers 4 --port 8501
+
+The launcher first opens ``dispatch.duckdb`` read-write once to build the
+derived tables (normalized schema, per-day Code totals, stock balances). It
+then starts N ``streamlit run`` workers on ``port+1 .. port+N``. Each worker opens the
+database read-only and shares the memory-mapped dataset directory. A small
+TCP proxy on ``--port`` pins every client IP to one worker, which keeps a
+browser's websocket session and its ``st.session_state`` together. Per-worker
+connection counts are served as JSON on ``--metrics-port``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def prepare():
+    """Build the derived tables the read-only workers expect to find."""
+    from dashboard.db import DB_FILENAME, current_snapshot, download_database
+    import duckdb
+
+    from dashboard.catalog import refresh_catalog
+    from dashboard.snapshots import refresh_derived
+
+    os.chdir(ROOT)
+    path = current_snapshot()
+    if path == DB_FILENAME and not os.path.exists(DB_FILENAME):
+        status = download_database()
+        if status != 200:
+            sys.exit(f"Failed to download database. Status code = {status}")
+    con = duckdb.connect(path)
+    try:
+        refresh_derived(con, refresh_catalog(con))
+    finally:
+        con.close()
+
+
+def start_workers(count, base_port, shared_dir):
+    env = dict(os.environ, DISPATCH_READ_ONLY="1", DISPATCH_SHARED_DIR=shared_dir)
+    workers = []
+    for i in range(count):
+        port = base_port + 1 + i
+        workers.append(subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", "Home_Page.py",
+             "--server.port", str(port), "--server.headless", "true",
+             "--server.address", "127.0.0.1"],
+            cwd=ROOT, env=env,
+        ))
+    return workers
+
+
+# ---- STICKY PROXY ----
+class StickyProxy:
+    """Forward raw TCP to a worker chosen by a hash of the client IP."""
+
+    def __init__(self, ports):
+        self.ports = ports
+        self.active = {port: 0 for port in ports}
+        self.total = {port: 0 for port in ports}
+
+    def pick(self, client_ip):
+        return self.ports[zlib.crc32(client_ip.encode()) % len(self.ports)]
+
+    async def _pipe(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, client_reader, client_writer):
+        client_ip = client_writer.get_extra_info("peername")[0]
+        port = self.pick(client_ip)
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            client_writer.close()
+            return
+        self.active[port] += 1
+        self.total[port] += 1
+        try:
+            await asyncio.gather(
+                self._pipe(client_reader, upstream_writer),
+                self._pipe(upstream_reader, client_writer),
+            )
+        finally:
+            self.active[port] -= 1
+
+    def metrics(self):
+        return {
+            str(port): {"active_connections": self.active[port], "total_connections": self.total[port]}
+            for port in self.ports
+        }
+
+
+async def serve_metrics(proxy, workers, reader, writer):
+    await reader.readline()
+    body = json.dumps({
+        "workers": proxy.metrics(),
+        "alive": sum(w.poll() is None for w in workers),
+    }).encode()
+    writer.write(
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    writer.close()
+
+
+async def run(args, workers):
+    ports = [args.port + 1 + i for i in range(args.workers)]
+    proxy = StickyProxy(ports)
+    server = await asyncio.start_server(proxy.handle, args.host, args.port)
+    metrics = await asyncio.start_server(
+        lambda r, w: serve_metrics(proxy, workers, r, w), "127.0.0.1", args.metrics_port
+    )
+    print(f"Dashboard on http://{args.host}:{args.port} ({args.workers} workers), "
+          f"metrics on http://127.0.0.1:{args.metrics_port}")
+    async with server, metrics:
+        await asyncio.gather(server.serve_forever(), metrics.serve_forever())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8501)
+    parser.add_argument("--metrics-port", type=int, default=9501)
+    parser.add_argument("--shared-dir", default=os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else "/tmp", "dispatch_datasets"))
+    parser.add_argument("--prepare-only", action="store_true",
+                        help="build the derived tables and exit")
+    args = parser.parse_args()
+
+    prepare()
+    if args.prepare_only:
+        return
+
+    workers = start_workers(args.workers, args.port, args.shared_dir)
+    try:
+        asyncio.run(run(args, workers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.send_signal(signal.SIGTERM)
+        for worker in workers:
+            worker.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Shared fixtures: a small dispatch database and the dashboard pointed at it.
+
+``build_database`` writes the seven source tables with the column types of
+the real file (Sales and Orders quantities as text, dates as timestamps)
+and a few deterministic rows per day.
+"""
+import random
+from datetime import date, datetime, time, timedelta
+
+import duckdb
+import pytest
+import streamlit as st
+
+from dashboard import freshness
+
+FIRST_DAY = date(2024, 1, 1)
+DAYS = 120
+CODES = [f"C{i:03d}" for i in range(12)]
+ROUTES = [f"R{i:02d}" for i in range(6)]
+SUPERVISORS = ["North", "South", "East"]
+
+
+def build_database(path, days=DAYS, seed=7):
+    """Write the source tables for ``days`` days from ``FIRST_DAY`` to ``path``."""
+    rng = random.Random(seed)
+    con = duckdb.connect(str(path))
+    con.execute("CREATE TABLE Products (Code VARCHAR, Description VARCHAR, Category2 VARCHAR, Category3 VARCHAR)")
+    con.executemany("INSERT INTO Products VALUES (?, ?, ?, ?)", [
+        (code, f"Item {code}", f"Sub{i % 4}", f"Cat{i % 3}") for i, code in enumerate(CODES)
+    ])
+    con.execute("CREATE TABLE Supervisors (Route VARCHAR, Supervisor VARCHAR)")
+    con.executemany("INSERT INTO Supervisors VALUES (?, ?)", [
+        (route, SUPERVISORS[i % len(SUPERVISORS)]) for i, route in enumerate(ROUTES)
+    ])
+    con.execute("CREATE TABLE Sales (Code VARCHAR, Route VARCHAR, Qty VARCHAR, Sales_Date TIMESTAMP)")
+    con.execute("CREATE TABLE Orders (Code VARCHAR, Sales_Date TIMESTAMP, Qty VARCHAR)")
+    con.execute("CREATE TABLE Received (Code VARCHAR, Received_Date DATE, Received_Qty DOUBLE)")
+    con.execute("CREATE TABLE Adjustment (Code VARCHAR, Adjuctment_Date DATE, Adjustment_Qty DOUBLE)")
+    con.execute("CREATE TABLE CostCenter (Code VARCHAR, Date DATE, Qty DOUBLE)")
+
+    sales, orders, received, adjustment, cost_center = [], [], [], [], []
+    for offset in range(days):
+        day = FIRST_DAY + timedelta(days=offset)
+        stamp = datetime.combine(day, time(8))
+        for _ in range(8):
+            code, qty = rng.choice(CODES), rng.randint(1, 40)
+            sales.append((code, rng.choice(ROUTES), str(qty), stamp))
+            orders.append((code, stamp, str(qty + rng.randint(-2, 4))))
+        if offset % 7 == 0:
+            received.extend((code, day, float(rng.randint(80, 200))) for code in CODES)
+            adjustment.append((rng.choice(CODES), day, float(rng.randint(-3, 3))))
+            cost_center.append((rng.choice(CODES), day, float(rng.randint(1, 4))))
+    con.executemany("INSERT INTO Sales VALUES (?, ?, ?, ?)", sales)
+    con.executemany("INSERT INTO Orders VALUES (?, ?, ?)", orders)
+    con.executemany("INSERT INTO Received VALUES (?, ?, ?)", received)
+    con.executemany("INSERT INTO Adjustment VALUES (?, ?, ?)", adjustment)
+    con.executemany("INSERT INTO CostCenter VALUES (?, ?, ?)", cost_center)
+    return con
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    """Path of a database holding only the source tables."""
+    path = tmp_path / "source.duckdb"
+    build_database(path).close()
+    return path
+
+
+@pytest.fixture
+def dispatch_db(tmp_path, monkeypatch):
+    """Path of a warmed ``dispatch.duckdb`` that the dashboard modules use as the live database."""
+    # Imported here: the snapshots module pulls in every derived-table builder
+    from dashboard.snapshots import warm
+
+    path = tmp_path / "dispatch.duckdb"
+    con = build_database(path)
+    warm(con)
+    con.close()
+
+    monkeypatch.chdir(tmp_path)
+    # No periodic check: tests call check_now themselves
+    monkeypatch.setattr(freshness, "_watch", lambda: None)
+    monkeypatch.setattr(freshness, "_checked_snapshot", None)
+    freshness._fingerprints.clear()
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    yield path
+    # Drop the connections to this file before the next test opens its own
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    freshness._fingerprints.clear()
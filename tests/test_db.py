@@ -0,0 +1,129 @@
+"""Pins how page queries notice a superseding rerun (dashboard/db.py).
+
+``_superseding_request`` relies on Streamlit's private
+``ScriptRequests.on_scriptrunner_yield()``. These tests fail if a
+Streamlit release changes what that call returns or leaves behind, so
+``YIELD_CHECKED_VERSIONS`` is only widened after they pass.
+
+    python -m pytest tests
+"""
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+from streamlit.runtime.scriptrunner_utils.exceptions import RerunException, StopException
+from streamlit.runtime.scriptrunner_utils.script_requests import (
+    RerunData, ScriptRequests, ScriptRequestType
+)
+
+from dashboard import db
+
+
+@pytest.fixture
+def script_requests(monkeypatch):
+    """A session's script requests, seen from the script thread."""
+    script_requests = ScriptRequests()
+    ctx = SimpleNamespace(script_requests=script_requests, session_id="session")
+    monkeypatch.setattr(db, "get_script_run_ctx", lambda suppress_warning=False: ctx)
+    monkeypatch.setattr(db, "_YIELD_SUPPORTED", True)
+    return script_requests
+
+
+def _on_script_thread(func):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=func()), name=db.SCRIPT_THREAD_NAME)
+    thread.start()
+    thread.join()
+    return result["value"]
+
+
+def test_installed_streamlit_is_checked():
+    assert db._yield_supported()
+
+
+@pytest.mark.parametrize("version, supported", [
+    ("1.66.0", True),
+    ("1.66.2", True),
+    ("1.65.0", False),
+    ("1.67.0", False),
+    ("2.0.0", False),
+])
+def test_version_range(version, supported):
+    assert db._yield_supported(version) is supported
+
+
+def test_no_request_pending(script_requests):
+    assert _on_script_thread(db._superseding_request) is None
+
+
+def test_rerun_is_taken_once(script_requests):
+    script_requests.request_rerun(RerunData(query_string="a=1"))
+    request = _on_script_thread(db._superseding_request)
+    assert request.type == ScriptRequestType.RERUN
+    assert request.rerun_data.query_string == "a=1"
+    # Taken: the script runner will not see it again, so the caller must rerun
+    assert _on_script_thread(db._superseding_request) is None
+
+
+def test_stop_stays_pending(script_requests):
+    script_requests.request_stop()
+    assert _on_script_thread(db._superseding_request).type == ScriptRequestType.STOP
+    assert _on_script_thread(db._superseding_request).type == ScriptRequestType.STOP
+
+
+def test_other_threads_leave_the_request(script_requests):
+    script_requests.request_rerun(RerunData())
+    assert db._superseding_request() is None
+    assert _on_script_thread(db._superseding_request).type == ScriptRequestType.RERUN
+
+
+def test_unchecked_release_leaves_the_request(script_requests, monkeypatch):
+    monkeypatch.setattr(db, "_YIELD_SUPPORTED", False)
+    script_requests.request_rerun(RerunData())
+    assert _on_script_thread(db._superseding_request) is None
+    monkeypatch.setattr(db, "_YIELD_SUPPORTED", True)
+    assert _on_script_thread(db._superseding_request).type == ScriptRequestType.RERUN
+
+
+def _wait_for_query():
+    """Run ``_wait`` on a query that only ends when cancelled; returns (exception, cancelled)."""
+    future = Future()
+    future.set_running_or_notify_cancel()
+    cancelled = []
+
+    def cancel():
+        cancelled.append(True)
+        future.set_exception(RuntimeError("interrupted"))
+
+    def wait():
+        try:
+            db._wait(future, cancel, timeout=2)
+        except BaseException as e:
+            return e
+
+    return _on_script_thread(wait), bool(cancelled)
+
+
+def test_rerun_interrupts_the_query(script_requests):
+    script_requests.request_rerun(RerunData())
+    error, cancelled = _wait_for_query()
+    assert isinstance(error, RerunException)
+    assert cancelled
+
+
+def test_stop_interrupts_the_query(script_requests):
+    script_requests.request_stop()
+    error, cancelled = _wait_for_query()
+    assert isinstance(error, StopException)
+    assert cancelled
+
+
+def test_unchecked_release_waits_for_the_query(script_requests, monkeypatch):
+    monkeypatch.setattr(db, "_YIELD_SUPPORTED", False)
+    script_requests.request_rerun(RerunData())
+    error, cancelled = _wait_for_query()
+    # Only the timeout ends it, and the rerun is still pending for Streamlit
+    assert isinstance(error, db.QueryTimeout)
+    assert cancelled
+    assert script_requests.on_scriptrunner_yield().type == ScriptRequestType.RERUN
@@ -0,0 +1,112 @@
+"""Chunked snapshot distribution over HTTP (dashboard/distribution.py)."""
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import duckdb
+import pytest
+
+from conftest import build_database
+from dashboard.distribution import DistributionError, _chunk_path, build, fetch
+
+# DuckDB's block size, so a small fixture file still spans several chunks
+CHUNK_SIZE = 256 * 1024
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def dist(tmp_path):
+    """(directory, URL) of a static file server, as the README sets one up."""
+    root = tmp_path / "dist"
+    root.mkdir()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def _snapshot(path, extra_days=0):
+    con = build_database(path)
+    if extra_days:
+        con.execute("INSERT INTO Sales SELECT Code, Route, Qty, Sales_Date + INTERVAL 1 YEAR FROM Sales LIMIT ?",
+                    [extra_days * 8])
+    con.execute("CHECKPOINT")
+    con.close()
+    return path
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_fetch_reassembles_the_snapshot(dist, tmp_path):
+    root, url = dist
+    source = _snapshot(tmp_path / "source.duckdb")
+    manifest = build(str(source), str(root), CHUNK_SIZE)
+    assert len(manifest["chunks"]) > 1
+
+    stats = fetch(url, str(tmp_path / "copy.duckdb"))
+    assert _read(tmp_path / "copy.duckdb") == _read(source)
+    assert stats["reused"] == 0 and stats["downloaded"] == len(set(manifest["chunks"]))
+    con = duckdb.connect(str(tmp_path / "copy.duckdb"), read_only=True)
+    assert con.execute("SELECT COUNT(*) FROM Sales").fetchone()[0] > 0
+    con.close()
+
+
+def test_update_reuses_the_local_copy(dist, tmp_path):
+    root, url = dist
+    build(str(_snapshot(tmp_path / "day1.duckdb")), str(root), CHUNK_SIZE)
+    local = tmp_path / "local.duckdb"
+    fetch(url, str(local))
+
+    updated = _snapshot(tmp_path / "day2.duckdb", extra_days=3)
+    build(str(updated), str(root), CHUNK_SIZE)
+    stats = fetch(url, str(local), seed=str(local))
+    assert _read(local) == _read(updated)
+    assert stats["reused"] > 0
+    assert stats["bytes_downloaded"] < os.path.getsize(updated)
+
+
+def test_corrupt_chunk_leaves_the_local_copy(dist, tmp_path):
+    root, url = dist
+    manifest = build(str(_snapshot(tmp_path / "source.duckdb")), str(root), CHUNK_SIZE)
+    local = tmp_path / "local.duckdb"
+    local.write_bytes(b"previous copy")
+    with open(_chunk_path(str(root), manifest["chunks"][-1]), "wb") as f:
+        f.write(b"not a chunk")
+
+    with pytest.raises(DistributionError):
+        fetch(url, str(local))
+    assert local.read_bytes() == b"previous copy"
+    assert not os.path.exists(f"{local}.partial")
+
+
+def test_prune_keeps_the_previous_manifest(tmp_path):
+    root = str(tmp_path / "dist")
+    first = build(str(_snapshot(tmp_path / "day1.duckdb")), root, CHUNK_SIZE)
+    second = build(str(_snapshot(tmp_path / "day2.duckdb", extra_days=3)), root, CHUNK_SIZE, prune=True)
+    third = build(str(_snapshot(tmp_path / "day3.duckdb", extra_days=6)), root, CHUNK_SIZE, prune=True)
+
+    present = {name for _, _, names in os.walk(os.path.join(root, "chunks")) for name in names}
+    assert present == set(second["chunks"]) | set(third["chunks"])
+    assert set(first["chunks"]) - present
+
+
+def test_open_write_ahead_log_refused(tmp_path):
+    path = tmp_path / "open.duckdb"
+    con = build_database(path)
+    try:
+        if not os.path.exists(f"{path}.wal"):
+            pytest.skip("DuckDB checkpointed without being asked")
+        with pytest.raises(DistributionError):
+            build(str(path), str(tmp_path / "dist"))
+    finally:
+        con.close()
@@ -0,0 +1,46 @@
+"""Trend-line downsampling and the chart render mode (dashboard/downsample.py)."""
+import numpy as np
+import pandas as pd
+
+from dashboard.downsample import MAX_POINTS_PER_TRACE, WEBGL_THRESHOLD, downsample, lttb_indices, render_mode
+
+
+def _daily(n, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Sales_Date': pd.date_range("2020-01-01", periods=n, freq="D"),
+        'Qty': rng.integers(0, 100, n),
+    })
+
+
+def test_short_series_kept_whole():
+    df = _daily(50).sample(frac=1, random_state=1)
+    result = downsample(df, 'Sales_Date', 'Qty')
+    assert len(result) == 50
+    assert result['Sales_Date'].is_monotonic_increasing
+
+
+def test_long_series_capped_with_ends_and_peak():
+    df = _daily(5000)
+    df.loc[2345, 'Qty'] = 10_000
+    result = downsample(df, 'Sales_Date', 'Qty')
+    assert len(result) == MAX_POINTS_PER_TRACE
+    assert result['Sales_Date'].is_monotonic_increasing
+    assert result['Sales_Date'].iloc[0] == df['Sales_Date'].iloc[0]
+    assert result['Sales_Date'].iloc[-1] == df['Sales_Date'].iloc[-1]
+    assert result['Qty'].max() == 10_000
+
+
+def test_lttb_keeps_one_point_per_bucket():
+    x = np.arange(100, dtype=float)
+    kept = lttb_indices(x, np.sin(x), 10)
+    assert len(kept) == 10 and kept[0] == 0 and kept[-1] == 99
+    assert (np.diff(kept) > 0).all()
+
+
+def test_render_mode_follows_the_source_rows():
+    raw = _daily(WEBGL_THRESHOLD * 3)
+    # The downsampled frame is at the cap, but the chart stands for every source row
+    assert len(downsample(raw, 'Sales_Date', 'Qty')) <= WEBGL_THRESHOLD
+    assert render_mode(len(raw)) == "webgl"
+    assert render_mode(WEBGL_THRESHOLD) == "svg"
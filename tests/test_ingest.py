@@ -0,0 +1,89 @@
+"""Incremental ingest against a full rebuild of the same data (dashboard/ingest.py)."""
+from datetime import datetime, timedelta
+
+import duckdb
+import pytest
+
+from conftest import DAYS, FIRST_DAY, build_database
+from dashboard import ingest
+from dashboard.ingest import ingest_inbox
+from dashboard.snapshots import warm
+
+DERIVED = ("SalesFact", "OrdersFact", "DailyCodeTotals", "StockLedger", "MonthlyClosingStock")
+
+LAST_DAY = FIRST_DAY + timedelta(days=DAYS - 1)
+
+
+def _write_deltas(inbox):
+    """Delta files that rewrite one day, add a new day and a new Code (one file name has a quote)."""
+    inbox.mkdir()
+    con = duckdb.connect()
+    changed = datetime.combine(FIRST_DAY + timedelta(days=40), datetime.min.time())
+    new = datetime.combine(LAST_DAY + timedelta(days=1), datetime.min.time())
+    con.execute(f"""COPY (SELECT * FROM (VALUES
+        ('C001', 'R01', '7', TIMESTAMP '{changed}'), ('C001', 'R01', '7', TIMESTAMP '{changed}'),
+        ('C999', 'R02', '3', TIMESTAMP '{new}')) t(Code, Route, Qty, Sales_Date)
+    ) TO '{inbox}/Sales_o''brien.csv'""")
+    con.execute(f"""COPY (SELECT * FROM (VALUES ('C999', DATE '{new.date()}', 50.0)) t(Code, Received_Date, Received_Qty))
+        TO '{inbox}/Received_new.parquet'""")
+    con.execute(f"""COPY (SELECT * FROM (VALUES ('C999', 'Item C999', 'Sub9', 'Cat9')) t(Code, Description, Category2, Category3))
+        TO '{inbox}/Products_new.csv'""")
+    con.close()
+
+
+def _apply_directly(con):
+    """The same changes as ``_write_deltas``, made to the source tables."""
+    changed, new = FIRST_DAY + timedelta(days=40), LAST_DAY + timedelta(days=1)
+    con.execute("DELETE FROM Sales WHERE CAST(Sales_Date AS DATE) = ?", [changed])
+    con.execute("INSERT INTO Sales VALUES ('C001', 'R01', '7', ?), ('C001', 'R01', '7', ?), ('C999', 'R02', '3', ?)",
+                [changed, changed, new])
+    con.execute("INSERT INTO Received VALUES ('C999', ?, 50.0)", [new])
+    con.execute("INSERT INTO Products VALUES ('C999', 'Item C999', 'Sub9', 'Cat9')")
+
+
+def _rows(con, table):
+    # ENUM types differ between the two files, so compare as text
+    columns = [c[0] for c in con.execute(f"DESCRIBE {table}").fetchall()]
+    text = ", ".join(f"CAST({c} AS VARCHAR)" for c in columns)
+    return con.execute(f"SELECT {text} FROM {table} ORDER BY ALL").fetchall()
+
+
+@pytest.fixture
+def databases(tmp_path):
+    incremental = build_database(tmp_path / "incremental.duckdb")
+    warm(incremental)
+    rebuilt = build_database(tmp_path / "rebuilt.duckdb")
+    _apply_directly(rebuilt)
+    warm(rebuilt)
+    yield incremental, rebuilt
+    incremental.close()
+    rebuilt.close()
+
+
+def test_ingest_matches_a_full_rebuild(databases, tmp_path):
+    incremental, rebuilt = databases
+    _write_deltas(tmp_path / "inbox")
+    merged = ingest_inbox(incremental, str(tmp_path / "inbox"))
+    assert merged == {"Products": 1, "Received": 1, "Sales": 3}
+    for table in ("Sales", "Received", "Products", *DERIVED):
+        assert _rows(incremental, table) == _rows(rebuilt, table), table
+    assert not list((tmp_path / "inbox").glob("*.*"))
+
+
+def test_failed_reload_is_retried(databases, tmp_path, monkeypatch):
+    incremental, rebuilt = databases
+    inbox = tmp_path / "inbox"
+    _write_deltas(inbox)
+
+    def broken(con, changed):
+        raise duckdb.IOException("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ingest, "_refresh_derived", broken)
+        with pytest.raises(duckdb.IOException):
+            ingest_inbox(incremental, str(inbox))
+    # The merged files are still waiting, so the next run reloads the derived tables
+    assert len(list(inbox.glob("*.*"))) == 3
+    ingest_inbox(incremental, str(inbox))
+    for table in ("Sales", *DERIVED):
+        assert _rows(incremental, table) == _rows(rebuilt, table), table
@@ -0,0 +1,68 @@
+"""Pre-generated Dispatched Notes and their freshness (dashboard/notes.py)."""
+import os
+import subprocess
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import DAYS, FIRST_DAY, SUPERVISORS, build_database
+from dashboard import freshness
+from dashboard.notes import NOTES_DIR, day_fingerprint, generate_notes, latest_day, load_note, refresh_latest_notes
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "generate_notes.py")
+DAY = date(2024, 2, 14)
+LAST_DAY = FIRST_DAY + timedelta(days=DAYS - 1)
+
+
+@pytest.fixture
+def con(tmp_path):
+    con = build_database(tmp_path / "notes.duckdb")
+    yield con
+    con.close()
+
+
+def test_note_matches_the_day(con, tmp_path):
+    generate_notes(DAY, tmp_path / "notes", formats=("csv",), con=con)
+    note = load_note(DAY, SUPERVISORS[0], day_fingerprint(DAY, con), tmp_path / "notes")
+    expected = dict(con.execute("""
+        SELECT s.Code, SUM(CAST(s.Qty AS DOUBLE)) FROM Sales s JOIN Supervisors USING (Route)
+        WHERE Supervisor = ? AND CAST(Sales_Date AS DATE) = ? GROUP BY s.Code
+    """, [SUPERVISORS[0], DAY]).fetchall())
+    totals = note["pivot"].drop(columns='Total', errors='ignore').sum(axis=1)
+    assert {code: totals[code] for code in expected} == expected
+    assert note["xlsx"] is None
+
+
+def test_changed_day_is_not_served(con, tmp_path):
+    generate_notes(DAY, tmp_path / "notes", formats=("csv",), con=con)
+    con.execute("UPDATE Sales SET Qty = '999' WHERE CAST(Sales_Date AS DATE) = ? AND Route = 'R00'", [DAY])
+    assert load_note(DAY, SUPERVISORS[0], day_fingerprint(DAY, con), tmp_path / "notes") is None
+
+
+def test_latest_notes_written_once_per_change(con, tmp_path):
+    notes_dir = tmp_path / "notes"
+    assert latest_day(con) == LAST_DAY
+    assert refresh_latest_notes(con, notes_dir)
+    assert refresh_latest_notes(con, notes_dir) == []
+    con.execute("INSERT INTO Sales VALUES ('C001', 'R01', '5', ?)", [LAST_DAY])
+    assert refresh_latest_notes(con, notes_dir)
+    assert load_note(LAST_DAY, "All", day_fingerprint(LAST_DAY, con), notes_dir) is not None
+
+
+def test_script_explains_a_held_database(con, tmp_path):
+    # This process holds the file read-write, as the dashboard does
+    result = subprocess.run(
+        [sys.executable, SCRIPT, "--database", str(tmp_path / "notes.duckdb")],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode != 0
+    assert "query service" in result.stderr
+
+
+@pytest.mark.usefixtures("dispatch_db")
+def test_owning_process_writes_the_latest_notes(monkeypatch, tmp_path):
+    monkeypatch.setattr(freshness, "_notes_version", None)
+    freshness.check_now()
+    freshness._refresh_notes()
+    assert (tmp_path / NOTES_DIR / LAST_DAY.strftime('%Y%m%d') / "summary.json").exists()
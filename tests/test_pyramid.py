@@ -0,0 +1,47 @@
+"""Pyramid levels against from-scratch sums over Sales (dashboard/pyramid.py)."""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from dashboard.db import get_duckdb
+from dashboard.pyramid import LEVELS, build_pyramid, choose_level, period_start, slice_level
+
+
+def _exact(level):
+    rows = get_duckdb().cursor().execute(f"""
+        SELECT DATE_TRUNC('{level}', CAST(Sales_Date AS DATE)) AS Period, SUM(CAST(Qty AS INTEGER)) AS Qty
+        FROM Sales GROUP BY 1 ORDER BY 1
+    """).df()
+    rows['Period'] = pd.to_datetime(rows['Period'])
+    return rows
+
+
+@pytest.mark.usefixtures("dispatch_db")
+def test_levels_match_the_source():
+    pyramid = build_pyramid()
+    for level, _ in LEVELS:
+        expected = _exact(level)
+        assert pyramid[level]['Period'].tolist() == expected['Period'].tolist()
+        assert pyramid[level]['Qty'].tolist() == expected['Qty'].tolist()
+
+
+@pytest.mark.parametrize("level, start, end, periods", [
+    # Starting on the 31st still shows the month it falls in
+    ("month", date(2024, 1, 31), date(2024, 3, 5), ["2024-01-01", "2024-02-01", "2024-03-01"]),
+    ("month", date(2024, 2, 1), date(2024, 2, 29), ["2024-02-01"]),
+    # 2024-01-10 is a Wednesday; its week starts on Monday the 8th
+    ("week", date(2024, 1, 10), date(2024, 1, 22), ["2024-01-08", "2024-01-15", "2024-01-22"]),
+    ("day", date(2024, 1, 10), date(2024, 1, 12), ["2024-01-10", "2024-01-11", "2024-01-12"]),
+])
+def test_slice_keeps_every_overlapping_period(level, start, end, periods):
+    all_periods = pd.date_range("2023-12-01", "2024-04-30", freq="D")
+    pyramid = {level: pd.DataFrame({'Period': sorted({period_start(level, d) for d in all_periods})})}
+    pyramid[level]['Qty'] = 1
+    assert slice_level(pyramid, level, start, end)['Period'].tolist() == pd.to_datetime(periods).tolist()
+
+
+def test_choose_level():
+    assert choose_level(date(2024, 1, 1), date(2024, 3, 1)) == "day"
+    assert choose_level(date(2021, 1, 1), date(2024, 1, 1)) == "week"
+    assert choose_level(date(2000, 1, 1), date(2024, 1, 1)) == "month"
@@ -0,0 +1,84 @@
+"""Shared aggregate SQL against from-scratch sums over the source tables (dashboard/queries.py)."""
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import FIRST_DAY, build_database
+from dashboard.queries import DAYS_OF_COVER_SQL, INVENTORY_SUMMARY_SQL, ORDERS_VS_SALES_SQL
+from dashboard.snapshots import warm
+
+# Longer than the 180 days of receipts the days-of-cover query reads
+DAYS = 400
+LAST_DAY = FIRST_DAY + timedelta(days=DAYS - 1)
+
+# Every movement as (Date, Code, signed quantity), straight from the source tables
+MOVEMENTS = """
+    SELECT CAST(Received_Date AS DATE) AS Date, Code, Received_Qty AS Qty, 'in' AS Kind FROM Received
+    UNION ALL SELECT Adjuctment_Date, Code, Adjustment_Qty, 'in' FROM Adjustment
+    UNION ALL SELECT CAST(Sales_Date AS DATE), Code, -CAST(Qty AS DOUBLE), 'out' FROM Sales
+    UNION ALL SELECT Date, Code, -Qty, 'out' FROM CostCenter
+"""
+
+
+@pytest.fixture(scope="module")
+def con(tmp_path_factory):
+    con = build_database(tmp_path_factory.mktemp("queries") / "queries.duckdb", days=DAYS)
+    warm(con)
+    yield con
+    con.close()
+
+
+def _stock(con, day):
+    return dict(con.execute(f"SELECT Code, SUM(Qty) FROM ({MOVEMENTS}) WHERE Date <= ? GROUP BY Code", [day]).fetchall())
+
+
+@pytest.mark.parametrize("window", [28, 90, 365])
+def test_days_of_cover(con, window):
+    as_of = LAST_DAY - timedelta(days=3)
+    rows = con.execute(DAYS_OF_COVER_SQL, [as_of, window, None]).df().set_index('Code')
+    outflow = dict(con.execute(f"""
+        SELECT Code, -SUM(Qty) / ? FROM ({MOVEMENTS})
+        WHERE Kind = 'out' AND Date > CAST(? AS DATE) - ? AND Date <= ?
+        GROUP BY Code
+    """, [window, as_of, window, as_of]).fetchall())
+
+    assert set(rows.index) == set(outflow)
+    for code, row in rows.iterrows():
+        assert row['As_Of'].date() == as_of
+        assert row['Avg_Daily_Outflow'] == pytest.approx(outflow[code])
+        assert row['Stock'] == pytest.approx(_stock(con, as_of)[code])
+        # Every Code is received each week, so the next receipt is due within the week
+        assert as_of < row['Next_Receipt'].date() <= as_of + timedelta(days=7)
+
+
+def test_days_of_cover_caps_the_as_of_day(con):
+    rows = con.execute(DAYS_OF_COVER_SQL, [LAST_DAY + timedelta(days=30), 28, ["C001"]]).df()
+    assert rows['Code'].tolist() == ["C001"]
+    assert rows['As_Of'].iloc[0].date() == LAST_DAY
+
+
+@pytest.mark.parametrize("start, end", [
+    (date(2024, 3, 15), date(2024, 5, 20)),
+    (date(2024, 7, 1), date(2024, 7, 1)),
+    (FIRST_DAY, LAST_DAY),
+])
+def test_inventory_summary(con, start, end):
+    rows = con.execute(INVENTORY_SUMMARY_SQL, [start, end, None]).df().set_index('Code')
+    before = _stock(con, start - timedelta(days=1))
+    after = _stock(con, end)
+    for code, row in rows.iterrows():
+        assert row['Previous_Stock'] == pytest.approx(before.get(code, 0))
+        assert row['Stock'] == pytest.approx(after[code])
+
+
+def test_orders_vs_sales(con):
+    start, end, codes = date(2024, 2, 1), date(2024, 2, 29), ["C002", "C007"]
+    rows = con.execute(ORDERS_VS_SALES_SQL, [start, end, codes]).df()
+    assert set(rows['Code']) <= set(codes)
+    for table, column in (("Orders", 'Total_Orders'), ("Sales", 'Total_Sales')):
+        expected = con.execute(f"""
+            SELECT SUM(CAST(Qty AS INTEGER)) FROM {table}
+            WHERE CAST(Sales_Date AS DATE) BETWEEN ? AND ? AND list_contains(?, Code)
+        """, [start, end, codes]).fetchone()[0]
+        assert rows[column].sum() == expected
+    assert (rows['Difference'] == rows['Total_Sales'] - rows['Total_Orders']).all()
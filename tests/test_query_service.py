@@ -0,0 +1,156 @@
+"""The query service and the pages that use it (dashboard/query_service.py).
+
+The service holds the fixture database read-write, as in the README's
+setup. DuckDB refuses the file to any other process, so a page query that
+bypassed the service would fail here.
+"""
+import glob
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+from conftest import build_database
+from dashboard import query_service
+from dashboard.query_service import QueryService
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = [os.path.join(ROOT, "Home_Page.py"), *sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))]
+
+# Runs the pages in a fresh interpreter, so DISPATCH_QUERY_SERVICE is read at import
+RUN_PAGES = """
+import json, sys
+from streamlit.testing.v1 import AppTest
+errors = {}
+for page in sys.argv[1:]:
+    at = AppTest.from_file(page, default_timeout=120).run()
+    errors[page] = [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+print(json.dumps(errors))
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    """(URL, directory) of a read-write query service on the fixture database."""
+    tmp_path = tmp_path_factory.mktemp("service")
+    build_database(tmp_path / "dispatch.duckdb").close()
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "dashboard.query_service", "--database", "dispatch.duckdb",
+         "--port", str(port), "--read-write"],
+        cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                # The first fingerprint read builds the catalog and derived tables
+                requests.get(f"{url}/fingerprints", timeout=60).raise_for_status()
+                break
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        else:
+            pytest.fail("query service did not start")
+        yield url, tmp_path
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def _query(url, sql, **kwargs):
+    return requests.post(f"{url}/query", json={"sql": sql, "params": []}, timeout=60, **kwargs)
+
+
+def test_pages_use_only_the_service(service):
+    url, directory = service
+    env = dict(
+        os.environ, PYTHONPATH=ROOT, DISPATCH_QUERY_SERVICE=url,
+        DISPATCH_SHARED_DIR=str(directory / "shared"),
+    )
+    # Run next to the file the service holds, so any direct open hits its lock
+    result = subprocess.run(
+        [sys.executable, "-c", RUN_PAGES, *PAGES],
+        cwd=directory, env=env, capture_output=True, text=True, timeout=900,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    errors = json.loads(result.stdout.strip().splitlines()[-1])
+    assert errors == dict.fromkeys(PAGES, [])
+
+
+@pytest.mark.parametrize("sql", [
+    "SHOW TABLES",
+    "DESCRIBE Sales",
+    "FROM Products LIMIT 1",
+    "WITH t AS (SELECT 1 AS x) SELECT x FROM t",
+])
+def test_read_only_statements_run(service, sql):
+    assert _query(service[0], sql).status_code == 200
+
+
+@pytest.mark.parametrize("sql", [
+    "CREATE TABLE Stolen AS SELECT * FROM Sales",
+    "DELETE FROM Sales",
+    "COPY Sales TO 'sales.csv'",
+    "SET threads = 1",
+    "ATTACH 'other.duckdb'",
+    "SELECT 1; DROP TABLE Sales",
+])
+def test_other_statements_are_refused(service, sql):
+    resp = _query(service[0], sql)
+    assert resp.status_code == 403
+    assert _query(service[0], "SELECT COUNT(*) FROM Sales").status_code == 200
+
+
+def test_no_file_access(service):
+    url, directory = service
+    secret = directory / "secret.txt"
+    secret.write_text("not for clients")
+    resp = _query(url, f"SELECT * FROM read_text('{secret}')")
+    assert resp.status_code == 400
+    assert "Permission" in resp.json()["error"]
+
+
+def test_json_content_type_required(service):
+    url, _ = service
+    body = json.dumps({"sql": "SELECT 1"})
+    resp = requests.post(f"{url}/query", data=body, headers={"Content-Type": "text/plain"}, timeout=60)
+    assert resp.status_code == 415
+    resp = requests.post(f"{url}/cancel", data=json.dumps({"query_id": "x"}), timeout=60)
+    assert resp.status_code == 415
+
+
+def test_concurrent_requests_refresh_the_snapshot_once(source_db, monkeypatch):
+    refreshed, running = [], []
+
+    def slow_refresh(con, fingerprints):
+        running.append(True)
+        overlapping = len(running) > 1
+        time.sleep(0.2)
+        refreshed.append(overlapping)
+        running.pop()
+
+    monkeypatch.setattr(query_service, "refresh_derived", slow_refresh)
+    service = QueryService(str(source_db), read_only=False)
+    try:
+        threads = [threading.Thread(target=service.snapshot) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        service.con.close()
+    # The first request opened the file and refreshed it; the rest reused its signature
+    assert refreshed == [False]
@@ -0,0 +1,72 @@
+"""Cost classes and fair queues for page queries (dashboard/scheduler.py)."""
+import threading
+
+import duckdb
+import pytest
+
+from dashboard import scheduler
+from dashboard.scheduler import QueryScheduler, classify, estimate_rows
+
+
+@pytest.fixture
+def cursor():
+    con = duckdb.connect()
+    con.execute("CREATE TABLE Big AS SELECT range AS Id FROM range(5000)")
+    con.execute("CREATE TABLE Small AS SELECT range AS Id FROM range(10)")
+    yield con.cursor()
+    con.close()
+
+
+def test_classify_by_rows_scanned(cursor, monkeypatch):
+    monkeypatch.setattr(scheduler, "HEAVY_ROWS", 1000)
+    assert estimate_rows(cursor, "SELECT COUNT(*) FROM Big JOIN Small USING (Id)") == 5010
+    assert classify(cursor, "SELECT SUM(Id) FROM Big") == "heavy"
+    assert classify(cursor, "SELECT * FROM Small WHERE Id = ?", [3]) == "interactive"
+    # The query fails on its own, and fast
+    assert classify(cursor, "SELECT * FROM Missing") == "interactive"
+
+
+def _blocked(cost_class="interactive"):
+    """A scheduler with one slot per class, taken by a query that waits for the returned event."""
+    release = threading.Event()
+    pool = QueryScheduler({"interactive": 1, "heavy": 1}, name="test")
+    pool.submit(cost_class, "blocker", release.wait)
+    return pool, release
+
+
+def test_sessions_take_turns():
+    order = []
+    pool, release = _blocked()
+    futures = {
+        name: pool.submit("interactive", session, lambda name=name: order.append(name))
+        for session, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")]
+    }
+    assert pool.position(futures["b1"]) == 2
+    assert pool.position(futures["a3"]) == 4
+    assert pool.stats()["interactive"] == {"running": 1, "queued": 4, "slots": 1}
+    futures["a2"].cancel()
+    release.set()
+    for name, future in futures.items():
+        if name != "a2":
+            future.result(timeout=10)
+    assert order == ["a1", "b1", "a3"]
+    assert pool.position(futures["a3"]) == 0
+
+
+def test_heavy_queries_leave_interactive_slots_free():
+    pool, release = _blocked("heavy")
+    try:
+        assert pool.submit("interactive", "a", lambda: 42).result(timeout=10) == 42
+        queued = pool.submit("heavy", "a", lambda: 1)
+        assert pool.position(queued) == 1
+    finally:
+        release.set()
+    assert queued.result(timeout=10) == 1
+
+
+def test_errors_reach_the_caller_and_free_the_slot():
+    pool = QueryScheduler({"interactive": 1}, name="test")
+    failed = pool.submit("interactive", "a", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        failed.result(timeout=10)
+    assert pool.submit("interactive", "a", lambda: "ok").result(timeout=10) == "ok"
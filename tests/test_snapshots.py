@@ -0,0 +1,44 @@
+"""Warming and publishing snapshots (dashboard/snapshots.py)."""
+import duckdb
+import pytest
+
+from dashboard import catalog, snapshots
+from dashboard.catalog import refresh_catalog
+from dashboard.freshness import read_fingerprints, take_fingerprints
+from dashboard.snapshots import SnapshotError, publish, warm
+
+
+@pytest.fixture
+def read_only(monkeypatch):
+    # As with DISPATCH_READ_ONLY=1 set when the modules were imported
+    monkeypatch.setattr(catalog, "READ_ONLY", True)
+    monkeypatch.setattr(snapshots, "READ_ONLY", True)
+
+
+def test_warm_records_the_fingerprints(source_db):
+    con = duckdb.connect(str(source_db))
+    try:
+        warm(con)
+        assert read_fingerprints(con, writable=False) == take_fingerprints(con)
+    finally:
+        con.close()
+
+
+def test_read_only_warm_only_reads(source_db, request):
+    con = duckdb.connect(str(source_db))
+    warm(con)
+    recorded = read_fingerprints(con, writable=False)
+    con.close()
+    request.getfixturevalue("read_only")
+    con = duckdb.connect(str(source_db), read_only=True)
+    try:
+        warm(con)
+        assert refresh_catalog(con) == recorded
+    finally:
+        con.close()
+
+
+@pytest.mark.usefixtures("read_only")
+def test_read_only_publish_refused(source_db):
+    with pytest.raises(SnapshotError):
+        publish(str(source_db))
@@ -0,0 +1,66 @@
+"""Top-K rankings against a from-scratch sum over Sales (dashboard/topk.py)."""
+from datetime import date
+
+import pytest
+
+from dashboard import topk
+from dashboard.db import get_duckdb
+from dashboard.topk import SpaceSaving, top_k
+from conftest import CODES
+
+# Every Code, so ties at the cut-off cannot make two correct rankings differ
+K = len(CODES)
+
+
+def _exact(start, end, k, codes=None):
+    # The dashboard's own connection: this process cannot open the file a second way
+    rows = get_duckdb().cursor().execute("""
+        SELECT Code, SUM(CAST(Qty AS INTEGER)) AS Qty FROM Sales
+        WHERE CAST(Sales_Date AS DATE) BETWEEN ? AND ?
+          AND (? IS NULL OR list_contains(?, Code))
+        GROUP BY Code ORDER BY Qty DESC, Code LIMIT ?
+    """, [start, end, codes, codes, k]).fetchall()
+    return {code: int(qty) for code, qty in rows}
+
+
+def _ranked(df):
+    return {code: int(qty) for code, qty in zip(df['Code'], df['Qty'])}
+
+
+@pytest.mark.parametrize("start, end", [
+    (date(2024, 1, 1), date(2024, 4, 29)),   # cold: starts before the hot tier
+    (date(2024, 3, 15), date(2024, 4, 29)),  # hot tier
+])
+@pytest.mark.usefixtures("dispatch_db")
+def test_exact_ranking(start, end):
+    assert _ranked(top_k(start, end, K)) == _exact(start, end, K)
+
+
+@pytest.mark.usefixtures("dispatch_db")
+def test_code_filter():
+    start, end = date(2024, 2, 1), date(2024, 2, 29)
+    codes = ["C001", "C004"]
+    assert _ranked(top_k(start, end, K, codes=codes)) == _exact(start, end, K, codes)
+
+
+@pytest.mark.usefixtures("dispatch_db")
+def test_sketch_matches_exact_while_every_code_fits(monkeypatch):
+    monkeypatch.setattr(topk, "SKETCH_MIN_DAYS", 31)
+    start, end = date(2024, 1, 10), date(2024, 4, 20)
+    result = top_k(start, end, K)
+    # Fewer Codes than counters: nothing is evicted, so nothing is overestimated
+    assert (result['Error'] == 0).all()
+    assert _ranked(result) == _exact(start, end, K)
+
+
+def test_space_saving_bounds():
+    sketch = SpaceSaving(capacity=2)
+    for item, weight in [("a", 5), ("b", 3), ("c", 1), ("a", 2)]:
+        sketch.update(item, weight)
+    assert sketch.counts["a"] == 7
+    # "c" evicted "b": its count may overestimate by what "b" had
+    assert sketch.counts["c"] - sketch.errors["c"] <= 1 <= sketch.counts["c"]
+    # "d" was untracked here, so it may have had up to the floor of 3 as well
+    merged = sketch.merge(SpaceSaving.from_totals({"a": 1, "d": 10}, capacity=2))
+    assert merged.counts == {"d": 13, "a": 8}
+    assert merged.floor == 4